@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TaxCalculation
+from .models import TaxCalculation, ContributionLedger
 
 @admin.register(TaxCalculation)
 class TaxCalculationAdmin(admin.ModelAdmin):
@@ -10,4 +10,15 @@ class TaxCalculationAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
     
     def has_add_permission(self, request):
-        return False  # Prevent manual creation through admin
\ No newline at end of file
+        return False  # Prevent manual creation through admin
+
+
+@admin.register(ContributionLedger)
+class ContributionLedgerAdmin(admin.ModelAdmin):
+    list_display = ['year', 'source', 'annual_total', 'grant_count', 'dataset_version', 'built_at']
+    list_filter = ['source']
+    readonly_fields = ['year', 'source', 'annual_total', 'grant_count', 'top_projects',
+                       'dataset_version', 'built_at']
+    
+    def has_add_permission(self, request):
+        return False  # Rebuilt from the grant data after imports
@@ -0,0 +1,144 @@
+"""
+Grant-share calculations for many income profiles at once.
+
+Everything that does not depend on the profile (ledger totals per year, grant
+totals, the bracket tables) is loaded once per batch, and each bracket table
+taxes all profiles in one sorted sweep; each profile then costs a few
+multiplications per year. Nothing is saved to TaxCalculation.
+"""
+import math
+from bisect import bisect_left
+
+from grants.models import DatasetVersion, FundingRecord
+from .brackets import get_tax_year_data
+from .models import ContributionLedger, GRANTS_ALLOCATION_PERCENTAGE, GST_RATE
+
+
+MAX_BATCH_PROFILES = 10000
+
+PROFILE_FIELDS = ('annual_income', 'gst_eligible_spending', 'taxpayer_since_year')
+
+
+def parse_profiles(rows):
+    """Validate profile dicts; extra keys (province, decile...) are passed through"""
+    if not isinstance(rows, list):
+        raise ValueError('profiles must be a list of objects')
+    if len(rows) > MAX_BATCH_PROFILES:
+        raise ValueError(f'At most {MAX_BATCH_PROFILES} profiles can be calculated per batch')
+
+    profiles = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f'Profile {i} must be an object')
+        try:
+            profile = dict(
+                row,
+                annual_income=float(row.get('annual_income', 0)),
+                gst_eligible_spending=float(row.get('gst_eligible_spending', 0)),
+                taxpayer_since_year=parse_year(row.get('taxpayer_since_year', 2018)),
+            )
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f'Profile {i}: {e}')
+        if not all(math.isfinite(profile[field]) for field in ('annual_income', 'gst_eligible_spending')):
+            raise ValueError(f'Profile {i}: amounts must be finite numbers')
+        if profile['annual_income'] < 0 or profile['gst_eligible_spending'] < 0:
+            raise ValueError(f'Profile {i}: amounts cannot be negative')
+        profiles.append(profile)
+    return profiles
+
+
+def parse_year(value):
+    """Whole year from a JSON number or string; int(float('inf')) would raise OverflowError"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{value!r} is not a year')
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f'{value!r} is not a year')
+    return int(value)
+
+
+def parse_include_gac(value):
+    """Accept a JSON boolean or an explicit 'true'/'false' string (bool('false') would be True)"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    raise ValueError('include_gac must be true or false')
+
+
+def calculate_batch(profiles, include_gac=True, tax_year=None):
+    """
+    Tax and grant-share breakdown for each parsed profile.
+
+    Returns the shared year axis and one result per profile; `yearly_shares`
+    is aligned with `years` (0 before the profile's taxpayer_since_year).
+    Each year's share uses that year's TaxBracket table and federal revenue
+    (closest loaded year); the headline figures use `tax_year` (latest loaded
+    by default).
+    """
+    version = DatasetVersion.current().version
+    tax_data = get_tax_year_data(version)
+    tax_year = tax_data.tax_year(tax_year)
+
+    ledger = [entry for entry in ContributionLedger.load() if include_gac or entry.source == 'domestic']
+    years = sorted({entry.year for entry in ledger})
+    position = {year: i for i, year in enumerate(years)}
+    year_totals = [0.0] * len(years)
+    for entry in ledger:
+        year_totals[position[entry.year]] += float(entry.annual_total)
+
+    totals = FundingRecord.totals()
+    domestic_value = float(totals['domestic'][1])
+    gac_value = float(totals['gac'][1]) if include_gac else 0.0
+
+    revenue = float(tax_data.federal_revenue(tax_year))
+    allocation = float(GRANTS_ALLOCATION_PERCENTAGE) / 100
+    gst_rate = float(GST_RATE)
+    incomes = [profile['annual_income'] for profile in profiles]
+
+    # Federal tax of every profile per bracket table; ledger years share tables
+    taxes_by_table = {}
+    def taxes_for(year):
+        bracket_year = tax_data.tax_year(year)
+        if bracket_year not in taxes_by_table:
+            taxes_by_table[bracket_year] = tax_data.table(year).taxes(incomes)
+        return taxes_by_table[bracket_year]
+
+    federal_taxes = taxes_for(tax_year)
+    yearly_taxes = [taxes_for(year) for year in years]
+    yearly_revenue = [float(tax_data.federal_revenue(year)) for year in years]
+
+    results = []
+    for j, (profile, federal_income_tax) in enumerate(zip(profiles, federal_taxes)):
+        gst_paid = profile['gst_eligible_spending'] * gst_rate
+        total_tax = federal_income_tax + gst_paid
+        # Fraction of any grant amount paid by this profile
+        share = total_tax / revenue * allocation
+        first_year = bisect_left(years, profile['taxpayer_since_year'])
+        yearly_shares = [
+            total * (taxes[j] + gst_paid) / year_revenue * allocation if i >= first_year else 0
+            for i, (total, taxes, year_revenue) in enumerate(zip(year_totals, yearly_taxes, yearly_revenue))
+        ]
+
+        results.append(dict(
+            profile,
+            federal_income_tax=round(federal_income_tax, 2),
+            gst_paid=round(gst_paid, 2),
+            total_tax_contribution=round(total_tax, 2),
+            revenue_share_percentage=total_tax / revenue * 100,
+            grants_portion_of_taxes=round(total_tax * allocation, 2),
+            domestic_grants_share=round(domestic_value * share, 6),
+            gac_grants_share=round(gac_value * share, 6),
+            total_grants_share=round((domestic_value + gac_value) * share, 6),
+            cumulative_share=round(sum(yearly_shares), 6),
+            yearly_shares=[round(value, 6) for value in yearly_shares],
+        ))
+
+    return {
+        'dataset_version': version,
+        'include_gac': include_gac,
+        'tax_year': tax_year,
+        'federal_revenue': revenue,
+        'years': years,
+        'count': len(results),
+        'results': results,
+    }
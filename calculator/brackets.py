@@ -0,0 +1,131 @@
+"""
+Progressive tax bracket tables with precomputed cumulative tax.
+
+Tax on an income is the cumulative tax at the start of its bracket plus the
+marginal rate on the remainder, so each lookup is one bisect instead of a
+walk over every bracket.
+
+Tables are built from the TaxBracket rows of every year and the revenue from
+CanadianTaxData, once per process and dataset version (admin edits and
+setup_tax_data bump the version).
+"""
+import threading
+from bisect import bisect_right
+
+from grants.models import TaxBracket, CanadianTaxData, DatasetVersion
+from .models import FEDERAL_TAX_BRACKETS, ESTIMATED_FEDERAL_REVENUE
+
+
+class BracketTable:
+    """Lower bounds, marginal rates and tax owed at each lower bound"""
+
+    def __init__(self, brackets):
+        """`brackets` is a list of (min_income, rate) sorted by min_income, starting at 0"""
+        self.thresholds = [float(min_income) for min_income, _ in brackets]
+        self.rates = [float(rate) for _, rate in brackets]
+        self.base_tax = [0.0]
+        for i in range(1, len(brackets)):
+            width = self.thresholds[i] - self.thresholds[i - 1]
+            self.base_tax.append(self.base_tax[-1] + width * self.rates[i - 1])
+
+    @classmethod
+    def from_widths(cls, widths):
+        """Build from (bracket width, rate) pairs like FEDERAL_TAX_BRACKETS"""
+        brackets = []
+        lower = 0
+        for width, rate in widths:
+            brackets.append((lower, rate))
+            lower += width
+        return cls(brackets)
+
+    def widths(self):
+        """(width, rate) pairs; the open-ended top bracket has width None"""
+        bounds = self.thresholds[1:] + [None]
+        return [
+            [None if upper is None else upper - lower, rate]
+            for lower, upper, rate in zip(self.thresholds, bounds, self.rates)
+        ]
+
+    def tax(self, income):
+        if income <= 0:
+            return 0.0
+        i = bisect_right(self.thresholds, income) - 1
+        return self.base_tax[i] + (income - self.thresholds[i]) * self.rates[i]
+
+    def taxes(self, incomes):
+        """Tax for many incomes at once (sorted sweep over the brackets)"""
+        order = sorted(range(len(incomes)), key=incomes.__getitem__)
+        results = [0.0] * len(incomes)
+        i = 0
+        last = len(self.thresholds) - 1
+        for index in order:
+            income = incomes[index]
+            if income <= 0:
+                continue
+            while i < last and income >= self.thresholds[i + 1]:
+                i += 1
+            results[index] = self.base_tax[i] + (income - self.thresholds[i]) * self.rates[i]
+        return results
+
+
+def default_bracket_table():
+    return BracketTable.from_widths(FEDERAL_TAX_BRACKETS)
+
+
+class TaxYearData:
+    """Bracket tables and federal revenue per year for one dataset version"""
+
+    def __init__(self, version):
+        self.version = version
+
+        rows = {}
+        for bracket in TaxBracket.objects.order_by('year', 'min_income'):
+            rows.setdefault(bracket.year, []).append((bracket.min_income, bracket.tax_rate))
+        self.tables = {year: BracketTable(brackets) for year, brackets in rows.items() if brackets[0][0] == 0}
+        self.table_years = sorted(self.tables)
+        self.fallback_table = default_bracket_table()
+
+        self.revenue = dict(CanadianTaxData.objects.values_list('year', 'total_federal_revenue'))
+        self.revenue_years = sorted(self.revenue)
+
+    @staticmethod
+    def _closest(years, year):
+        """Latest year <= year, else the earliest available (None if empty)"""
+        if not years:
+            return None
+        if year is None:
+            return years[-1]
+        i = bisect_right(years, year)
+        return years[i - 1] if i else years[0]
+
+    def tax_year(self, year=None):
+        """Bracket year used for a requested tax year (None = latest)"""
+        return self._closest(self.table_years, year)
+
+    def table(self, year=None):
+        tax_year = self.tax_year(year)
+        return self.tables[tax_year] if tax_year is not None else self.fallback_table
+
+    def federal_revenue(self, year=None):
+        revenue_year = self._closest(self.revenue_years, year)
+        if revenue_year is None:
+            return ESTIMATED_FEDERAL_REVENUE
+        return self.revenue[revenue_year]
+
+
+_tax_year_data = None
+_tax_year_lock = threading.Lock()
+
+
+def get_tax_year_data(version=None):
+    """Process-wide TaxYearData, rebuilt when the dataset version changes"""
+    global _tax_year_data
+    if version is None:
+        version = DatasetVersion.current().version
+    data = _tax_year_data
+    if data is None or data.version != version:
+        with _tax_year_lock:
+            if _tax_year_data is None or _tax_year_data.version != version:
+                _tax_year_data = TaxYearData(version)
+            data = _tax_year_data
+    return data
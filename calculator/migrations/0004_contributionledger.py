@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("calculator", "0003_taxcalculation_taxpayer_since_year"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContributionLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("domestic", "Domestic"),
+                            ("gac", "Global Affairs Canada"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("annual_total", models.DecimalField(decimal_places=6, max_digits=24)),
+                ("grant_count", models.IntegerField(default=0)),
+                ("top_projects", models.JSONField(default=list)),
+                ("dataset_version", models.PositiveIntegerField(default=0)),
+                ("built_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["year", "source"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="contributionledger",
+            constraint=models.UniqueConstraint(
+                fields=("year", "source"), name="unique_ledger_year_source"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("calculator", "0004_contributionledger"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="taxcalculation",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="taxcalculation",
+            index=models.Index(
+                fields=["session_key", "-created_at"], name="taxcalc_session_recent_idx"
+            ),
+        ),
+    ]
@@ -1,5 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
+import heapq
+import re
+
+
+# Estimated total federal revenue (2024 data: ~$430B), used when CanadianTaxData is empty
+ESTIMATED_FEDERAL_REVENUE = Decimal('430000000000')
+
+# Share of the federal budget spent on grants and contributions (~2.5%)
+GRANTS_ALLOCATION_PERCENTAGE = Decimal('2.5')
+
+GST_RATE = Decimal('0.05')
+
+# 2024 federal income tax brackets: (width of the bracket, marginal rate), used
+# when no TaxBracket rows have been loaded (see calculator.brackets)
+FEDERAL_TAX_BRACKETS = [
+    (53359, 0.15),    # 15% on first $53,359
+    (53358, 0.205),   # 20.5% on next $53,358 ($53,359 to $106,717)
+    (58204, 0.26),    # 26% on next $58,204 ($106,717 to $164,921)
+    (99462, 0.29),    # 29% on next $99,462 ($164,921 to $264,383)
+    (float('inf'), 0.33)  # 33% on income over $264,383
+]
+
 
 class TaxCalculation(models.Model):
     """Store user tax calculations for reference"""
@@ -24,205 +47,101 @@ class TaxCalculation(models.Model):
     revenue_share_percentage = models.DecimalField(max_digits=10, decimal_places=8)
     
     # Grant spending allocation percentage (what % of federal budget goes to grants)
-    grants_allocation_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('2.5'))
+    grants_allocation_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=GRANTS_ALLOCATION_PERCENTAGE)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when calculated, not when a buffered row is written
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['session_key', '-created_at'], name='taxcalc_session_recent_idx'),
+        ]
     
     def __str__(self):
         return f"Income: ${self.annual_income:,.0f} - Tax: ${self.total_tax_contribution:,.0f}"
     
     @staticmethod
-    def calculate_federal_income_tax(annual_income):
-        """Calculate federal income tax based on 2024 brackets"""
-        # 2024 Federal tax brackets
-        brackets = [
-            (53359, 0.15),    # 15% on first $53,359
-            (53358, 0.205),   # 20.5% on next $53,358 ($53,359 to $106,717)
-            (58204, 0.26),    # 26% on next $58,204 ($106,717 to $164,921)
-            (99462, 0.29),    # 29% on next $99,462 ($164,921 to $264,383)
-            (float('inf'), 0.33)  # 33% on income over $264,383
-        ]
-        
-        tax = Decimal('0')
-        remaining_income = Decimal(str(annual_income))
+    def calculate_federal_income_tax(annual_income, year=None, tax_data=None):
+        """Calculate federal income tax with the TaxBracket table for `year` (latest by default)"""
+        from .brackets import get_tax_year_data
         
-        for bracket_limit, rate in brackets:
-            if remaining_income <= 0:
-                break
-                
-            taxable_in_bracket = min(remaining_income, Decimal(str(bracket_limit)))
-            tax += taxable_in_bracket * Decimal(str(rate))
-            remaining_income -= taxable_in_bracket
-        
-        return tax
+        tax_data = tax_data or get_tax_year_data()
+        tax = tax_data.table(year).tax(float(annual_income))
+        return Decimal(str(round(tax, 2)))
     
     @staticmethod
     def calculate_gst_paid(gst_eligible_spending):
         """Calculate GST paid (5% on eligible spending)"""
-        return Decimal(str(gst_eligible_spending)) * Decimal('0.05')
+        return Decimal(str(gst_eligible_spending)) * GST_RATE
     
-    def calculate_grant_share(self, grant_value):
-        """Calculate user's personal share of a specific grant"""
+    def calculate_grant_share(self, grant_value, revenue_share_percentage=None):
+        """Calculate user's personal share of a specific grant (at another year's revenue share if given)"""
+        if revenue_share_percentage is None:
+            revenue_share_percentage = self.revenue_share_percentage
         # Only the portion of taxes that goes to grants should be considered
-        effective_share = self.revenue_share_percentage * self.grants_allocation_percentage / 100
+        effective_share = revenue_share_percentage * self.grants_allocation_percentage / 100
         return Decimal(str(grant_value)) * effective_share / 100
     
+    def revenue_share_for_year(self, year, tax_data):
+        """Share of `year`'s federal revenue paid on this income with that year's brackets"""
+        tax = self.calculate_federal_income_tax(self.annual_income, year, tax_data) + self.gst_paid
+        return tax / tax_data.federal_revenue(year) * 100
+    
     def calculate_monthly_grant_share(self, grant_value):
         """Calculate user's monthly share of a specific grant"""
         annual_share = self.calculate_grant_share(grant_value)
         return annual_share / 12
     
-    def calculate_yearly_contributions(self, include_gac=True):
+    def calculate_yearly_contributions(self, include_gac=True, tax_data=None):
         """Calculate year-by-year contribution breakdown with project duration analysis"""
-        from grants.models import Grant, GlobalAffairsGrant
-        from datetime import datetime
-        import re
+        from .brackets import get_tax_year_data
         
+        tax_data = tax_data or get_tax_year_data()
         yearly_contributions = {}
+        revenue_shares = {}
         
-        # Process domestic grants
-        grants = Grant.objects.all()
-        for grant in grants:
-            # Parse fiscal year to get actual years
-            if grant.fiscal_year:
-                # Handle fiscal years like "2023-24" or "2023-2024"
-                year_match = re.match(r'(\d{4})', grant.fiscal_year)
-                if year_match:
-                    fiscal_year = int(year_match.group(1))
-                else:
-                    continue
-            else:
+        # Within a year the user's share is a constant factor, so scale the precomputed annual totals
+        for entry in ContributionLedger.load():
+            if entry.year < self.taxpayer_since_year:
+                continue
+            if entry.source == 'gac' and not include_gac:
                 continue
-                
-            # Determine project duration
-            start_year = fiscal_year
-            end_year = fiscal_year  # Default to single year
-            
-            if grant.agreement_start_date and grant.agreement_end_date:
-                start_year = grant.agreement_start_date.year
-                end_year = grant.agreement_end_date.year
-            elif grant.agreement_start_date:
-                start_year = grant.agreement_start_date.year
-                # Estimate end year based on fiscal year if no end date
-                if fiscal_year > start_year:
-                    end_year = fiscal_year
-                else:
-                    end_year = start_year + 2  # Assume 3-year project if unclear
-            
-            # Calculate duration and annual amount
-            duration_years = max(1, end_year - start_year + 1)
-            annual_amount = grant.agreement_value / duration_years
             
-            # Calculate user's annual share of this grant
-            annual_user_share = self.calculate_grant_share(annual_amount)
+            if entry.year not in yearly_contributions:
+                yearly_contributions[entry.year] = {
+                    'total_contribution': Decimal('0'),
+                    'grant_count': 0,
+                    'projects': [],
+                    'domestic_contribution': Decimal('0'),
+                    'gac_contribution': Decimal('0'),
+                    'domestic_count': 0,
+                    'gac_count': 0
+                }
+            year_data = yearly_contributions[entry.year]
+            # Each year is taxed with its own brackets and revenue (closest loaded year)
+            if entry.year not in revenue_shares:
+                revenue_shares[entry.year] = self.revenue_share_for_year(entry.year, tax_data)
+            revenue_share = revenue_shares[entry.year]
             
-            # Add to yearly totals for years when user was taxpayer
-            for year in range(start_year, end_year + 1):
-                if year >= self.taxpayer_since_year:
-                    if year not in yearly_contributions:
-                        yearly_contributions[year] = {
-                            'total_contribution': Decimal('0'),
-                            'grant_count': 0,
-                            'projects': [],
-                            'domestic_contribution': Decimal('0'),
-                            'gac_contribution': Decimal('0'),
-                            'domestic_count': 0,
-                            'gac_count': 0
-                        }
-                    
-                    yearly_contributions[year]['total_contribution'] += annual_user_share
-                    yearly_contributions[year]['domestic_contribution'] += annual_user_share
-                    yearly_contributions[year]['grant_count'] += 1
-                    yearly_contributions[year]['domestic_count'] += 1
-                    yearly_contributions[year]['projects'].append({
-                        'title': grant.agreement_title_en[:50] + ('...' if len(grant.agreement_title_en) > 50 else ''),
-                        'recipient': grant.recipient_legal_name[:40] + ('...' if len(grant.recipient_legal_name) > 40 else ''),
-                        'annual_value': float(annual_amount),
-                        'user_annual_share': float(annual_user_share),
-                        'total_value': float(grant.agreement_value),
-                        'duration_years': duration_years,
-                        'start_year': start_year,
-                        'end_year': end_year,
-                        'grant_type': 'domestic'
-                    })
-        
-        # Process GAC grants if requested
-        if include_gac:
-            gac_grants = GlobalAffairsGrant.objects.all()
-            for grant in gac_grants:
-                # Determine project duration from actual dates
-                start_year = None
-                end_year = None
-                
-                if grant.start_date:
-                    start_year = grant.start_date.year
-                if grant.end_date:
-                    end_year = grant.end_date.year
-                    
-                # If no dates available, estimate based on status
-                if not start_year or not end_year:
-                    current_year = datetime.now().year
-                    if grant.status == 'operational':
-                        start_year = start_year or 2018  # Conservative estimate
-                        end_year = end_year or current_year + 2
-                    elif grant.status == 'closed':
-                        start_year = start_year or 2015
-                        end_year = end_year or current_year - 1
-                    elif grant.status == 'terminating':
-                        start_year = start_year or 2018
-                        end_year = end_year or current_year
-                
-                # Skip if we still don't have valid years
-                if not start_year or not end_year or start_year > end_year:
-                    continue
-                    
-                # Calculate duration and annual amount
-                duration_years = max(1, end_year - start_year + 1)
-                annual_amount = grant.maximum_contribution / duration_years
-                
-                # Calculate user's annual share of this grant
-                annual_user_share = self.calculate_grant_share(annual_amount)
-                
-                # Add to yearly totals for years when user was taxpayer
-                for year in range(start_year, end_year + 1):
-                    if year >= self.taxpayer_since_year:
-                        if year not in yearly_contributions:
-                            yearly_contributions[year] = {
-                                'total_contribution': Decimal('0'),
-                                'grant_count': 0,
-                                'projects': [],
-                                'domestic_contribution': Decimal('0'),
-                                'gac_contribution': Decimal('0'),
-                                'domestic_count': 0,
-                                'gac_count': 0
-                            }
-                        
-                        yearly_contributions[year]['total_contribution'] += annual_user_share
-                        yearly_contributions[year]['gac_contribution'] += annual_user_share
-                        yearly_contributions[year]['grant_count'] += 1
-                        yearly_contributions[year]['gac_count'] += 1
-                        yearly_contributions[year]['projects'].append({
-                            'title': grant.title[:50] + ('...' if len(grant.title) > 50 else ''),
-                            'recipient': grant.primary_country[:40] + ('...' if len(grant.primary_country) > 40 else ''),
-                            'annual_value': float(annual_amount),
-                            'user_annual_share': float(annual_user_share),
-                            'total_value': float(grant.maximum_contribution),
-                            'duration_years': duration_years,
-                            'start_year': start_year,
-                            'end_year': end_year,
-                            'grant_type': 'gac'
-                        })
+            user_share = self.calculate_grant_share(entry.annual_total, revenue_share)
+            year_data['total_contribution'] += user_share
+            year_data[f'{entry.source}_contribution'] += user_share
+            year_data['grant_count'] += entry.grant_count
+            year_data[f'{entry.source}_count'] += entry.grant_count
+            for project in entry.top_projects:
+                year_data['projects'].append(dict(
+                    project,
+                    user_annual_share=float(self.calculate_grant_share(project['annual_value'], revenue_share))
+                ))
         
         return yearly_contributions
     
-    def calculate_future_projections(self, projection_years=10):
+    def calculate_future_projections(self, projection_years=10, tax_data=None):
         """Calculate future projections with and without new projects"""
         from datetime import datetime
         
-        yearly_contributions = self.calculate_yearly_contributions()
+        yearly_contributions = self.calculate_yearly_contributions(tax_data=tax_data)
         current_year = datetime.now().year
         
         # Scenario 1: Only continuing existing projects
@@ -291,4 +210,179 @@ class TaxCalculation(models.Model):
             'monthly_gst_paid': self.monthly_gst_paid,
             'monthly_tax_contribution': self.monthly_tax_contribution,
             'monthly_grants_contribution': self.monthly_tax_contribution * self.grants_allocation_percentage / 100,
-        }
\ No newline at end of file
+        }
+
+# Projects kept per (year, source) ledger row; the calculator shows the top 5 per year
+LEDGER_TOP_PROJECTS = 5
+
+
+def domestic_grant_years(grant):
+    """(start_year, end_year) a domestic grant is spread over, or None if unknown"""
+    if not grant.fiscal_year:
+        return None
+    # Handle fiscal years like "2023-24" or "2023-2024"
+    year_match = re.match(r'(\d{4})', grant.fiscal_year)
+    if not year_match:
+        return None
+    fiscal_year = int(year_match.group(1))
+    
+    start_year = fiscal_year
+    end_year = fiscal_year  # Default to single year
+    
+    if grant.agreement_start_date and grant.agreement_end_date:
+        start_year = grant.agreement_start_date.year
+        end_year = grant.agreement_end_date.year
+    elif grant.agreement_start_date:
+        start_year = grant.agreement_start_date.year
+        # Estimate end year based on fiscal year if no end date
+        if fiscal_year > start_year:
+            end_year = fiscal_year
+        else:
+            end_year = start_year + 2  # Assume 3-year project if unclear
+    return start_year, end_year
+
+
+def gac_grant_years(grant, current_year):
+    """(start_year, end_year) a GAC grant is spread over, or None if unknown"""
+    start_year = grant.start_date.year if grant.start_date else None
+    end_year = grant.end_date.year if grant.end_date else None
+    
+    # If no dates available, estimate based on status
+    if not start_year or not end_year:
+        if grant.status == 'operational':
+            start_year = start_year or 2018  # Conservative estimate
+            end_year = end_year or current_year + 2
+        elif grant.status == 'closed':
+            start_year = start_year or 2015
+            end_year = end_year or current_year - 1
+        elif grant.status == 'terminating':
+            start_year = start_year or 2018
+            end_year = end_year or current_year
+    
+    # Skip if we still don't have valid years
+    if not start_year or not end_year or start_year > end_year:
+        return None
+    return start_year, end_year
+
+
+def truncate(text, length):
+    return text[:length] + ('...' if len(text) > length else '')
+
+
+class ContributionLedger(models.Model):
+    """
+    Grant spending spread over the years each project runs, per year and source.
+    
+    Built after imports so tax calculations only scale a few dozen rows instead
+    of walking every grant. Rows are stamped with the dataset version they were
+    built from and rebuilt on first use once the data has changed.
+    """
+    SOURCE_CHOICES = [
+        ('domestic', 'Domestic'),
+        ('gac', 'Global Affairs Canada'),
+    ]
+    
+    year = models.IntegerField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    annual_total = models.DecimalField(max_digits=24, decimal_places=6)
+    grant_count = models.IntegerField(default=0)
+    # Largest projects by annual value, without the per-user share
+    top_projects = models.JSONField(default=list)
+    dataset_version = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['year', 'source']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'source'], name='unique_ledger_year_source'),
+        ]
+    
+    def __str__(self):
+        return f"{self.year} {self.source}: ${self.annual_total:,.0f} ({self.grant_count} grants)"
+    
+    @classmethod
+    def load(cls):
+        """Current ledger rows, rebuilding them if the grant data changed"""
+        from grants.caching import rebuild_lock
+        from grants.models import DatasetVersion
+        
+        entries = list(cls.objects.all())
+        version = DatasetVersion.current().version
+        current_year = timezone.now().year
+        # GAC spans without dates depend on the current year, so also rebuild on new year
+        if not entries or any(
+            entry.dataset_version != version or entry.built_at.year != current_year
+            for entry in entries
+        ):
+            # One worker rebuilds; the others keep using the previous rows meanwhile
+            with rebuild_lock('contribution-ledger') as acquired:
+                if acquired or not entries:
+                    entries = cls.rebuild()
+        return entries
+    
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Spread every grant over its years and store the per-year totals"""
+        from grants.models import FundingRecord, DatasetVersion
+        
+        # Serializes concurrent rebuilds, which would otherwise insert the same (year, source)
+        # twice, and holds off version bumps until the rows are stamped
+        version = DatasetVersion.lock().version
+        totals = {}
+        
+        def add(source, span, value, project):
+            start_year, end_year = span
+            duration_years = max(1, end_year - start_year + 1)
+            annual_amount = value / duration_years
+            project = dict(
+                project,
+                annual_value=float(annual_amount),
+                total_value=float(value),
+                duration_years=duration_years,
+                start_year=start_year,
+                end_year=end_year,
+                grant_type=source,
+            )
+            for year in range(start_year, end_year + 1):
+                entry = totals.setdefault((year, source), [Decimal('0'), 0, []])
+                entry[0] += annual_amount
+                entry[1] += 1
+                # Min-heap of the largest projects (id breaks ties between equal values)
+                item = (project['annual_value'], project['id'], project)
+                if len(entry[2]) < LEDGER_TOP_PROJECTS:
+                    heapq.heappush(entry[2], item)
+                elif item[:2] > entry[2][0][:2]:
+                    heapq.heapreplace(entry[2], item)
+        
+        # Open-ended GAC spans estimated last year run to a different end year now
+        FundingRecord.refresh_estimated_spans()
+        
+        # Spans were estimated when the records were synced, so one query covers both sources
+        # (earlier amendments of an agreement are skipped so it is counted once)
+        records = FundingRecord.objects.filter(
+            start_year__isnull=False, end_year__isnull=False, is_superseded=False
+        ).only(
+            'source', 'source_id', 'value', 'start_year', 'end_year', 'title', 'recipient', 'country',
+        ).order_by()
+        for record in records.iterator():
+            if record.start_year > record.end_year:
+                continue
+            add(record.source, (record.start_year, record.end_year), record.value, {
+                'id': record.grant_id,
+                'title': truncate(record.title, 50),
+                'recipient': truncate(record.country if record.source == 'gac' else record.recipient, 40),
+            })
+        
+        cls.objects.all().delete()
+        return cls.objects.bulk_create([
+            cls(
+                year=year,
+                source=source,
+                annual_total=annual_total,
+                grant_count=grant_count,
+                top_projects=[project for _, _, project in sorted(top, reverse=True)],
+                dataset_version=version,
+            )
+            for (year, source), (annual_total, grant_count, top) in sorted(totals.items())
+        ])
@@ -0,0 +1,137 @@
+"""
+Write-behind persistence for TaxCalculation rows.
+
+Saved calculations only feed analytics, so requests should not wait on the
+insert. With CALCULATOR_PERSISTENCE = "buffered" rows are queued in memory
+and bulk-created by a background thread once CALCULATOR_FLUSH_SIZE rows are
+waiting or every CALCULATOR_FLUSH_INTERVAL seconds. Queued rows are also
+flushed at interpreter exit. A process that is killed loses them, which is
+acceptable for analytics data.
+"""
+import atexit
+import json
+import logging
+import threading
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+
+from .models import TaxCalculation
+
+logger = logging.getLogger(__name__)
+
+_buffer = []
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def record_calculation(calculation):
+    """Persist an unsaved TaxCalculation according to CALCULATOR_PERSISTENCE"""
+    mode = settings.CALCULATOR_PERSISTENCE
+    if mode == 'off':
+        return
+    if mode == 'sync':
+        calculation.save()
+        return
+
+    with _lock:
+        _buffer.append(calculation)
+        pending = len(_buffer)
+    _start_flusher()
+    if pending >= settings.CALCULATOR_FLUSH_SIZE:
+        _wake.set()
+
+
+def pending_calculations():
+    return len(_buffer)
+
+
+def flush_calculations():
+    """Write every queued calculation in one bulk insert; returns the row count"""
+    with _lock:
+        rows = _buffer[:]
+        del _buffer[:]
+    if rows:
+        TaxCalculation.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(settings.CALCULATOR_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush_calculations()
+        except Exception:
+            logger.exception('Could not write buffered tax calculations')
+        finally:
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name='tax-calculation-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush_calculations)
+
+
+# The latest calculation lives in a signed cookie so neither the calculation
+# nor the follow-up grant-share requests read or write the session table
+LATEST_CALCULATION_COOKIE = 'latest_tax_calculation'
+LATEST_CALCULATION_SALT = 'calculator.latest'
+SESSION_CALCULATION_FIELDS = (
+    'annual_income', 'taxpayer_since_year', 'total_tax_contribution',
+    'revenue_share_percentage', 'grants_allocation_percentage',
+)
+
+
+def _latest_cookie(request):
+    """Decoded latest-calculation cookie, or None when missing or tampered with"""
+    value = request.get_signed_cookie(
+        LATEST_CALCULATION_COOKIE, default=None, salt=LATEST_CALCULATION_SALT, max_age=settings.SESSION_COOKIE_AGE,
+    )
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def remember_calculation(request, response, calculation):
+    """Store the calculation in a signed cookie and tag it with the visitor's id"""
+    previous = _latest_cookie(request) or {}
+    # Random per-browser id kept across calculations, stored as the analytics session_key
+    visitor = previous.get('visitor') or uuid.uuid4().hex
+    data = {field: str(getattr(calculation, field)) for field in SESSION_CALCULATION_FIELDS}
+    data['visitor'] = visitor
+    response.set_signed_cookie(
+        LATEST_CALCULATION_COOKIE, json.dumps(data), salt=LATEST_CALCULATION_SALT,
+        max_age=settings.SESSION_COOKIE_AGE, secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+    )
+    calculation.session_key = visitor
+
+
+def latest_calculation(request):
+    """The visitor's most recent calculation (unsaved when read from the cookie)"""
+    data = _latest_cookie(request)
+    if data is None:
+        return None
+    try:
+        return TaxCalculation(
+            session_key=data['visitor'],
+            annual_income=Decimal(data['annual_income']),
+            taxpayer_since_year=int(data['taxpayer_since_year']),
+            total_tax_contribution=Decimal(data['total_tax_contribution']),
+            revenue_share_percentage=Decimal(data['revenue_share_percentage']),
+            grants_allocation_percentage=Decimal(data['grants_allocation_percentage']),
+        )
+    except (KeyError, TypeError, ArithmeticError, ValueError):
+        # Cookie written by an older release; fall back to the saved analytics row
+        return TaxCalculation.objects.filter(session_key=data.get('visitor', '')).order_by('-created_at').first()
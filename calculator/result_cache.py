@@ -0,0 +1,85 @@
+"""
+In-process LRU cache for /api/calculate/ responses.
+
+Many visitors try round numbers (50k, 60k, 100k), so responses are cached
+under the quantized inputs plus the dataset version. Inputs that are not on
+the grid bypass the cache rather than being answered for a nearby income.
+"""
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+
+
+# Grid that inputs must fall on to be cached
+INCOME_QUANTUM = Decimal('100')
+SPENDING_QUANTUM = Decimal('100')
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def quantized_key(annual_income, gst_eligible_spending, taxpayer_since_year, include_gac, tax_year, version):
+    """Cache key for grid-aligned inputs, or None when an input is off the grid"""
+    for value, quantum in ((annual_income, INCOME_QUANTUM), (gst_eligible_spending, SPENDING_QUANTUM)):
+        if value % quantum:
+            return None
+    return (
+        int(annual_income // INCOME_QUANTUM),
+        int(gst_eligible_spending // SPENDING_QUANTUM),
+        taxpayer_since_year,
+        bool(include_gac),
+        tax_year,
+        version,
+    )
+
+
+calculation_cache = LRUCache(settings.CALCULATOR_CACHE_SIZE)
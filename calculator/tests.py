@@ -1,3 +1,191 @@
-from django.test import TestCase
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from grants.models import GlobalAffairsGrant, FundingRecord, TaxBracket, CanadianTaxData, DatasetVersion
+from .batch import calculate_batch, parse_profiles, parse_include_gac, parse_year
+from .brackets import TaxYearData
+from .models import ContributionLedger, TaxCalculation
+
+
+def at_year(year):
+    """Patch the clock used for span estimates and ledger timestamps"""
+    return mock.patch('django.utils.timezone.now', return_value=datetime(year, 6, 1, tzinfo=dt_timezone.utc))
+
+
+def make_gac_grant(project_number, **fields):
+    values = {
+        'date_modified': '2024-01-01',
+        'title': f'Project {project_number}',
+        'description': '',
+        'status': 'operational',
+        'country': 'Vietnam',
+        'maximum_contribution': Decimal('400000'),
+        'program_name': 'Asia Pacific',
+        'dac_sector': 'Agriculture',
+    }
+    values.update(fields)
+    return GlobalAffairsGrant.objects.create(project_number=project_number, **values)
+
+
+class ContributionLedgerTests(TestCase):
+    def test_new_year_reestimates_open_gac_spans(self):
+        make_gac_grant('P1')  # Operational without dates: 2018 to two years from now
+        with at_year(2025):
+            FundingRecord.sync('gac')
+            ContributionLedger.rebuild()
+            self.assertEqual(max(entry.year for entry in ContributionLedger.load()), 2027)
+        
+        with at_year(2026):
+            entries = ContributionLedger.load()
+        self.assertEqual(max(entry.year for entry in entries), 2028)
+        record = FundingRecord.objects.get(source='gac')
+        self.assertEqual((record.end_year, record.span_year), (2028, 2026))
+    
+    def test_version_bump_rebuilds_ledger(self):
+        make_gac_grant('P1', start_date='2020-01-01', end_date='2021-12-31')
+        FundingRecord.sync('gac')
+        self.assertEqual([entry.year for entry in ContributionLedger.load()], [2020, 2021])
+        
+        grant = make_gac_grant('P2', start_date='2022-01-01', end_date='2022-12-31')
+        FundingRecord.sync('gac', [grant.pk])
+        version = DatasetVersion.bump().version
+        entries = ContributionLedger.load()
+        self.assertEqual([entry.year for entry in entries], [2020, 2021, 2022])
+        self.assertTrue(all(entry.dataset_version == version for entry in entries))
+    
+    def test_stale_rows_served_while_another_worker_rebuilds(self):
+        make_gac_grant('P1', start_date='2020-01-01', end_date='2020-12-31')
+        FundingRecord.sync('gac')
+        ContributionLedger.rebuild()
+        DatasetVersion.bump()
+        
+        cache.add('rebuild:contribution-ledger:lock', 1)
+        try:
+            entries = ContributionLedger.load()
+        finally:
+            cache.delete('rebuild:contribution-ledger:lock')
+        self.assertEqual([entry.dataset_version for entry in entries], [0])
+        self.assertEqual([entry.dataset_version for entry in ContributionLedger.load()], [1])
+
+
+class YearlyTaxTests(TestCase):
+    """Each year of the breakdown is taxed with that year's brackets and revenue"""
+    
+    def setUp(self):
+        for year, rate, revenue in ((2020, '0.1000', '1000000'), (2024, '0.2000', '4000000')):
+            TaxBracket.objects.create(year=year, min_income=0, tax_rate=Decimal(rate))
+            CanadianTaxData.objects.create(
+                year=year, total_federal_revenue=Decimal(revenue),
+                gst_hst_revenue=Decimal('0'), income_tax_revenue=Decimal(revenue),
+            )
+        version = DatasetVersion.current().version
+        with at_year(2025):
+            for year in (2021, 2024):
+                ContributionLedger.objects.create(
+                    year=year, source='domestic', annual_total=Decimal('1000'), grant_count=1, dataset_version=version,
+                )
+        # Drop the process-wide tables of other tests
+        patcher = mock.patch('calculator.brackets._tax_year_data', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_yearly_contributions_use_each_years_brackets(self):
+        calculation = TaxCalculation(
+            annual_income=Decimal('10000'), gst_paid=Decimal('0'), taxpayer_since_year=2018,
+            revenue_share_percentage=Decimal('0.02'), grants_allocation_percentage=Decimal('100'),
+        )
+        with at_year(2025):
+            yearly = calculation.calculate_yearly_contributions(tax_data=TaxYearData(0))
+        # 2021 uses the 2020 table: 1000 tax of 1M revenue; 2024: 2000 tax of 4M revenue
+        self.assertEqual(yearly[2021]['total_contribution'], Decimal('1'))
+        self.assertEqual(yearly[2024]['total_contribution'], Decimal('0.5'))
+    
+    def test_batch_uses_each_years_brackets(self):
+        profiles = parse_profiles([{'annual_income': 10000, 'taxpayer_since_year': 2018}])
+        with at_year(2025):
+            result = calculate_batch(profiles)
+        self.assertEqual(result['years'], [2021, 2024])
+        # Batches use the fixed 2.5% grants allocation
+        self.assertEqual(result['results'][0]['yearly_shares'], [0.025, 0.0125])
+        self.assertEqual(result['results'][0]['cumulative_share'], 0.0375)
+        self.assertEqual(result['results'][0]['federal_income_tax'], 2000)
+
+
+class BatchInputTests(TestCase):
+    def test_non_finite_amounts_are_rejected(self):
+        for value in ('nan', 'inf', float('-inf')):
+            with self.assertRaises(ValueError):
+                parse_profiles([{'annual_income': value}])
+    
+    def test_include_gac_accepts_booleans_and_explicit_strings(self):
+        self.assertIs(parse_include_gac(False), False)
+        self.assertIs(parse_include_gac('false'), False)
+        self.assertIs(parse_include_gac('True'), True)
+        for value in ('no', 0, 1, None, []):
+            with self.assertRaises(ValueError):
+                parse_include_gac(value)
+    
+    def test_api_rejects_nan_and_unknown_include_gac(self):
+        for body in (
+            '{"profiles": [{"annual_income": NaN}]}',
+            '{"profiles": [{"annual_income": 50000}], "include_gac": "no"}',
+        ):
+            response = self.client.post('/api/calculate/batch/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+    
+    def test_wrongly_typed_inputs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_profiles(5)
+        for value in (float('inf'), float('nan'), [1], None, True):
+            with self.assertRaises(ValueError):
+                parse_year(value)
+        self.assertEqual(parse_year('2019'), 2019)
+    
+    def test_api_rejects_wrongly_typed_json(self):
+        for body, message in (
+            ('{"profiles": 5}', 'profiles must be a list'),
+            ('{"profiles": [{}, {"taxpayer_since_year": 1e400}]}', 'Profile 1'),
+            ('{"profiles": [{"taxpayer_since_year": Infinity}]}', 'Profile 0'),
+            ('{"profiles": [{"annual_income": 50000}], "tax_year": [1]}', 'not a year'),
+        ):
+            response = self.client.post('/api/calculate/batch/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.json()['error'])
+    
+    def test_api_include_gac_false_string(self):
+        response = self.client.post(
+            '/api/calculate/batch/', '{"profiles": [{"annual_income": 50000}], "include_gac": "false"}',
+            content_type='application/json',
+        )
+        self.assertIs(response.json()['include_gac'], False)
+
+
+class LatestCalculationTests(TestCase):
+    def calculate(self):
+        return self.client.post(
+            '/api/calculate/', '{"annual_income": 60000, "gst_eligible_spending": 20000}',
+            content_type='application/json',
+        )
+    
+    def test_calculation_does_not_write_the_session(self):
+        response = self.calculate()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertIn('latest_tax_calculation', response.cookies)
+    
+    def test_grant_shares_read_the_cookie(self):
+        self.assertEqual(self.client.get('/api/grant-shares/?ids=1').status_code, 400)
+        self.calculate()
+        self.assertEqual(self.client.get('/api/grant-shares/?ids=1').status_code, 200)
+    
+    @override_settings(CALCULATOR_PERSISTENCE='sync')
+    def test_visitor_id_is_kept_across_calculations(self):
+        self.calculate()
+        self.calculate()
+        self.assertEqual(len(set(TaxCalculation.objects.values_list('session_key', flat=True))), 1)
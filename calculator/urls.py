@@ -4,5 +4,8 @@ from . import views
 urlpatterns = [
     path('calculator/', views.tax_calculator, name='tax_calculator'),
     path('api/calculate/', views.calculate_tax_contribution, name='calculate_tax_contribution'),
+    path('api/calculate/batch/', views.calculate_batch_api, name='calculate_batch_api'),
     path('api/grant-share/<int:grant_id>/', views.grant_share_calculator, name='grant_share_calculator'),
+    path('api/grant-shares/', views.grant_shares_api, name='grant_shares_api'),
+    path('api/calculator-baseline/', views.calculator_baseline_api, name='calculator_baseline_api'),
 ]
\ No newline at end of file
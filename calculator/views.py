@@ -1,19 +1,33 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Sum
+from django.db.models import Q
 from decimal import Decimal
 import json
+from datetime import datetime
 
-from .models import TaxCalculation
-from grants.models import Grant, GlobalAffairsGrant
+from .models import TaxCalculation, ContributionLedger, GRANTS_ALLOCATION_PERCENTAGE, GST_RATE
+from .brackets import get_tax_year_data
+from grants.models import Grant, GlobalAffairsGrant, DatasetVersion, FundingRecord
+from grants.middleware import etag_exempt
+from grants.caching import cache_api_response, get_or_compute
+from .batch import parse_profiles, parse_include_gac, parse_year, calculate_batch
+from .persistence import record_calculation, remember_calculation, latest_calculation
+from .result_cache import calculation_cache, quantized_key
+from grants.versioning import get_dataset_version
 
+@etag_exempt
 def tax_calculator(request):
     """Tax contribution calculator page"""
-    domestic_value = Grant.objects.aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0
-    domestic_count = Grant.objects.count()
-    gac_value = GlobalAffairsGrant.objects.aggregate(Sum('maximum_contribution'))['maximum_contribution__sum'] or 0
-    gac_count = GlobalAffairsGrant.objects.count()
+    context = get_or_compute('tax_calculator', build_calculator_context, request)
+    return render(request, 'calculator/tax_calculator.html', context)
+
+
+def build_calculator_context():
+    """Grant totals shown on the calculator page"""
+    totals = FundingRecord.totals()
+    domestic_count, domestic_value = totals['domestic']
+    gac_count, gac_value = totals['gac']
     
     context = {
         'total_grants_value': domestic_value + gac_value,
@@ -22,8 +36,210 @@ def tax_calculator(request):
         'domestic_grants_count': domestic_count,
         'gac_grants_value': gac_value,
         'gac_grants_count': gac_count,
+        'calculator_baseline': build_calculator_baseline(totals),
     }
-    return render(request, 'calculator/tax_calculator.html', context)
+    return context
+
+
+def featured_grants():
+    """Notable domestic and major GAC grants listed with the user's share"""
+    featured = []
+    
+    # Domestic notable grants
+    for grant in Grant.objects.filter(is_notable=True)[:5]:
+        featured.append({
+            'id': grant.id,
+            'title': grant.agreement_title_en,
+            'total_value': float(grant.agreement_value),
+            'recipient': grant.recipient_legal_name,
+            'fiscal_year': grant.fiscal_year,
+            'grant_type': 'domestic',
+            'category': 'Notable Domestic Grant'
+        })
+    
+    # Major GAC grants
+    major_gac_grants = GlobalAffairsGrant.objects.filter(maximum_contribution__gte=1000000).order_by('-maximum_contribution')[:5]
+    for grant in major_gac_grants:
+        featured.append({
+            'id': f"gac_{grant.id}",
+            'title': grant.title,
+            'total_value': float(grant.maximum_contribution),
+            'recipient': grant.primary_country,
+            'fiscal_year': grant.start_date.year if grant.start_date else 'N/A',
+            'grant_type': 'gac',
+            'category': 'Major International Development'
+        })
+    return featured
+
+
+def build_calculator_baseline(totals=None):
+    """
+    Everything the calculator needs apart from the user's own numbers.
+    
+    The page embeds this so the browser can redo the tax and share math while
+    the user types; /api/calculate/ is only called to save a calculation.
+    """
+    if totals is None:
+        totals = FundingRecord.totals()
+    
+    version = DatasetVersion.current().version
+    tax_data = get_tax_year_data(version)
+    tax_year = tax_data.tax_year()
+    ledger = ContributionLedger.load()
+    ledger_years = sorted({entry.year for entry in ledger})
+    
+    return {
+        'dataset_version': version,
+        'current_year': datetime.now().year,
+        'tax_year': tax_year,
+        'federal_revenue': float(tax_data.federal_revenue(tax_year)),
+        'grants_allocation_percentage': float(GRANTS_ALLOCATION_PERCENTAGE),
+        'gst_rate': float(GST_RATE),
+        # Open-ended top bracket has no width
+        'brackets': tax_data.table(tax_year).widths(),
+        # The yearly breakdown taxes each year with the brackets and revenue loaded for it
+        'yearly_tax': {
+            year: {'tax_year': tax_data.tax_year(year), 'federal_revenue': float(tax_data.federal_revenue(year))}
+            for year in ledger_years
+        },
+        'bracket_tables': {
+            bracket_year: tax_data.table(bracket_year).widths()
+            for bracket_year in {tax_data.tax_year(year) for year in ledger_years} if bracket_year is not None
+        },
+        'totals': {
+            'domestic': float(totals['domestic'][1]),
+            'gac': float(totals['gac'][1]),
+        },
+        'ledger': [{
+            'year': entry.year,
+            'source': entry.source,
+            'annual_total': float(entry.annual_total),
+            'grant_count': entry.grant_count,
+            'top_projects': entry.top_projects,
+        } for entry in ledger],
+        'featured_grants': featured_grants(),
+    }
+
+
+@cache_api_response
+def calculator_baseline_api(request):
+    """User-independent calculator inputs for client-side recalculation"""
+    return JsonResponse(build_calculator_baseline())
+
+def build_contribution_response(calculation, include_gac):
+    """Response body of /api/calculate/ apart from the echoed input fields"""
+    annual_income = calculation.annual_income
+    monthly_income = calculation.monthly_income
+    taxpayer_since_year = calculation.taxpayer_since_year
+    federal_income_tax = calculation.federal_income_tax
+    monthly_federal_tax = calculation.monthly_federal_tax
+    gst_paid = calculation.gst_paid
+    monthly_gst_paid = calculation.monthly_gst_paid
+    total_tax_contribution = calculation.total_tax_contribution
+    monthly_tax_contribution = calculation.monthly_tax_contribution
+    revenue_share_percentage = calculation.revenue_share_percentage
+    grants_allocation_percentage = calculation.grants_allocation_percentage
+    
+    # Calculate shares of notable grants (both domestic and GAC)
+    grant_shares = []
+    for grant in featured_grants():
+        if grant['grant_type'] == 'gac' and not include_gac:
+            continue
+        user_share = calculation.calculate_grant_share(grant['total_value'])
+        grant_shares.append(dict(
+            grant,
+            user_share=float(user_share),
+            user_share_formatted=TaxCalculation.format_currency_amount(float(user_share)),
+        ))
+    
+    # Sort all grants by user share descending
+    grant_shares.sort(key=lambda x: x['user_share'], reverse=True)
+    
+    # Calculate sophisticated yearly contributions with project duration analysis
+    tax_data = get_tax_year_data()
+    yearly_contributions = calculation.calculate_yearly_contributions(include_gac=include_gac, tax_data=tax_data)
+    
+    # Convert to list format and apply formatting
+    yearly_breakdown = []
+    for year in sorted(yearly_contributions.keys()):
+        data = yearly_contributions[year]
+        yearly_breakdown.append({
+            'year': year,
+            'user_share': float(data['total_contribution']),
+            'user_share_formatted': TaxCalculation.format_currency_amount(float(data['total_contribution'])),
+            'domestic_share': float(data.get('domestic_contribution', 0)),
+            'domestic_share_formatted': TaxCalculation.format_currency_amount(float(data.get('domestic_contribution', 0))),
+            'gac_share': float(data.get('gac_contribution', 0)),
+            'gac_share_formatted': TaxCalculation.format_currency_amount(float(data.get('gac_contribution', 0))),
+            'grant_count': data['grant_count'],
+            'domestic_count': data.get('domestic_count', 0),
+            'gac_count': data.get('gac_count', 0),
+            'top_projects': sorted(data['projects'], key=lambda x: x['user_annual_share'], reverse=True)[:5]
+        })
+    
+    # Calculate future projections
+    future_projections = calculation.calculate_future_projections(10, tax_data)
+    
+    # Calculate share of total grants spending
+    totals = FundingRecord.totals()
+    domestic_grants_value = totals['domestic'][1]
+    gac_grants_value = totals['gac'][1] if include_gac else 0
+    
+    total_grants_value = domestic_grants_value + gac_grants_value
+    total_grants_share = calculation.calculate_grant_share(total_grants_value)
+    monthly_grants_share = calculation.calculate_monthly_grant_share(total_grants_value)
+    
+    # Calculate separate shares
+    domestic_grants_share = calculation.calculate_grant_share(domestic_grants_value)
+    gac_grants_share = calculation.calculate_grant_share(gac_grants_value) if include_gac else 0
+    
+    # Calculate how much of user's taxes actually goes to grants
+    grants_portion_of_taxes = total_tax_contribution * grants_allocation_percentage / 100
+    monthly_grants_portion = grants_portion_of_taxes / 12
+    
+    response_data = {
+        'success': True,
+        'calculation': {
+            'annual_income': float(annual_income),
+            'monthly_income': float(monthly_income),
+            'taxpayer_since_year': taxpayer_since_year,
+            'federal_income_tax': float(federal_income_tax),
+            'monthly_federal_tax': float(monthly_federal_tax),
+            'gst_paid': float(gst_paid),
+            'monthly_gst_paid': float(monthly_gst_paid),
+            'total_tax_contribution': float(total_tax_contribution),
+            'monthly_tax_contribution': float(monthly_tax_contribution),
+            'revenue_share_percentage': float(revenue_share_percentage),
+            'grants_allocation_percentage': float(grants_allocation_percentage),
+            'grants_portion_of_taxes': float(grants_portion_of_taxes),
+            'monthly_grants_portion': float(monthly_grants_portion),
+            # Formatted amounts
+            'total_tax_contribution_formatted': TaxCalculation.format_currency_amount(float(total_tax_contribution)),
+            'grants_portion_of_taxes_formatted': TaxCalculation.format_currency_amount(float(grants_portion_of_taxes)),
+            'monthly_grants_portion_formatted': TaxCalculation.format_currency_amount(float(monthly_grants_portion)),
+        },
+        'grant_shares': grant_shares,
+        'yearly_breakdown': yearly_breakdown,
+        'future_projections': future_projections,
+        'total_grants_share': float(total_grants_share),
+        'total_grants_share_formatted': TaxCalculation.format_currency_amount(float(total_grants_share)),
+        'monthly_grants_share': float(monthly_grants_share),
+        'monthly_grants_share_formatted': TaxCalculation.format_currency_amount(float(monthly_grants_share)),
+        'total_grants_value': float(total_grants_value),
+        'include_gac': include_gac,
+        'breakdown': {
+            'domestic_grants_value': float(domestic_grants_value),
+            'domestic_grants_share': float(domestic_grants_share),
+            'domestic_grants_share_formatted': TaxCalculation.format_currency_amount(float(domestic_grants_share)),
+            'gac_grants_value': float(gac_grants_value),
+            'gac_grants_share': float(gac_grants_share),
+            'gac_grants_share_formatted': TaxCalculation.format_currency_amount(float(gac_grants_share)),
+            'domestic_percentage': float(domestic_grants_share / total_grants_share * 100) if total_grants_share > 0 else 0.0,
+            'gac_percentage': float(gac_grants_share / total_grants_share * 100) if total_grants_share > 0 else 0.0,
+        },
+    }
+    
+    return response_data
 
 @csrf_exempt
 def calculate_tax_contribution(request):
@@ -41,33 +257,31 @@ def calculate_tax_contribution(request):
         taxpayer_since_year = int(data.get('taxpayer_since_year', 2018))
         include_gac = data.get('include_gac', True)
         
+        # Brackets and revenue of the requested tax year (latest loaded by default)
+        version = get_dataset_version(request).version
+        tax_data = get_tax_year_data(version)
+        tax_year = tax_data.tax_year(int(data['tax_year']) if data.get('tax_year') else None)
+        federal_revenue = tax_data.federal_revenue(tax_year)
+        
         # Calculate monthly values
         monthly_income = annual_income / 12
         monthly_gst_spending = gst_eligible_spending / 12
         
         # Calculate taxes
-        federal_income_tax = TaxCalculation.calculate_federal_income_tax(annual_income)
+        federal_income_tax = TaxCalculation.calculate_federal_income_tax(annual_income, tax_year, tax_data)
         monthly_federal_tax = federal_income_tax / 12
         gst_paid = TaxCalculation.calculate_gst_paid(gst_eligible_spending)
         monthly_gst_paid = gst_paid / 12
         total_tax_contribution = federal_income_tax + gst_paid
         monthly_tax_contribution = total_tax_contribution / 12
         
-        # Estimate total federal revenue (2024 data: ~$430B)
-        estimated_federal_revenue = Decimal('430000000000')  # $430B
-        
         # Calculate user's share of federal revenue
-        revenue_share_percentage = (total_tax_contribution / estimated_federal_revenue) * 100
+        revenue_share_percentage = (total_tax_contribution / federal_revenue) * 100
         
         # Estimate what percentage of federal budget goes to grants/contributions
-        # Based on federal spending analysis: approximately 2.5% of federal budget
-        grants_allocation_percentage = Decimal('2.5')
-        
-        # Store calculation (optional, for analytics)
-        session_key = request.session.session_key or 'anonymous'
+        grants_allocation_percentage = GRANTS_ALLOCATION_PERCENTAGE
         
-        calculation = TaxCalculation.objects.create(
-            session_key=session_key,
+        calculation = TaxCalculation(
             annual_income=annual_income,
             monthly_income=monthly_income,
             gst_eligible_spending=gst_eligible_spending,
@@ -83,133 +297,32 @@ def calculate_tax_contribution(request):
             grants_allocation_percentage=grants_allocation_percentage
         )
         
-        # Calculate shares of notable grants (both domestic and GAC)
-        grant_shares = []
-        
-        # Domestic notable grants
-        notable_grants = Grant.objects.filter(is_notable=True)[:5]
-        for grant in notable_grants:
-            user_share = calculation.calculate_grant_share(grant.agreement_value)
-            grant_shares.append({
-                'id': grant.id,
-                'title': grant.agreement_title_en,
-                'total_value': float(grant.agreement_value),
-                'user_share': float(user_share),
-                'user_share_formatted': TaxCalculation.format_currency_amount(float(user_share)),
-                'recipient': grant.recipient_legal_name,
-                'fiscal_year': grant.fiscal_year,
-                'grant_type': 'domestic',
-                'category': 'Notable Domestic Grant'
-            })
-        
-        # Major GAC grants if including GAC
-        if include_gac:
-            major_gac_grants = GlobalAffairsGrant.objects.filter(maximum_contribution__gte=1000000).order_by('-maximum_contribution')[:5]
-            for grant in major_gac_grants:
-                user_share = calculation.calculate_grant_share(grant.maximum_contribution)
-                grant_shares.append({
-                    'id': f"gac_{grant.id}",
-                    'title': grant.title,
-                    'total_value': float(grant.maximum_contribution),
-                    'user_share': float(user_share),
-                    'user_share_formatted': TaxCalculation.format_currency_amount(float(user_share)),
-                    'recipient': grant.primary_country,
-                    'fiscal_year': grant.start_date.year if grant.start_date else 'N/A',
-                    'grant_type': 'gac',
-                    'category': 'Major International Development'
-                })
-        
-        # Sort all grants by user share descending
-        grant_shares.sort(key=lambda x: x['user_share'], reverse=True)
-        
-        # Calculate sophisticated yearly contributions with project duration analysis
-        yearly_contributions = calculation.calculate_yearly_contributions(include_gac=include_gac)
-        
-        # Convert to list format and apply formatting
-        yearly_breakdown = []
-        for year in sorted(yearly_contributions.keys()):
-            data = yearly_contributions[year]
-            yearly_breakdown.append({
-                'year': year,
-                'user_share': float(data['total_contribution']),
-                'user_share_formatted': TaxCalculation.format_currency_amount(float(data['total_contribution'])),
-                'domestic_share': float(data.get('domestic_contribution', 0)),
-                'domestic_share_formatted': TaxCalculation.format_currency_amount(float(data.get('domestic_contribution', 0))),
-                'gac_share': float(data.get('gac_contribution', 0)),
-                'gac_share_formatted': TaxCalculation.format_currency_amount(float(data.get('gac_contribution', 0))),
-                'grant_count': data['grant_count'],
-                'domestic_count': data.get('domestic_count', 0),
-                'gac_count': data.get('gac_count', 0),
-                'top_projects': sorted(data['projects'], key=lambda x: x['user_annual_share'], reverse=True)[:5]
-            })
-        
-        # Calculate future projections
-        future_projections = calculation.calculate_future_projections(10)
-        
-        # Calculate share of total grants spending
-        domestic_grants_value = Grant.objects.aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0
-        gac_grants_value = 0
-        if include_gac:
-            gac_grants_value = GlobalAffairsGrant.objects.aggregate(Sum('maximum_contribution'))['maximum_contribution__sum'] or 0
-        
-        total_grants_value = domestic_grants_value + gac_grants_value
-        total_grants_share = calculation.calculate_grant_share(total_grants_value)
-        monthly_grants_share = calculation.calculate_monthly_grant_share(total_grants_value)
-        
-        # Calculate separate shares
-        domestic_grants_share = calculation.calculate_grant_share(domestic_grants_value)
-        gac_grants_share = calculation.calculate_grant_share(gac_grants_value) if include_gac else 0
-        
-        # Calculate how much of user's taxes actually goes to grants
-        grants_portion_of_taxes = total_tax_contribution * grants_allocation_percentage / 100
-        monthly_grants_portion = grants_portion_of_taxes / 12
+        # Round-number inputs are served from the LRU while the data is unchanged
+        key = quantized_key(annual_income, gst_eligible_spending, taxpayer_since_year,
+                            include_gac, tax_year, version)
+        cached = calculation_cache.get(key) if key else None
+        if key is None:
+            calculation_cache.bypass()
+        if cached is None:
+            cached = build_contribution_response(calculation, include_gac)
+            if key:
+                calculation_cache.set(key, cached)
         
-        response_data = {
-            'success': True,
-            'calculation': {
-                'annual_income': float(annual_income),
-                'monthly_income': float(monthly_income),
-                'taxpayer_since_year': taxpayer_since_year,
-                'federal_income_tax': float(federal_income_tax),
-                'monthly_federal_tax': float(monthly_federal_tax),
-                'gst_paid': float(gst_paid),
-                'monthly_gst_paid': float(monthly_gst_paid),
-                'total_tax_contribution': float(total_tax_contribution),
-                'monthly_tax_contribution': float(monthly_tax_contribution),
-                'revenue_share_percentage': float(revenue_share_percentage),
-                'grants_allocation_percentage': float(grants_allocation_percentage),
-                'grants_portion_of_taxes': float(grants_portion_of_taxes),
-                'monthly_grants_portion': float(monthly_grants_portion),
-                'input_mode': input_mode,
-                'original_income': float(original_income),
-                'original_spending': float(original_spending),
-                # Formatted amounts
-                'total_tax_contribution_formatted': TaxCalculation.format_currency_amount(float(total_tax_contribution)),
-                'grants_portion_of_taxes_formatted': TaxCalculation.format_currency_amount(float(grants_portion_of_taxes)),
-                'monthly_grants_portion_formatted': TaxCalculation.format_currency_amount(float(monthly_grants_portion)),
-            },
-            'grant_shares': grant_shares,
-            'yearly_breakdown': yearly_breakdown,
-            'future_projections': future_projections,
-            'total_grants_share': float(total_grants_share),
-            'total_grants_share_formatted': TaxCalculation.format_currency_amount(float(total_grants_share)),
-            'monthly_grants_share': float(monthly_grants_share),
-            'monthly_grants_share_formatted': TaxCalculation.format_currency_amount(float(monthly_grants_share)),
-            'total_grants_value': float(total_grants_value),
-            'include_gac': include_gac,
-            'breakdown': {
-                'domestic_grants_value': float(domestic_grants_value),
-                'domestic_grants_share': float(domestic_grants_share),
-                'domestic_grants_share_formatted': TaxCalculation.format_currency_amount(float(domestic_grants_share)),
-                'gac_grants_value': float(gac_grants_value),
-                'gac_grants_share': float(gac_grants_share),
-                'gac_grants_share_formatted': TaxCalculation.format_currency_amount(float(gac_grants_share)),
-                'domestic_percentage': float(domestic_grants_share / total_grants_share * 100) if total_grants_share > 0 else 0.0,
-                'gac_percentage': float(gac_grants_share / total_grants_share * 100) if total_grants_share > 0 else 0.0,
-            },
-        }
+        # Copy before adding the echoed inputs so the cached entry stays shared
+        response_data = dict(cached, calculation=dict(
+            cached['calculation'],
+            input_mode=input_mode,
+            original_income=float(original_income),
+            original_spending=float(original_spending),
+            tax_year=tax_year,
+            federal_revenue=float(federal_revenue),
+        ))
         
-        return JsonResponse(response_data)
+        # Keep it in a signed cookie for grant pages; the analytics row is written behind
+        response = JsonResponse(response_data)
+        remember_calculation(request, response, calculation)
+        record_calculation(calculation)
+        return response
         
     except (ValueError, KeyError, json.JSONDecodeError) as e:
         return JsonResponse({
@@ -232,14 +345,34 @@ def calculate_tax_contribution(request):
             'debug_info': traceback.format_exc()
         }, status=500)
 
+@csrf_exempt
+def calculate_batch_api(request):
+    """Calculate grant-share breakdowns for many income profiles in one request"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        profiles = parse_profiles(data.get('profiles', []))
+        include_gac = parse_include_gac(data.get('include_gac', True))
+        tax_year = parse_year(data['tax_year']) if data.get('tax_year') else None
+    except (ValueError, TypeError, OverflowError, AttributeError, json.JSONDecodeError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid input: {str(e)}',
+            'error_type': 'validation'
+        }, status=400)
+    
+    return JsonResponse(dict(calculate_batch(profiles, include_gac, tax_year), success=True))
+
+@etag_exempt
 def grant_share_calculator(request, grant_id):
     """Calculate user's share of a specific grant"""
     try:
         grant = Grant.objects.get(id=grant_id)
         
-        # Get the most recent calculation for this session
-        session_key = request.session.session_key or 'anonymous'
-        calculation = TaxCalculation.objects.filter(session_key=session_key).first()
+        # Get the most recent calculation of this visitor
+        calculation = latest_calculation(request)
         
         if not calculation:
             return JsonResponse({'error': 'No tax calculation found. Please use the calculator first.'}, status=400)
@@ -263,4 +396,59 @@ def grant_share_calculator(request, grant_id):
     except Grant.DoesNotExist:
         return JsonResponse({'error': 'Grant not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+# Most grants a single grant-shares request may ask for
+MAX_SHARE_IDS = 200
+
+def parse_share_ids(request):
+    """Domestic and GAC ids from ?ids=1,2,gac_3&gac_ids=4,5"""
+    domestic_ids, gac_ids = set(), set()
+    for part in request.GET.get('ids', '').split(','):
+        part = part.strip()
+        if part.startswith('gac_'):
+            gac_ids.add(int(part[4:]))
+        elif part:
+            domestic_ids.add(int(part))
+    for part in request.GET.get('gac_ids', '').split(','):
+        if part.strip():
+            gac_ids.add(int(part))
+    if len(domestic_ids) + len(gac_ids) > MAX_SHARE_IDS:
+        raise ValueError(f'At most {MAX_SHARE_IDS} grants can be requested at once')
+    return domestic_ids, gac_ids
+
+@etag_exempt
+def grant_shares_api(request):
+    """User's share of many domestic and GAC grants, for list and detail pages"""
+    try:
+        domestic_ids, gac_ids = parse_share_ids(request)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid ids: {e}'}, status=400)
+    
+    calculation = latest_calculation(request)
+    if not calculation:
+        return JsonResponse({'error': 'No tax calculation found. Please use the calculator first.'}, status=400)
+    
+    # One query over the combined funding table, served by its (source, source_id) constraint
+    rows = FundingRecord.objects.filter(
+        Q(source='domestic', source_id__in=domestic_ids) | Q(source='gac', source_id__in=gac_ids)
+    ).order_by().values_list('source_id', 'value', 'source')
+    
+    shares = []
+    if domestic_ids or gac_ids:
+        for grant_id, value, source in rows:
+            user_share = calculation.calculate_grant_share(value)
+            shares.append({
+                'id': grant_id if source == 'domestic' else f"gac_{grant_id}",
+                'grant_type': source,
+                'total_value': float(value),
+                'user_share': float(user_share),
+                'user_share_formatted': TaxCalculation.format_currency_amount(float(user_share)),
+                'percentage_of_income': float((user_share / calculation.annual_income) * 100) if calculation.annual_income > 0 else 0,
+            })
+    
+    return JsonResponse({
+        'count': len(shares),
+        'shares': shares,
+    })
+
@@ -1,32 +1,87 @@
 from django.contrib import admin
-from .models import Grant, GlobalAffairsGrant, TaxBracket, CanadianTaxData
+from django.db import transaction
+from .models import (
+    Grant, GlobalAffairsGrant, TaxBracket, CanadianTaxData, DatasetVersion, HomepageSnapshot, FundingRecord,
+    Recipient, Program, NaicsCode, Agreement, RecipientLink,
+)
+from .entities import normalize_name, refresh_recipients
+from .dimensions import refresh_dimensions
+from .agreements import refresh_agreements
+from .analytics import rebuild_quantile_sketches
+from .related import rebuild_related_grants
+from .linking import refresh_recipient_links
+
+
+class DatasetVersionAdminMixin:
+    """Bump the dataset version in the same transaction as admin edits"""
+    funding_source = None  # FundingRecord source kept in sync with this model
+    
+    def collect_derived_rows(self, ids):
+        """Derived rows the given rows count towards, read before an edit or delete changes them"""
+        return {}
+    
+    def sync_derived_tables(self, ids, previous=None):
+        """Refresh tables built from the edited rows (`previous` is collect_derived_rows() read before the change)"""
+        if self.funding_source:
+            FundingRecord.sync(self.funding_source, ids)
+            # Sketches are rebuilt here rather than on the next quantiles request
+            rebuild_quantile_sketches(self.funding_source)
+            # Any edit can move a grant in or out of its neighbours' lists, so the source's lists are rebuilt too
+            rebuild_related_grants(self.funding_source)
+    
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous = self.collect_derived_rows([obj.pk]) if change else None
+            super().save_model(request, obj, form, change)
+            self.sync_derived_tables([obj.pk], previous)
+            DatasetVersion.bump(f'admin:{self.model._meta.model_name}')
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            pk = obj.pk
+            previous = self.collect_derived_rows([pk])
+            super().delete_model(request, obj)
+            self.sync_derived_tables([pk], previous)
+            DatasetVersion.bump(f'admin:{self.model._meta.model_name}')
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True))
+            previous = self.collect_derived_rows(ids)
+            super().delete_queryset(request, queryset)
+            self.sync_derived_tables(ids, previous)
+            DatasetVersion.bump(f'admin:{self.model._meta.model_name}')
+
 
 @admin.register(Grant)
-class GrantAdmin(admin.ModelAdmin):
+class GrantAdmin(DatasetVersionAdminMixin, admin.ModelAdmin):
+    funding_source = 'domestic'
     list_display = ['agreement_title_en', 'recipient_legal_name', 'agreement_value', 
-                   'recipient_province', 'fiscal_year', 'is_major_funding', 'is_notable']
-    list_filter = ['recipient_province', 'fiscal_year', 'is_major_funding', 'is_notable', 'recipient_type']
+                   'recipient_province', 'fiscal_year', 'is_major_funding', 'is_notable', 'is_controversial']
+    list_filter = ['recipient_province', 'fiscal_year', 'is_major_funding', 'is_notable', 'is_controversial', 'recipient_type']
     search_fields = ['agreement_title_en', 'recipient_legal_name', 'description_en', 'program_name_en']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['recipient', 'program', 'naics', 'agreement', 'is_controversial', 'controversial_terms', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('reference_number', 'recipient_province', 'recipient_city_en', 
                       'recipient_legal_name', 'recipient_operating_name', 'recipient_type', 
-                      'recipient_postal_code')
+                      'recipient_postal_code', 'recipient')
         }),
         ('Agreement Details', {
             'fields': ('agreement_title_en', 'agreement_number', 'agreement_value', 
-                      'description_en', 'expected_results_en')
+                      'description_en', 'expected_results_en', 'agreement')
         }),
         ('Dates', {
             'fields': ('agreement_start_date', 'agreement_end_date')
         }),
         ('Program Information', {
-            'fields': ('program_name_en', 'program_purpose_en', 'naics_identifier', 'naics_sector_en')
+            'fields': ('program_name_en', 'program_purpose_en', 'naics_identifier', 'naics_sector_en',
+                      'program', 'naics')
         }),
         ('Classification', {
-            'fields': ('is_notable', 'is_major_funding', 'notable_reason', 'fiscal_year')
+            'fields': ('is_notable', 'is_major_funding', 'notable_reason', 'fiscal_year',
+                      'is_controversial', 'controversial_terms')
         }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
@@ -36,34 +91,66 @@ class GrantAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_notable', 'mark_as_major_funding', 'unmark_notable']
     
+    def collect_derived_rows(self, ids):
+        previous = {'recipients': set(), 'programs': set(), 'naics_codes': set(), 'agreements': set()}
+        for recipient_id, program_id, naics_code, agreement_id in Grant.objects.filter(pk__in=ids).values_list(
+            'recipient_id', 'program_id', 'naics__code', 'agreement_id',
+        ):
+            for key, value in (
+                ('recipients', recipient_id), ('programs', program_id), ('naics_codes', naics_code),
+                ('agreements', agreement_id),
+            ):
+                if value is not None:
+                    previous[key].add(value)
+        return previous
+    
+    def sync_derived_tables(self, ids, previous=None):
+        ids = list(ids)
+        previous = previous or {}
+        refresh_recipients(ids, previous.get('recipients', ()))
+        refresh_dimensions(ids, previous.get('programs', ()), previous.get('naics_codes', ()))
+        # Other amendments of an edited agreement may gain or lose their latest-row status
+        relatest = refresh_agreements(ids, previous.get('agreements', ()))
+        super().sync_derived_tables(set(ids) | relatest)
+    
+    @transaction.atomic
     def mark_as_notable(self, request, queryset):
         queryset.update(is_notable=True)
+        self.sync_derived_tables(queryset.values_list('pk', flat=True))
+        DatasetVersion.bump('admin:mark_as_notable')
         self.message_user(request, f"{queryset.count()} grants marked as notable.")
     mark_as_notable.short_description = "Mark selected grants as notable"
     
+    @transaction.atomic
     def mark_as_major_funding(self, request, queryset):
         queryset.update(is_major_funding=True)
+        self.sync_derived_tables(queryset.values_list('pk', flat=True))
+        DatasetVersion.bump('admin:mark_as_major_funding')
         self.message_user(request, f"{queryset.count()} grants marked as major funding.")
     mark_as_major_funding.short_description = "Mark selected grants as major funding"
     
+    @transaction.atomic
     def unmark_notable(self, request, queryset):
         queryset.update(is_notable=False, notable_reason='')
+        self.sync_derived_tables(queryset.values_list('pk', flat=True))
+        DatasetVersion.bump('admin:unmark_notable')
         self.message_user(request, f"{queryset.count()} grants unmarked as notable.")
     unmark_notable.short_description = "Unmark selected grants as notable"
 
 @admin.register(TaxBracket)
-class TaxBracketAdmin(admin.ModelAdmin):
+class TaxBracketAdmin(DatasetVersionAdminMixin, admin.ModelAdmin):
     list_display = ['year', 'min_income', 'max_income', 'tax_rate']
     list_filter = ['year']
     ordering = ['year', 'min_income']
 
 @admin.register(CanadianTaxData)
-class CanadianTaxDataAdmin(admin.ModelAdmin):
+class CanadianTaxDataAdmin(DatasetVersionAdminMixin, admin.ModelAdmin):
     list_display = ['year', 'total_federal_revenue', 'gst_hst_revenue', 'income_tax_revenue']
     ordering = ['-year']
 
 @admin.register(GlobalAffairsGrant)
-class GlobalAffairsGrantAdmin(admin.ModelAdmin):
+class GlobalAffairsGrantAdmin(DatasetVersionAdminMixin, admin.ModelAdmin):
+    funding_source = 'gac'
     list_display = ['title', 'project_number', 'primary_country', 'maximum_contribution', 'status', 'start_date', 'end_date']
     list_filter = ['status', 'start_date', 'end_date']
     search_fields = ['title', 'project_number', 'description', 'country']
@@ -101,4 +188,99 @@ class GlobalAffairsGrantAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         """Optimize queries for admin interface"""
-        return super().get_queryset(request).select_related().prefetch_related()
\ No newline at end of file
+        return super().get_queryset(request).select_related().prefetch_related()
+    
+    def collect_derived_rows(self, ids):
+        return {'partner_keys': self._partner_keys(ids)}
+    
+    def sync_derived_tables(self, ids, previous=None):
+        ids = list(ids)
+        previous = previous or {}
+        # RecipientLink totals of the partners the grants belonged to before and after the edit
+        refresh_recipient_links(set(previous.get('partner_keys', ())) | self._partner_keys(ids))
+        super().sync_derived_tables(ids)
+    
+    def _partner_keys(self, ids):
+        return {
+            normalize_name(name)
+            for name in GlobalAffairsGrant.objects.filter(pk__in=ids).values_list('executing_agency_partner', flat=True)
+        }
+
+
+@admin.register(DatasetVersion)
+class DatasetVersionAdmin(admin.ModelAdmin):
+    list_display = ['version', 'changed_by', 'updated_at']
+    readonly_fields = ['version', 'changed_by', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False  # Maintained by imports, flagging commands and admin edits
+
+
+@admin.register(HomepageSnapshot)
+class HomepageSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['dataset_version', 'domestic_count', 'gac_count', 'built_at']
+    readonly_fields = [
+        'dataset_version', 'domestic_count', 'domestic_value', 'gac_count', 'gac_value',
+        'recent_major', 'notable_grants', 'built_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False  # Rebuilt by the homepage when the dataset version changes
+
+
+@admin.register(Recipient)
+class RecipientAdmin(admin.ModelAdmin):
+    list_display = ['name', 'recipient_type', 'province', 'grant_count', 'total_value']
+    list_filter = ['recipient_type', 'province']
+    search_fields = ['name', 'key']
+    readonly_fields = ['key', 'name', 'recipient_type', 'province', 'grant_count', 'total_value', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False  # Built from the grants by import_grants and admin edits
+
+
+@admin.register(Program)
+class ProgramAdmin(admin.ModelAdmin):
+    list_display = ['name', 'grant_count', 'total_value']
+    search_fields = ['name']
+    readonly_fields = ['key', 'name', 'grant_count', 'total_value']
+    
+    def has_add_permission(self, request):
+        return False  # Built from the grants by import_grants and admin edits
+
+
+@admin.register(NaicsCode)
+class NaicsCodeAdmin(admin.ModelAdmin):
+    list_display = ['code', 'title', 'level', 'grant_count', 'total_value']
+    list_filter = ['level']
+    search_fields = ['code', 'title']
+    readonly_fields = ['code', 'level', 'parent', 'title', 'grant_count', 'total_value']
+    
+    def has_add_permission(self, request):
+        return False  # Built from the grants by import_grants and admin edits
+
+
+@admin.register(Agreement)
+class AgreementAdmin(admin.ModelAdmin):
+    list_display = ['number', 'title', 'grant_count', 'original_value', 'value', 'latest_fiscal_year']
+    search_fields = ['number', 'recipient_key', 'title']
+    readonly_fields = [
+        'key_hash', 'number', 'recipient_key', 'recipient', 'latest_grant', 'title', 'value', 'original_value',
+        'grant_count', 'first_fiscal_year', 'latest_fiscal_year', 'history', 'updated_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False  # Built from the grants by import_grants and admin edits
+
+
+@admin.register(RecipientLink)
+class RecipientLinkAdmin(admin.ModelAdmin):
+    list_display = ['partner_name', 'recipient', 'method', 'score', 'gac_count', 'gac_value']
+    list_filter = ['method']
+    search_fields = ['partner_name', 'partner_key', 'recipient__name']
+    readonly_fields = [
+        'recipient', 'partner_key', 'partner_name', 'method', 'score', 'gac_count', 'gac_value', 'updated_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False  # Built from the grants by link_recipients
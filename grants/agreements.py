@@ -0,0 +1,185 @@
+"""
+Consolidation of agreement amendments.
+
+Amendments of one agreement are published as separate grant rows, often in
+several fiscal-year files, that repeat the agreement number and recipient
+and report the amended total value. Rows are blocked on a 64-bit hash of the
+normalized (agreement number, recipient key) pair, checked for an exact
+match inside each block, and merged into one Agreement whose value is the
+latest row's. Grants without an agreement number stay on their own.
+"""
+import hashlib
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .dimensions import naics_prefixes, refresh_dimension_totals
+from .entities import normalize_name, fiscal_start_year, refresh_recipient_totals
+from .models import Grant, Agreement
+
+
+AGREEMENT_NUMBER_RE = re.compile(r'\s+')
+
+
+def agreement_number_key(agreement_number, reference_number):
+    """Normalized agreement number, or the grant's own reference number when it has none"""
+    number = AGREEMENT_NUMBER_RE.sub('', agreement_number or '').upper()
+    return (number or f'ref:{reference_number}')[:100]
+
+
+def block_key(number, recipient_key):
+    """Signed 64-bit hash of an agreement identity (fits a BigIntegerField)"""
+    digest = hashlib.blake2b(f'{number}\x1f{recipient_key}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _grant_rows(grants):
+    """(block, identity, row) for each grant; rows sort oldest first"""
+    rows = grants.values_list(
+        'id', 'reference_number', 'agreement_number', 'recipient_legal_name', 'recipient_id',
+        'agreement_title_en', 'agreement_value', 'fiscal_year', 'agreement_id',
+    ).order_by()
+    for grant_id, reference, number, name, recipient_id, title, value, fiscal_year, agreement_id in rows.iterator():
+        identity = (agreement_number_key(number, reference), normalize_name(name))
+        yield block_key(*identity), identity, (
+            fiscal_start_year(fiscal_year) or 0, grant_id, reference, fiscal_year, value, title, recipient_id,
+            agreement_id,
+        )
+
+
+def _fill(agreement, rows):
+    """Set an agreement's fields from its rows, sorted oldest first"""
+    rows.sort()
+    latest = rows[-1]
+    agreement.latest_grant_id = latest[1]
+    agreement.recipient_id = latest[6]
+    agreement.title = latest[5]
+    agreement.value = latest[4]
+    agreement.original_value = rows[0][4]
+    agreement.grant_count = len(rows)
+    agreement.first_fiscal_year = rows[0][3]
+    agreement.latest_fiscal_year = latest[3]
+    agreement.history = [
+        {'grant_id': grant_id, 'reference_number': reference, 'fiscal_year': fiscal_year, 'value': str(value)}
+        for _, grant_id, reference, fiscal_year, value, _, _, _ in rows
+    ]
+
+
+AGREEMENT_FIELDS = [
+    'latest_grant', 'recipient', 'title', 'value', 'original_value', 'grant_count',
+    'first_fiscal_year', 'latest_fiscal_year', 'history',
+]
+
+
+def _consolidate(blocks, existing, batch_size=1000):
+    """
+    Save one Agreement per identity of `blocks` ({block: {identity: rows}}).
+    
+    `existing` maps identities to their current Agreements; those not reused
+    are deleted. Grants are pointed at their agreement, touching only rows
+    whose agreement changed. Returns the grant ids whose latest row changed.
+    """
+    groups, changed, created = [], [], []
+    for identities in blocks.values():
+        for identity, rows in identities.items():
+            agreement = existing.pop(identity, None) or Agreement(
+                key_hash=block_key(*identity), number=identity[0], recipient_key=identity[1],
+            )
+            previous_latest = agreement.latest_grant_id
+            _fill(agreement, rows)
+            (changed if agreement.pk else created).append(agreement)
+            groups.append((agreement, rows, previous_latest))
+    
+    Agreement.objects.filter(pk__in=[agreement.pk for agreement in existing.values()]).delete()
+    Agreement.objects.bulk_update(changed, AGREEMENT_FIELDS, batch_size=batch_size)
+    Agreement.objects.bulk_create(created, batch_size=batch_size)
+    
+    # Not every backend returns primary keys from bulk_create, so new rows are read back by block
+    if created:
+        ids = {}
+        new_blocks = [agreement.key_hash for agreement in created]
+        for start in range(0, len(new_blocks), batch_size):
+            ids.update({
+                (number, recipient_key): pk
+                for pk, number, recipient_key in Agreement.objects.filter(
+                    key_hash__in=new_blocks[start:start + batch_size]
+                ).values_list('id', 'number', 'recipient_key')
+            })
+        for agreement in created:
+            agreement.pk = ids[(agreement.number, agreement.recipient_key)]
+    
+    moved, relatest = [], set()
+    for agreement, rows, previous_latest in groups:
+        for row in rows:
+            if row[7] != agreement.pk:
+                moved.append(Grant(id=row[1], agreement_id=agreement.pk))
+                relatest.add(row[1])
+        if previous_latest != agreement.latest_grant_id:
+            relatest.update(row[1] for row in rows)
+    Grant.objects.bulk_update(moved, ['agreement'], batch_size=batch_size)
+    return relatest
+
+
+def _block(rows):
+    blocks = defaultdict(lambda: defaultdict(list))
+    for block, identity, row in rows:
+        blocks[block][identity].append(row)
+    return blocks
+
+
+@transaction.atomic
+def rebuild_agreements(batch_size=1000):
+    """
+    Regroup every domestic grant into Agreements.
+    
+    Existing agreements keep their ids; agreements left without grants are
+    deleted. Recipient and dimension totals, which count each agreement
+    once, are refreshed afterwards. Returns the number of agreements.
+    """
+    blocks = _block(_grant_rows(Grant.objects.all()))
+    existing = {
+        (agreement.number, agreement.recipient_key): agreement for agreement in Agreement.objects.all()
+    }
+    _consolidate(blocks, existing, batch_size)
+    refresh_recipient_totals(batch_size=batch_size)
+    refresh_dimension_totals(batch_size=batch_size)
+    return sum(len(identities) for identities in blocks.values())
+
+
+@transaction.atomic
+def refresh_agreements(grant_ids, agreement_ids=()):
+    """
+    Re-consolidate the agreements touched by the given grants (after an edit).
+    
+    `agreement_ids` are the agreements of deleted grants, read before the
+    delete, since the grants no longer point at them. Returns the ids of grants whose agreement or latest row changed, whose
+    FundingRecords need to be synced again.
+    """
+    grant_ids = list(grant_ids)
+    edited = list(_grant_rows(Grant.objects.filter(pk__in=grant_ids)))
+    affected = Q(pk__in={row[7] for _, _, row in edited if row[7] is not None} | set(agreement_ids))
+    affected |= Q(key_hash__in={block for block, _, _ in edited})
+    # Agreements whose grants were deleted, or that lost their latest grant
+    affected |= Q(grants__isnull=True) | Q(latest_grant__isnull=True)
+    existing = {
+        (agreement.number, agreement.recipient_key): agreement
+        for agreement in Agreement.objects.filter(affected).distinct()
+    }
+    
+    # Every grant of the affected agreements plus the edited ones, regrouped
+    grants = Grant.objects.filter(
+        Q(pk__in=grant_ids) | Q(agreement__in=[agreement.pk for agreement in existing.values()])
+    )
+    relatest = _consolidate(_block(_grant_rows(grants)), existing)
+    
+    # Rows that gained or lost their latest status move the totals that count each agreement once
+    if relatest:
+        rows = list(Grant.objects.filter(pk__in=relatest).values_list('recipient_id', 'program_id', 'naics__code'))
+        refresh_recipient_totals({recipient_id for recipient_id, _, _ in rows if recipient_id is not None})
+        refresh_dimension_totals(
+            {program_id for _, program_id, _ in rows if program_id is not None},
+            {prefix for _, _, code in rows if code for prefix in naics_prefixes(code)},
+        )
+    return relatest
@@ -0,0 +1,276 @@
+"""
+Aggregate helpers shared by the statistics pages and the analytics APIs.
+"""
+import math
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Aggregate, Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import ExtractYear
+
+from .models import Grant, GlobalAffairsGrant, QuantileSketch
+from .tdigest import TDigest
+
+
+# Value column used for each dataset
+VALUE_SOURCES = {
+    'domestic': (Grant, 'agreement_value'),
+    'gac': (GlobalAffairsGrant, 'maximum_contribution'),
+}
+
+# Bucket edges used by the statistics dashboards (last bucket is open-ended)
+DEFAULT_VALUE_EDGES = [0, 10000, 50000, 100000, 500000, 1000000, 10000000]
+
+MAX_HISTOGRAM_BUCKETS = 50
+
+# Groupings available for per-group quantiles
+QUANTILE_DIMENSIONS = {
+    'domestic': {
+        'province': F('recipient_province'),
+        'program': F('program_name_en'),
+        'year': F('fiscal_year'),
+        'sector': F('naics_sector_en'),
+        'recipient_type': F('recipient_type'),
+    },
+    'gac': {
+        'status': F('status'),
+        'country': F('country'),
+        'region': F('region'),
+        'program': F('program_name'),
+        'year': ExtractYear('start_date'),
+    },
+}
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def get_value_source(source):
+    """Return (queryset, value_field) for a dataset name"""
+    if source not in VALUE_SOURCES:
+        raise ValueError(f"Unknown source '{source}' (expected one of: {', '.join(VALUE_SOURCES)})")
+    model, field = VALUE_SOURCES[source]
+    return model.objects.all(), field
+
+
+def log_edges(minimum, maximum, buckets):
+    """Build logarithmically spaced bucket edges between minimum and maximum"""
+    if minimum <= 0 or maximum <= minimum:
+        raise ValueError('Log-scaled edges need 0 < min < max')
+    if buckets < 1 or buckets > MAX_HISTOGRAM_BUCKETS:
+        raise ValueError(f'Bucket count must be between 1 and {MAX_HISTOGRAM_BUCKETS}')
+
+    ratio = math.log10(maximum / minimum) / buckets
+    edges = [minimum * 10 ** (ratio * i) for i in range(buckets + 1)]
+    # Round to 3 significant figures so labels stay readable
+    return sorted({float(f'{edge:.3g}') for edge in edges})
+
+
+def format_amount(amount):
+    """Short currency label like $500, $10K, $2.5M or $1B"""
+    amount = float(amount)
+    for threshold, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+        if abs(amount) >= threshold:
+            return f"${amount / threshold:g}{suffix}"
+    return f"${amount:g}"
+
+
+def bucket_labels(edges):
+    """Human readable labels for the buckets defined by ascending edges"""
+    labels = []
+    for i, lower in enumerate(edges):
+        if i == len(edges) - 1:
+            labels.append(f"Over {format_amount(lower)}")
+        elif i == 0 and lower == 0:
+            labels.append(f"Under {format_amount(edges[1])}")
+        else:
+            labels.append(f"{format_amount(lower)} - {format_amount(edges[i + 1])}")
+    return labels
+
+
+def histogram(queryset, field, edges=None, labels=None):
+    """
+    Count and sum `field` into buckets with a single CASE / GROUP BY query.
+
+    `edges` are ascending lower bounds; each bucket covers [edge, next_edge)
+    and the last one is open-ended. Rows below the first edge (or without a
+    value) fall in no bucket but still count towards the percentages, which
+    are shares of every row. Returns (buckets, excluded_count).
+    """
+    edges = list(edges if edges is not None else DEFAULT_VALUE_EDGES)
+    if not edges:
+        raise ValueError('At least one bucket edge is required')
+    if len(edges) > MAX_HISTOGRAM_BUCKETS:
+        raise ValueError(f'At most {MAX_HISTOGRAM_BUCKETS} buckets are supported')
+    if not all(math.isfinite(edge) for edge in edges):
+        raise ValueError('Bucket edges must be finite numbers')
+    if any(later <= earlier for earlier, later in zip(edges, edges[1:])):
+        raise ValueError('Bucket edges must be strictly ascending')
+    labels = labels or bucket_labels(edges)
+
+    # Walk the edges from the top so each When only needs a lower bound
+    whens = [
+        When(**{f'{field}__gte': Decimal(str(edge))}, then=Value(i))
+        for i, edge in reversed(list(enumerate(edges)))
+    ]
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=Case(*whens, default=Value(-1), output_field=IntegerField()))
+        .values('bucket')
+        .annotate(count=Count('id'), total_value=Sum(field))
+    )
+    by_bucket = {row['bucket']: row for row in rows}
+
+    total_count = sum(row['count'] for row in by_bucket.values())
+    excluded_count = by_bucket.get(-1, {}).get('count', 0)
+    distribution = []
+    for i, edge in enumerate(edges):
+        row = by_bucket.get(i, {})
+        count = row.get('count', 0)
+        distribution.append({
+            'range': labels[i],
+            'min': float(edge),
+            'max': float(edges[i + 1]) if i + 1 < len(edges) else None,
+            'count': count,
+            'total_value': float(row.get('total_value') or 0),
+            'percentage': round(count / total_count * 100, 1) if total_count > 0 else 0,
+        })
+    return distribution, excluded_count
+
+
+# =============================================================================
+# QUANTILES
+# =============================================================================
+
+class PercentileCont(Aggregate):
+    """PostgreSQL percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)"""
+    function = 'PERCENTILE_CONT'
+    name = 'PercentileCont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+    
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def quantile_label(fraction):
+    """Response key for a quantile fraction: median, p90, p99, p99.9..."""
+    if fraction == 0.5:
+        return 'median'
+    return f"p{fraction * 100:g}"
+
+
+def parse_quantiles(value):
+    """Parse '0.5,0.9' (or None for the defaults) into validated fractions"""
+    if not value:
+        return DEFAULT_QUANTILES
+    fractions = tuple(float(part) for part in value.split(',') if part.strip())
+    if not fractions or len(fractions) > 10 or not all(0 < q < 1 for q in fractions):
+        raise ValueError('Quantiles must be 1-10 fractions between 0 and 1')
+    return fractions
+
+
+def get_group_expression(source, group_by):
+    """Return the grouping expression for a source dimension (None = overall)"""
+    if not group_by or group_by == 'all':
+        return None
+    dimensions = QUANTILE_DIMENSIONS.get(source, {})
+    if group_by not in dimensions:
+        raise ValueError(f"Cannot group {source} grants by '{group_by}' (expected one of: {', '.join(dimensions)})")
+    return dimensions[group_by]
+
+
+def group_key(group):
+    """Group label returned by both quantile paths (sketches store groups as text)"""
+    return '' if group is None else str(group)
+
+
+def database_has_percentiles():
+    return connection.vendor == 'postgresql'
+
+
+def value_quantiles(source, group_by=None, fractions=DEFAULT_QUANTILES):
+    """
+    Quantiles of grant values, optionally per group.
+    
+    Uses percentile_cont on PostgreSQL and falls back to the stored t-digest
+    sketches elsewhere. Returns (method, rows) where each row holds the group,
+    its value count and a dict of quantiles keyed by quantile_label().
+    """
+    grants, field = get_value_source(source)
+    group_expression = get_group_expression(source, group_by)
+    
+    if database_has_percentiles():
+        aggregates = {f'q{i}': PercentileCont(field, q) for i, q in enumerate(fractions)}
+        if group_expression is None:
+            result = grants.aggregate(count=Count('id'), **aggregates)
+            raw_rows = [dict(result, group=None)]
+        else:
+            raw_rows = (
+                grants.order_by()
+                .annotate(group=group_expression)
+                .values('group')
+                .annotate(count=Count('id'), **aggregates)
+                .order_by('-count')
+            )
+        rows = [{
+            'group': group_key(row['group']) if group_expression is not None else None,
+            'count': row['count'],
+            'quantiles': {quantile_label(q): row[f'q{i}'] for i, q in enumerate(fractions)},
+        } for row in raw_rows]
+        return 'database', rows
+    
+    rows = []
+    for sketch in load_quantile_sketches(source, group_by or 'all'):
+        digest = TDigest.from_dict(sketch.digest)
+        rows.append({
+            'group': sketch.group_value if group_expression is not None else None,
+            'count': sketch.value_count,
+            'quantiles': {quantile_label(q): digest.quantile(q) for q in fractions},
+        })
+    return 'sketch', rows
+
+
+@transaction.atomic
+def build_quantile_sketches(source, dimension='all'):
+    """Stream one dimension's values into per-group t-digests and store them"""
+    grants, field = get_value_source(source)
+    group_expression = get_group_expression(source, dimension)
+    
+    digests = {}
+    if group_expression is None:
+        values = ((None, value) for value in grants.order_by().values_list(field, flat=True).iterator())
+    else:
+        values = grants.order_by().annotate(group=group_expression).values_list('group', field).iterator()
+    
+    for group, value in values:
+        if value is None:
+            continue
+        digests.setdefault(group_key(group), TDigest()).add(value)
+    
+    QuantileSketch.objects.filter(source=source, dimension=dimension).delete()
+    return QuantileSketch.objects.bulk_create([
+        QuantileSketch(
+            source=source,
+            dimension=dimension,
+            group_value=group,
+            value_count=digest.count,
+            digest=digest.to_dict(),
+        )
+        for group, digest in sorted(digests.items(), key=lambda item: -item[1].count)
+    ])
+
+
+def load_quantile_sketches(source, dimension='all'):
+    """Stored sketches for a dimension (never built here, see rebuild_quantile_sketches)"""
+    return list(QuantileSketch.objects.filter(source=source, dimension=dimension))
+
+
+def rebuild_quantile_sketches(source):
+    """Refresh every stored sketch for a dataset (run after imports, flagging and admin edits)"""
+    if database_has_percentiles():
+        return 0  # percentile_cont is used directly, sketches are never read
+    
+    count = 0
+    for dimension in ['all', *QUANTILE_DIMENSIONS[source]]:
+        count += len(build_quantile_sketches(source, dimension))
+    return count
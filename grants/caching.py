@@ -0,0 +1,180 @@
+"""
+Response caching for the read-only JSON APIs.
+
+Entries are keyed on the view name, the normalized query string and the
+dataset version, so an import or flagging run invalidates everything at
+once without waiting for a TTL.
+
+Expensive dashboards additionally go through get_or_compute(), which lets a
+single worker recompute a value after the version changes while the others
+keep serving the previous value (stale-while-revalidate).
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .versioning import get_dataset_version
+
+
+# Query parameters that never change the response (cache busters)
+IGNORED_QUERY_PARAMS = {'_', 'callback'}
+
+STATS_KEY_PREFIX = 'api-cache-stats'
+
+
+def normalized_query_string(request):
+    """Sorted query string without blank values or cache-busting parameters"""
+    params = []
+    for key in sorted(request.GET.keys()):
+        if key in IGNORED_QUERY_PARAMS:
+            continue
+        for value in sorted(request.GET.getlist(key)):
+            if value.strip():
+                params.append((key, value.strip()))
+    return urlencode(params)
+
+
+def response_cache_key(request, name, view_kwargs=None):
+    """Cache key for a request to the named view at the current dataset version"""
+    version = get_dataset_version(request).version
+    url_params = urlencode(sorted((view_kwargs or {}).items()))
+    digest = hashlib.sha1(f"{url_params}?{normalized_query_string(request)}".encode('utf-8')).hexdigest()
+    return f"api:{name}:v{version}:{digest}"
+
+
+def _increment(key):
+    # add() is a no-op when the counter already exists, so incr() never misses
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def record_cache_access(name, hit, stale=False):
+    _increment(f"{STATS_KEY_PREFIX}:{name}:{'hits' if hit else 'misses'}")
+    if stale:
+        _increment(f"{STATS_KEY_PREFIX}:{name}:stale")
+
+
+def get_cache_stats(names):
+    """Hit/miss counters (since the cache was last cleared) for the given view names"""
+    keys = [f"{STATS_KEY_PREFIX}:{name}:{kind}" for name in names for kind in ('hits', 'misses', 'stale')]
+    counters = cache.get_many(keys)
+    stats = {}
+    for name in names:
+        hits = counters.get(f"{STATS_KEY_PREFIX}:{name}:hits", 0)
+        misses = counters.get(f"{STATS_KEY_PREFIX}:{name}:misses", 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'stale_hits': counters.get(f"{STATS_KEY_PREFIX}:{name}:stale", 0),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+
+# View names registered with cache_api_response or get_or_compute, for the stats endpoint
+CACHED_VIEWS = []
+
+
+def get_or_compute(name, compute, request=None, timeout=None, lock_timeout=120, wait_timeout=30):
+    """
+    Return the cached value for `name` at the current dataset version.
+
+    Only one worker recomputes a missing or outdated value: it takes a lock
+    with cache.add() while the others return the previous version's value,
+    or wait for the new one when there is nothing to fall back on. The lock
+    only spans workers when the cache backend is shared (file or redis).
+    """
+    if name not in CACHED_VIEWS:
+        CACHED_VIEWS.append(name)
+    timeout = settings.API_CACHE_TIMEOUT if timeout is None else timeout
+    version = get_dataset_version(request).version
+    key = f"swr:{name}"
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] >= version:
+        record_cache_access(name, hit=True)
+        return entry[1]
+
+    lock_key = f"{key}:lock:v{version}"
+    if cache.add(lock_key, 1, lock_timeout):
+        record_cache_access(name, hit=False)
+        try:
+            value = compute()
+            cache.set(key, (version, value), timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    # Another worker is recomputing
+    if entry is not None:
+        record_cache_access(name, hit=True, stale=True)
+        return entry[1]
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[0] >= version:
+            record_cache_access(name, hit=True)
+            return entry[1]
+        if cache.get(lock_key) is None:
+            break  # The other worker gave up; compute it here instead
+
+    record_cache_access(name, hit=False)
+    return compute()
+
+
+@contextmanager
+def rebuild_lock(name, lock_timeout=120):
+    """
+    Yield whether this worker may rebuild the derived table `name`.
+    
+    Workers that do not get the lock serve the rows they already have; the
+    rebuild itself is serialized on DatasetVersion.lock().
+    """
+    lock_key = f"rebuild:{name}:lock"
+    acquired = cache.add(lock_key, 1, lock_timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def cache_api_response(view):
+    """Serve GET responses of a read-only JSON view from the cache"""
+    name = view.__name__
+    CACHED_VIEWS.append(name)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        key = response_cache_key(request, name, kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            record_cache_access(name, hit=True)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record_cache_access(name, hit=False)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), settings.API_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
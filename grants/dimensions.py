@@ -0,0 +1,190 @@
+"""
+Program and NAICS dimension tables for domestic grants.
+
+Grants point at a Program (matched on the case- and whitespace-insensitive
+program name) and at the NaicsCode of their naics_identifier. Every prefix
+of a NAICS code down to the 2-digit sector gets a node whose totals roll up
+all grants below it, so sector and program breakdowns read precomputed rows.
+Totals count each agreement once (Grant.counted()).
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .entities import most_common
+from .models import Grant, Program, NaicsCode
+
+
+NAICS_MIN_LEVEL = 2
+NAICS_MAX_LEVEL = 6
+
+
+def program_key(name):
+    return ' '.join(name.split()).casefold()[:255]
+
+
+def clean_naics_code(identifier):
+    """Digits of a NAICS identifier (at most 6), or '' when too short to place"""
+    digits = ''.join(char for char in identifier or '' if char.isdigit())[:NAICS_MAX_LEVEL]
+    return digits if len(digits) >= NAICS_MIN_LEVEL else ''
+
+
+def naics_prefixes(code):
+    """Codes of a NAICS node and all its ancestors, sector first"""
+    return [code[:level] for level in range(NAICS_MIN_LEVEL, len(code) + 1)]
+
+
+def _save_nodes(model, key_field, groups, fields, batch_size):
+    """Create, update and delete `model` rows so they match {key: {field: value}}; returns {key: id}"""
+    existing = {getattr(row, key_field): row for row in model.objects.all()}
+    changed, created = [], []
+    for key, values in groups.items():
+        row = existing.pop(key, None) or model(**{key_field: key})
+        for field in fields:
+            setattr(row, field, values[field])
+        (changed if row.pk else created).append(row)
+    model.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+    model.objects.bulk_update(changed, fields, batch_size=batch_size)
+    model.objects.bulk_create(created, batch_size=batch_size)
+    return dict(model.objects.values_list(key_field, 'id'))
+
+
+@transaction.atomic
+def rebuild_dimensions(batch_size=1000):
+    """
+    Regroup every domestic grant into Programs and NaicsCodes and refresh their totals.
+    
+    Existing rows keep their ids; rows left without grants are deleted.
+    Returns (program count, NAICS node count).
+    """
+    programs = defaultdict(lambda: {'names': Counter()})
+    naics = defaultdict(lambda: {'titles': Counter()})
+    assignments = []
+    
+    rows = Grant.objects.values_list(
+        'id', 'program_name_en', 'naics_identifier', 'naics_sector_en', 'program_id', 'naics_id',
+    ).order_by()
+    for grant_id, program_name, identifier, sector, program_id, naics_id in rows.iterator():
+        key = program_key(program_name)
+        if key:
+            programs[key]['names'][' '.join(program_name.split())] += 1
+        
+        code = clean_naics_code(identifier)
+        for prefix in naics_prefixes(code) if code else []:
+            node = naics[prefix]
+            if sector:
+                node['titles'][sector] += 1
+        assignments.append((grant_id, key, code, program_id, naics_id))
+    
+    for group in programs.values():
+        group['name'] = most_common(group['names'])
+    program_ids = _save_nodes(Program, 'key', programs, ['name'], batch_size)
+    
+    for code, node in naics.items():
+        node['level'] = len(code)
+        node['title'] = most_common(node['titles'])[:200]
+    naics_ids = _save_nodes(NaicsCode, 'code', naics, ['level', 'title'], batch_size)
+    NaicsCode.objects.bulk_update(
+        [NaicsCode(id=node_id, parent_id=naics_ids.get(code[:-1])) for code, node_id in naics_ids.items()],
+        ['parent'], batch_size=batch_size,
+    )
+    
+    # Point grants at their dimensions, touching only rows that changed
+    moved = []
+    for grant_id, key, code, program_id, naics_id in assignments:
+        new_program_id = program_ids.get(key)
+        new_naics_id = naics_ids.get(code)
+        if (new_program_id, new_naics_id) != (program_id, naics_id):
+            moved.append(Grant(id=grant_id, program_id=new_program_id, naics_id=new_naics_id))
+    Grant.objects.bulk_update(moved, ['program', 'naics'], batch_size=batch_size)
+    
+    refresh_dimension_totals(batch_size=batch_size)
+    return len(program_ids), len(naics_ids)
+
+
+@transaction.atomic
+def refresh_dimension_totals(program_ids=None, naics_codes=None, batch_size=1000):
+    """
+    Recompute the totals of the given Programs and NAICS nodes (default all).
+    
+    Only Grant.counted() rows are summed, so an agreement with amendments
+    adds its latest value once. Run again after agreements are regrouped.
+    """
+    programs = Program.objects.all() if program_ids is None else Program.objects.filter(pk__in=list(program_ids))
+    totals = {program_id: (0, Decimal('0')) for program_id in programs.values_list('id', flat=True)}
+    rows = Grant.counted().filter(program_id__in=list(totals)).order_by().values_list('program_id').annotate(
+        count=Count('id'), value=Sum('agreement_value')
+    )
+    totals.update({program_id: (count, value or 0) for program_id, count, value in rows})
+    Program.objects.bulk_update([
+        Program(id=program_id, grant_count=count, total_value=value) for program_id, (count, value) in totals.items()
+    ], ['grant_count', 'total_value'], batch_size=batch_size)
+    
+    # Leaf totals rolled up into every prefix (a few thousand codes at most)
+    nodes = NaicsCode.objects.all() if naics_codes is None else NaicsCode.objects.filter(code__in=list(naics_codes))
+    node_ids = dict(nodes.values_list('code', 'id'))
+    rollups = {code: [0, Decimal('0')] for code in node_ids}
+    rows = Grant.counted().filter(naics__isnull=False).order_by().values_list('naics__code').annotate(
+        count=Count('id'), value=Sum('agreement_value')
+    )
+    for code, count, value in rows:
+        for prefix in naics_prefixes(code):
+            if prefix in rollups:
+                rollups[prefix][0] += count
+                rollups[prefix][1] += value or 0
+    NaicsCode.objects.bulk_update([
+        NaicsCode(id=node_ids[code], grant_count=count, total_value=value) for code, (count, value) in rollups.items()
+    ], ['grant_count', 'total_value'], batch_size=batch_size)
+
+
+@transaction.atomic
+def refresh_dimensions(grant_ids, program_ids=(), naics_codes=()):
+    """
+    Re-match the given grants (after an edit) and refresh the totals they touch.
+    
+    Deleted grants no longer point at their Program and NaicsCode, so the
+    caller passes the ones they belonged to in `program_ids` and `naics_codes`.
+    """
+    grant_ids = list(grant_ids)
+    affected_programs = set(program_ids)
+    affected_programs.update(
+        Grant.objects.filter(pk__in=grant_ids, program__isnull=False).values_list('program_id', flat=True)
+    )
+    affected_codes = set()
+    for code in list(naics_codes) + list(
+        Grant.objects.filter(pk__in=grant_ids, naics__isnull=False).values_list('naics__code', flat=True)
+    ):
+        affected_codes.update(naics_prefixes(code))
+    # Rows orphaned by deleted grants
+    affected_programs.update(Program.objects.filter(grants__isnull=True).values_list('id', flat=True))
+    for code in NaicsCode.objects.filter(grants__isnull=True, children__isnull=True).values_list('code', flat=True):
+        affected_codes.update(naics_prefixes(code))
+    
+    for grant in Grant.objects.filter(pk__in=grant_ids).only(
+        'id', 'program_name_en', 'naics_identifier', 'naics_sector_en', 'program_id', 'naics_id',
+    ):
+        program = None
+        key = program_key(grant.program_name_en)
+        if key:
+            program, _ = Program.objects.get_or_create(key=key, defaults={'name': ' '.join(grant.program_name_en.split())})
+            affected_programs.add(program.id)
+        
+        node = None
+        code = clean_naics_code(grant.naics_identifier)
+        for prefix in naics_prefixes(code) if code else []:
+            node, _ = NaicsCode.objects.get_or_create(code=prefix, defaults={
+                'level': len(prefix), 'parent': node, 'title': grant.naics_sector_en[:200],
+            })
+            affected_codes.add(prefix)
+        
+        if (grant.program_id, grant.naics_id) != (program and program.id, node and node.id):
+            Grant.objects.filter(pk=grant.pk).update(program=program, naics=node)
+    
+    Program.objects.filter(pk__in=affected_programs, grants__isnull=True).delete()
+    # Deepest nodes first so emptied children are gone before their parents are checked
+    for node in NaicsCode.objects.filter(code__in=affected_codes).order_by('-level'):
+        if not Grant.objects.filter(naics__code__startswith=node.code).exists():
+            node.delete()
+    refresh_dimension_totals(affected_programs, affected_codes)
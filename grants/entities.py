@@ -0,0 +1,189 @@
+"""
+Entity resolution for grant recipients.
+
+Legal names are reduced to a normalized key (accents, case, punctuation and
+legal-form suffixes removed) so spelling variants such as "Université Laval"
+and "Universite Laval" map to one Recipient. Each Recipient keeps the most
+common spelling as its name and precomputed grant totals, which count each
+agreement once (Grant.counted()).
+"""
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Grant, Recipient, RecipientYear
+
+
+# Legal-form words dropped from the end of a name ("Acme Inc." == "Acme")
+LEGAL_SUFFIXES = frozenset(
+    'inc incorporated incorporee ltd limited ltee llc llp corp corporation co company cie'.split()
+)
+
+NAME_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+FISCAL_YEAR_RE = re.compile(r'(\d{4})')
+
+
+def normalize_name(name):
+    """Matching key of an organization name"""
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char)).lower()
+    name = name.replace('&', ' and ')
+    tokens = NAME_TOKEN_RE.findall(name)
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == 'the':
+        tokens.pop(0)
+    return ' '.join(tokens)[:255]
+
+
+def fiscal_start_year(fiscal_year):
+    """2023 for "2023-24" or "2023-2024", None when there is no year"""
+    match = FISCAL_YEAR_RE.match(fiscal_year or '')
+    return int(match.group(1)) if match else None
+
+
+def yearly_rows(recipient_id, years):
+    """RecipientYear rows from {year: [count, value]}"""
+    return [
+        RecipientYear(recipient_id=recipient_id, year=year, grant_count=count, total_value=value)
+        for year, (count, value) in sorted(years.items())
+    ]
+
+
+def most_common(counter):
+    """Most frequent value; ties prefer accented spellings, then alphabetical order"""
+    return max(counter.items(), key=lambda item: (item[1], not item[0].isascii(), item[0]))[0] if counter else ''
+
+
+@transaction.atomic
+def rebuild_recipients(batch_size=1000):
+    """
+    Regroup every grant into Recipients and refresh their totals.
+    
+    Existing recipients keep their ids (and URLs); recipients left without
+    grants are deleted. Returns the number of recipients.
+    """
+    groups = defaultdict(lambda: {'names': Counter(), 'types': Counter(), 'provinces': Counter(), 'grants': []})
+    current = {}
+    rows = Grant.objects.values_list(
+        'id', 'recipient_legal_name', 'recipient_type', 'recipient_province', 'recipient_id',
+    ).order_by()
+    for grant_id, name, recipient_type, province, recipient_id in rows.iterator():
+        key = normalize_name(name)
+        group = groups[key]
+        group['names'][name.strip()] += 1
+        group['types'][recipient_type] += 1
+        group['provinces'][province] += 1
+        group['grants'].append(grant_id)
+        current[grant_id] = recipient_id
+    
+    existing = {recipient.key: recipient for recipient in Recipient.objects.all()}
+    changed, created = [], []
+    for key, group in groups.items():
+        recipient = existing.pop(key, None) or Recipient(key=key)
+        recipient.name = most_common(group['names'])
+        recipient.recipient_type = most_common(group['types'])[:10]
+        recipient.province = most_common(group['provinces'])[:50]
+        (changed if recipient.pk else created).append(recipient)
+    
+    Recipient.objects.filter(pk__in=[recipient.pk for recipient in existing.values()]).delete()
+    Recipient.objects.bulk_update(changed, ['name', 'recipient_type', 'province'], batch_size=batch_size)
+    Recipient.objects.bulk_create(created, batch_size=batch_size)
+    
+    # Point grants at their recipient, touching only rows whose recipient changed
+    recipient_ids = dict(Recipient.objects.values_list('key', 'id'))
+    moved = [
+        Grant(id=grant_id, recipient_id=recipient_ids[key])
+        for key, group in groups.items()
+        for grant_id in group['grants']
+        if current[grant_id] != recipient_ids[key]
+    ]
+    Grant.objects.bulk_update(moved, ['recipient'], batch_size=batch_size)
+    
+    refresh_recipient_totals(batch_size=batch_size)
+    return len(recipient_ids)
+
+
+@transaction.atomic
+def refresh_recipient_totals(recipient_ids=None, batch_size=1000):
+    """
+    Recompute the totals and yearly rollups of the given recipients (default all).
+    
+    Only Grant.counted() rows are summed, so an agreement with amendments
+    adds its latest value once. Run again after agreements are regrouped.
+    """
+    recipients = Recipient.objects.all()
+    grants = Grant.counted().filter(recipient__isnull=False)
+    yearly = RecipientYear.objects.all()
+    if recipient_ids is not None:
+        recipient_ids = list(recipient_ids)
+        recipients = recipients.filter(pk__in=recipient_ids)
+        grants = grants.filter(recipient_id__in=recipient_ids)
+        yearly = yearly.filter(recipient_id__in=recipient_ids)
+    
+    totals = {recipient_id: [0, Decimal('0')] for recipient_id in recipients.values_list('id', flat=True)}
+    years = defaultdict(lambda: defaultdict(lambda: [0, Decimal('0')]))
+    rows = grants.order_by().values_list('recipient_id', 'fiscal_year').annotate(
+        count=Count('id'), value=Sum('agreement_value')
+    )
+    for recipient_id, fiscal_year, count, value in rows:
+        totals[recipient_id][0] += count
+        totals[recipient_id][1] += value or 0
+        year = fiscal_start_year(fiscal_year)
+        if year is not None:
+            years[recipient_id][year][0] += count
+            years[recipient_id][year][1] += value or 0
+    
+    Recipient.objects.bulk_update([
+        Recipient(id=recipient_id, grant_count=count, total_value=value)
+        for recipient_id, (count, value) in totals.items()
+    ], ['grant_count', 'total_value'], batch_size=batch_size)
+    
+    # Yearly rollups behind the recipient pages
+    yearly.delete()
+    RecipientYear.objects.bulk_create([
+        row for recipient_id, recipient_years in years.items() for row in yearly_rows(recipient_id, recipient_years)
+    ], batch_size=batch_size)
+
+
+@transaction.atomic
+def refresh_recipients(grant_ids, recipient_ids=()):
+    """
+    Re-match the given grants (after an edit) and refresh the totals they touch.
+    
+    Deleted grants no longer point at their recipient, so the caller passes
+    the recipients they belonged to in `recipient_ids`.
+    """
+    grant_ids = list(grant_ids)
+    affected = set(recipient_ids)
+    affected.update(
+        Grant.objects.filter(pk__in=grant_ids, recipient__isnull=False).values_list('recipient_id', flat=True)
+    )
+    affected.update(
+        Recipient.objects.filter(grants__isnull=True).values_list('id', flat=True)
+    )
+    
+    for grant in Grant.objects.filter(pk__in=grant_ids).only(
+        'id', 'recipient_legal_name', 'recipient_type', 'recipient_province', 'recipient_id',
+    ):
+        recipient, _ = Recipient.objects.get_or_create(
+            key=normalize_name(grant.recipient_legal_name),
+            defaults={
+                'name': grant.recipient_legal_name.strip(),
+                'recipient_type': grant.recipient_type[:10],
+                'province': grant.recipient_province[:50],
+            },
+        )
+        if grant.recipient_id != recipient.id:
+            Grant.objects.filter(pk=grant.pk).update(recipient=recipient)
+        affected.add(recipient.id)
+    
+    Recipient.objects.filter(pk__in=affected, grants__isnull=True).delete()
+    refresh_recipient_totals(affected)
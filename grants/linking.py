@@ -0,0 +1,139 @@
+"""
+Linking of GAC executing agency partners to domestic recipients.
+
+Partner names are normalized like recipient names (grants.entities), so
+"World Vision Canada Inc." links to "World Vision Canada" directly. Other
+partners are compared only with recipients that share a rare name token
+(blocking), scored by token-set similarity, and linked to the best match
+above LINK_THRESHOLD. Every partner is linked to at most one recipient.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .entities import normalize_name, most_common
+from .models import GlobalAffairsGrant, Recipient, RecipientLink
+
+
+# Lowest token similarity for a link between names that differ
+LINK_THRESHOLD = 0.8
+
+# Tokens shared by more recipients than this ("canada", "association") do not form blocks
+MAX_BLOCK_SIZE = 200
+
+
+def name_similarity(tokens, other):
+    """Dice coefficient of two token sets ("canadian red cross" vs "canadian red cross society" is 0.86)"""
+    if not tokens or not other:
+        return 0.0
+    return 2 * len(tokens & other) / (len(tokens) + len(other))
+
+
+def _partners(keys=None):
+    """{partner_key: {'names', 'count', 'value'}} over every GAC grant (only `keys` when given)"""
+    partners = defaultdict(lambda: {'names': Counter(), 'count': 0, 'value': Decimal('0')})
+    rows = GlobalAffairsGrant.objects.values_list('executing_agency_partner', 'maximum_contribution').order_by()
+    for name, value in rows.iterator():
+        key = normalize_name(name)
+        if not key or (keys is not None and key not in keys):
+            continue
+        partner = partners[key]
+        partner['names'][name.strip()] += 1
+        partner['count'] += 1
+        partner['value'] += value or 0
+    return partners
+
+
+def best_match(key, recipients, blocks):
+    """(recipient_id, method, score) of a partner key, or None when nothing is close enough"""
+    if key in recipients:
+        return recipients[key][0], 'exact', 1.0
+    
+    tokens = set(key.split())
+    candidates = set()
+    for token in tokens:
+        candidates.update(blocks.get(token, ()))
+    
+    best = None
+    for candidate in candidates:
+        recipient_id, recipient_tokens, total_value = recipients[candidate]
+        score = name_similarity(tokens, recipient_tokens)
+        # Ties go to the recipient with more domestic funding
+        if score >= LINK_THRESHOLD and (best is None or (score, total_value) > best[0]):
+            best = ((score, total_value), recipient_id)
+    if best is None:
+        return None
+    return best[1], 'similar', best[0][0]
+
+
+def _recipient_index():
+    """({key: (recipient_id, tokens, total_value)}, {token: keys}) used by best_match"""
+    recipients = {}
+    blocks = defaultdict(list)
+    for recipient_id, key, total_value in Recipient.objects.values_list('id', 'key', 'total_value').order_by():
+        tokens = set(key.split())
+        recipients[key] = (recipient_id, tokens, total_value)
+        for token in tokens:
+            blocks[token].append(key)
+    return recipients, {token: keys for token, keys in blocks.items() if len(keys) <= MAX_BLOCK_SIZE}
+
+
+def _link(key, partner, match):
+    recipient_id, method, score = match
+    return RecipientLink(
+        recipient_id=recipient_id,
+        partner_key=key,
+        partner_name=most_common(partner['names']),
+        method=method,
+        score=round(score, 4),
+        gac_count=partner['count'],
+        gac_value=partner['value'],
+    )
+
+
+@transaction.atomic
+def rebuild_recipient_links(batch_size=1000):
+    """Relink every GAC partner; returns the number of links"""
+    recipients, blocks = _recipient_index()
+    
+    links = []
+    for key, partner in _partners().items():
+        match = best_match(key, recipients, blocks)
+        if match is not None:
+            links.append(_link(key, partner, match))
+    
+    RecipientLink.objects.all().delete()
+    RecipientLink.objects.bulk_create(links, batch_size=batch_size)
+    return len(links)
+
+
+@transaction.atomic
+def refresh_recipient_links(partner_keys):
+    """
+    Refresh the links of the given partners after GAC grants were edited.
+    
+    Linked partners keep their recipient and get new totals, partners without
+    grants lose their link, and new partners are matched. Recipients changed
+    by domestic imports still need a full rebuild_recipient_links().
+    """
+    partner_keys = {key for key in partner_keys if key}
+    if not partner_keys:
+        return
+    partners = _partners(partner_keys)
+    RecipientLink.objects.filter(partner_key__in=partner_keys - set(partners)).delete()
+    
+    linked = {link.partner_key: link for link in RecipientLink.objects.filter(partner_key__in=partners)}
+    index = None
+    for key, partner in partners.items():
+        link = linked.get(key)
+        if link is not None:
+            link.partner_name = most_common(partner['names'])
+            link.gac_count = partner['count']
+            link.gac_value = partner['value']
+            link.save(update_fields=['partner_name', 'gac_count', 'gac_value', 'updated_at'])
+            continue
+        index = index or _recipient_index()
+        match = best_match(key, *index)
+        if match is not None:
+            _link(key, partner, match).save()
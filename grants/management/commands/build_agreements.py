@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.agreements import rebuild_agreements
+from grants.models import Agreement, FundingRecord, DatasetVersion
+
+
+class Command(BaseCommand):
+    help = 'Merge amendments of the same agreement into Agreements and refresh the funding records'
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        count = rebuild_agreements()
+        totals = Agreement.totals()
+        self.stdout.write(f'Merged {totals["rows"]} grants into {count} agreements')
+        
+        # Earlier amendments are flagged so combined totals count each agreement once
+        FundingRecord.sync('domestic')
+        DatasetVersion.bump('build_agreements')
+        
+        self.stdout.write(self.style.SUCCESS('Agreements rebuilt'))
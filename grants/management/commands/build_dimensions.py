@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.dimensions import rebuild_dimensions
+from grants.entities import rebuild_recipients
+from grants.models import DatasetVersion
+
+
+class Command(BaseCommand):
+    help = 'Group domestic grants into Recipients, Programs and NAICS codes and refresh their totals'
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipients = rebuild_recipients()
+        self.stdout.write(f'Built {recipients} recipients')
+        
+        programs, naics_codes = rebuild_dimensions()
+        self.stdout.write(f'Built {programs} programs and {naics_codes} NAICS codes')
+        
+        # Rankings and breakdowns read from these tables
+        DatasetVersion.bump('build_dimensions')
+        
+        self.stdout.write(self.style.SUCCESS('Grant dimensions rebuilt'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.analytics import rebuild_quantile_sketches, database_has_percentiles
+from grants.models import DatasetVersion
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored t-digest sketches used for quantiles when the database has no percentile functions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['domestic', 'gac'],
+                          help='Only rebuild sketches for one dataset')
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if database_has_percentiles():
+            self.stdout.write('Database supports percentile_cont; sketches are not needed')
+            return
+        
+        sources = [options['source']] if options['source'] else ['domestic', 'gac']
+        for source in sources:
+            count = rebuild_quantile_sketches(source)
+            self.stdout.write(f'Built {count} {source} quantile sketches')
+        
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('build_quantile_sketches')
+        
+        self.stdout.write(self.style.SUCCESS('Quantile sketches rebuilt'))
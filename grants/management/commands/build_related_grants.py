@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.models import DatasetVersion
+from grants.related import rebuild_related_grants
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related-grants lists shown on grant detail pages'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['domestic', 'gac'],
+                          help='Only rebuild lists for one dataset')
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        count = rebuild_related_grants(options['source'])
+        
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('build_related_grants')
+        
+        self.stdout.write(self.style.SUCCESS(f'Built related-grants lists for {count} grants'))
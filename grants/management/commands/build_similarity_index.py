@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.models import DatasetVersion
+from grants.similarity import rebuild_similarity_index, BANDS, ROWS_PER_BAND
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MinHash signatures and LSH buckets behind /api/similar/'
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_similarity_index()
+        
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('build_similarity_index')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} grants ({BANDS} bands x {ROWS_PER_BAND} rows) '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
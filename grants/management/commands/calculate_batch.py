@@ -0,0 +1,65 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calculator.batch import parse_profiles, calculate_batch, PROFILE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Calculate tax contributions and grant shares for a CSV of income profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', type=str,
+                          help=f'CSV file with {", ".join(PROFILE_FIELDS)} columns ("-" for stdin); '
+                               'other columns are copied to the output')
+        parser.add_argument('--output', type=str, default='-',
+                          help='Output CSV file (default: stdout)')
+        parser.add_argument('--no-gac', action='store_true',
+                          help='Exclude Global Affairs Canada grants')
+        parser.add_argument('--tax-year', type=int,
+                          help='Tax bracket year to use (default: latest loaded)')
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            rows = list(csv.DictReader(sys.stdin))
+        else:
+            try:
+                with open(options['input'], newline='', encoding='utf-8-sig') as f:
+                    rows = list(csv.DictReader(f))
+            except OSError as e:
+                raise CommandError(f'Cannot read {options["input"]}: {e}')
+
+        try:
+            profiles = parse_profiles(rows)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        batch = calculate_batch(profiles, include_gac=not options['no_gac'], tax_year=options['tax_year'])
+
+        # One column per year instead of the yearly_shares list
+        year_columns = [f'share_{year}' for year in batch['years']]
+        fieldnames = list(rows[0].keys()) if rows else list(PROFILE_FIELDS)
+        for result in batch['results']:
+            for key in result:
+                if key not in fieldnames and key != 'yearly_shares':
+                    fieldnames.append(key)
+        fieldnames += year_columns
+
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='', encoding='utf-8')
+        try:
+            writer = csv.DictWriter(output, fieldnames=fieldnames)
+            writer.writeheader()
+            for result in batch['results']:
+                row = {key: value for key, value in result.items() if key != 'yearly_shares'}
+                row.update(zip(year_columns, result['yearly_shares']))
+                writer.writerow(row)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Calculated {batch["count"]} profiles across {len(batch["years"])} years '
+                f'(dataset version {batch["dataset_version"]}) -> {options["output"]}'
+            ))
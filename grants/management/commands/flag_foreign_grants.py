@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Q
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 
 class Command(BaseCommand):
     help = 'Flag all grants related to foreign countries, especially developing nations'
@@ -9,6 +11,7 @@ class Command(BaseCommand):
         parser.add_argument('--reset', action='store_true',
                           help='Reset all notable flags before processing')
     
+    @transaction.atomic
     def handle(self, *args, **options):
         if options['reset']:
             Grant.objects.update(is_notable=False, notable_reason='')
@@ -205,6 +208,9 @@ class Command(BaseCommand):
                 total_flagged += count
                 self.stdout.write(f'Flagged {count} controversial international grants for "{term1}"')
         
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('flag_foreign_grants')
+        
         # Summary
         total_notable = Grant.objects.filter(is_notable=True).count()
         from django.db import models
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Q
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 import re
 
 class Command(BaseCommand):
@@ -10,6 +12,7 @@ class Command(BaseCommand):
         parser.add_argument('--reset', action='store_true',
                           help='Reset all notable flags before processing')
     
+    @transaction.atomic
     def handle(self, *args, **options):
         if options['reset']:
             Grant.objects.update(is_notable=False, notable_reason='')
@@ -120,8 +123,7 @@ class Command(BaseCommand):
             Q(recipient_legal_name__icontains='vietnam') |
             Q(recipient_legal_name__icontains='international') |
             Q(recipient_city_en__icontains='hanoi') |
-            Q(recipient_city_en__icontains='ho chi minh') |
-            Q(recipient_country__isnull=False) & ~Q(recipient_country='CA')
+            Q(recipient_city_en__icontains='ho chi minh')
         ).filter(is_notable=False)
         
         foreign_count = foreign_grants.count()
@@ -147,6 +149,14 @@ class Command(BaseCommand):
             total_flagged += mega_count
             self.stdout.write(f'Flagged {mega_count} mega-grants over $10M')
         
+        # Refresh the persisted controversy classification
+        reclassified = Grant.reclassify_controversy()
+        if reclassified:
+            self.stdout.write(f'Updated controversy classification for {reclassified} grants')
+        
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('flag_notable_grants')
+        
         # Summary
         total_notable = Grant.objects.filter(is_notable=True).count()
         self.stdout.write(
@@ -1,6 +1,8 @@
 import csv
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 
 class Command(BaseCommand):
     help = 'Import flagged results from CSV back to database'
@@ -9,6 +11,7 @@ class Command(BaseCommand):
         parser.add_argument('--csv-file', type=str, required=True,
                           help='CSV file with flagged results')
     
+    @transaction.atomic
     def handle(self, *args, **options):
         csv_file = options['csv_file']
         
@@ -65,6 +68,9 @@ class Command(BaseCommand):
                     not_found_count += 1
                     self.stdout.write(self.style.WARNING(f'Grant {grant_id} not found'))
         
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('import_flagged_results')
+        
         total_notable = Grant.objects.filter(is_notable=True).count()
         
         self.stdout.write(
@@ -1,10 +1,13 @@
 import csv
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 
 class Command(BaseCommand):
     help = 'Import flagged results from grants_review.csv'
     
+    @transaction.atomic
     def handle(self, *args, **options):
         csv_file = 'grants_review.csv'
         
@@ -84,6 +87,9 @@ class Command(BaseCommand):
                 except Grant.DoesNotExist:
                     self.stdout.write(self.style.WARNING(f'Grant {grant_id} not found'))
         
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('import_flags')
+        
         total_notable = Grant.objects.filter(is_notable=True).count()
         
         self.stdout.write(
@@ -1,6 +1,11 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from grants.models import GlobalAffairsGrant
+from grants.models import GlobalAffairsGrant, DatasetVersion, HomepageSnapshot, FundingRecord
+from grants.analytics import rebuild_quantile_sketches
+from grants.related import rebuild_related_grants
+from grants.similarity import rebuild_similarity_index
+from calculator.models import ContributionLedger
 import csv
 import os
 from datetime import datetime
@@ -22,7 +27,13 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing GAC grants before importing'
         )
+        parser.add_argument(
+            '--no-warm',
+            action='store_true',
+            help='Skip warming the page and API caches after the import'
+        )
 
+    @transaction.atomic
     def handle(self, *args, **options):
         csv_dir = options['csv_dir']
         
@@ -63,6 +74,31 @@ class Command(BaseCommand):
                 )
             )
 
+        # Refresh quantile sketches for the statistics pages
+        rebuild_quantile_sketches('gac')
+        
+        # Related-grants panels of the detail pages
+        rebuild_related_grants('gac')
+        
+        # MinHash signatures behind /api/similar/
+        rebuild_similarity_index('gac')
+        
+        # Combined funding table used for cross-dataset totals and rankings
+        FundingRecord.sync('gac')
+        
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('import_gac_grants')
+        
+        # Annual totals used by the tax calculator, stamped with the new version
+        ContributionLedger.rebuild()
+        
+        # Single-row homepage totals for the new version
+        HomepageSnapshot.rebuild()
+        
+        # Precompute the heavy pages once the new data is visible
+        if not options['no_warm']:
+            transaction.on_commit(lambda: call_command('warm_caches', stdout=self.stdout))
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Import complete! Total: {total_imported} grants imported, '
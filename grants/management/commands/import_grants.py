@@ -3,10 +3,18 @@ import os
 import re
 from decimal import Decimal, InvalidOperation
 from datetime import datetime
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.db import models
-from grants.models import Grant
+from django.db import models, transaction
+from grants.models import Grant, DatasetVersion, HomepageSnapshot, FundingRecord
+from grants.analytics import rebuild_quantile_sketches
+from grants.entities import rebuild_recipients
+from grants.dimensions import rebuild_dimensions
+from grants.agreements import rebuild_agreements
+from grants.related import rebuild_related_grants
+from grants.similarity import rebuild_similarity_index
+from calculator.models import ContributionLedger
 
 class Command(BaseCommand):
     help = 'Import grants data from CSV files'
@@ -16,7 +24,10 @@ class Command(BaseCommand):
                           help='Directory containing CSV files')
         parser.add_argument('--clear', action='store_true',
                           help='Clear existing grants before import')
+        parser.add_argument('--no-warm', action='store_true',
+                          help='Skip warming the page and API caches after the import')
     
+    @transaction.atomic
     def handle(self, *args, **options):
         csv_dir = options['csv_dir']
         
@@ -38,6 +49,40 @@ class Command(BaseCommand):
         # Flag notable grants
         self.flag_notable_grants()
         
+        # Refresh quantile sketches for the statistics pages
+        rebuild_quantile_sketches('domestic')
+        
+        # Merge spelling variants of recipient names and refresh their totals
+        rebuild_recipients()
+        
+        # Program and NAICS dimensions with their rollups
+        rebuild_dimensions()
+        
+        # Merge amendments of the same agreement across fiscal-year files
+        rebuild_agreements()
+        
+        # Related-grants panels of the detail pages
+        rebuild_related_grants('domestic')
+        
+        # MinHash signatures behind /api/similar/
+        rebuild_similarity_index('domestic')
+        
+        # Combined funding table used for cross-dataset totals and rankings
+        FundingRecord.sync('domestic')
+        
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('import_grants')
+        
+        # Annual totals used by the tax calculator, stamped with the new version
+        ContributionLedger.rebuild()
+        
+        # Single-row homepage totals for the new version
+        HomepageSnapshot.rebuild()
+        
+        # Precompute the heavy pages once the new data is visible
+        if not options['no_warm']:
+            transaction.on_commit(lambda: call_command('warm_caches', stdout=self.stdout))
+        
         total_grants = Grant.objects.count()
         total_value = Grant.objects.aggregate(total=models.Sum('agreement_value'))['total'] or 0
         
@@ -206,6 +251,9 @@ class Command(BaseCommand):
             grant.notable_reason = "Controversial international development project"
             grant.save()
         
+        # Classify grants that existed before this import
+        Grant.reclassify_controversy()
+        
         notable_count = Grant.objects.filter(is_notable=True).count()
         major_count = Grant.objects.filter(is_major_funding=True).count()
         
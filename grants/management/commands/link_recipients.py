@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.linking import rebuild_recipient_links
+from grants.models import RecipientLink, DatasetVersion
+
+
+class Command(BaseCommand):
+    help = 'Link GAC executing agency partners to domestic recipients'
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        count = rebuild_recipient_links()
+        exact = RecipientLink.objects.filter(method='exact').count()
+        self.stdout.write(f'Linked {count} partners ({exact} exact, {count - exact} by similar names)')
+        
+        # Recipient pages and APIs show the linked GAC funding
+        DatasetVersion.bump('link_recipients')
+        
+        self.stdout.write(self.style.SUCCESS('Recipient links rebuilt'))
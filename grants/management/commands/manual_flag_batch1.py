@@ -1,9 +1,12 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 
 class Command(BaseCommand):
     help = 'Manually flag specific grants from batch 1 review'
     
+    @transaction.atomic
     def handle(self, *args, **options):
         # Manually reviewed grants that should be flagged as notable
         # Based on careful review of batch_1.csv
@@ -66,6 +69,9 @@ class Command(BaseCommand):
             notable_reason="Major funding over $8M - requires public scrutiny due to significant taxpayer investment"
         )
         
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('manual_flag_batch1')
+        
         total_notable = Grant.objects.filter(is_notable=True).count()
         
         self.stdout.write(
@@ -1,9 +1,12 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from grants.models import Grant
+from grants.versioning import refresh_domestic_derived
 
 class Command(BaseCommand):
     help = 'Manually flag specific grants as notable based on review'
     
+    @transaction.atomic
     def handle(self, *args, **options):
         # Reset all notable flags first
         Grant.objects.update(is_notable=False, notable_reason='')
@@ -84,6 +87,9 @@ class Command(BaseCommand):
             notable_reason="Major funding over $5M - requires public scrutiny due to significant taxpayer investment"
         )
         
+        # Funding records, quantile sketches and the dataset version
+        refresh_domestic_derived('manual_flag_grants')
+        
         total_notable = Grant.objects.filter(is_notable=True).count()
         
         self.stdout.write(
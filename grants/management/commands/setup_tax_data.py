@@ -1,10 +1,12 @@
 from django.core.management.base import BaseCommand
-from grants.models import TaxBracket, CanadianTaxData
+from django.db import transaction
+from grants.models import TaxBracket, CanadianTaxData, DatasetVersion
 from decimal import Decimal
 
 class Command(BaseCommand):
     help = 'Setup Canadian tax brackets and revenue data'
     
+    @transaction.atomic
     def handle(self, *args, **options):
         # Clear existing data
         TaxBracket.objects.all().delete()
@@ -46,6 +48,9 @@ class Command(BaseCommand):
                 income_tax_revenue=Decimal(str(income_tax_revenue))
             )
         
+        # Record the data change for caches and ETags
+        DatasetVersion.bump('setup_tax_data')
+        
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully created {TaxBracket.objects.count()} tax brackets '
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from grants.models import FundingRecord, DatasetVersion
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the combined FundingRecord table from the domestic and GAC grants'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['domestic', 'gac'],
+                          help='Only rebuild records for one dataset')
+    
+    @transaction.atomic
+    def handle(self, *args, **options):
+        sources = [options['source']] if options['source'] else ['domestic', 'gac']
+        for source in sources:
+            count = FundingRecord.sync(source)
+            self.stdout.write(f'Wrote {count} {source} funding records')
+        
+        # Totals and rankings read from this table
+        DatasetVersion.bump('sync_funding_records')
+        
+        self.stdout.write(self.style.SUCCESS('Funding records rebuilt'))
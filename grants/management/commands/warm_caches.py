@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from grants.models import Grant, DatasetVersion
+
+
+# (url name, query params) for the heavy pages and the common API requests
+WARM_TARGETS = [
+    ('home', {}),
+    ('statistics', {}),
+    ('gac_statistics', {}),
+    ('tax_calculator', {}),
+    ('grant_stats_api', {}),
+    ('comprehensive_stats_api', {}),
+    ('gac_stats_api', {}),
+    ('recipients_api', {}),
+    ('grants_search_api', {}),
+    ('gac_search_api', {}),
+    ('histogram_api', {'source': 'domestic'}),
+    ('histogram_api', {'source': 'gac'}),
+    ('quantiles_api', {'source': 'domestic'}),
+    ('quantiles_api', {'source': 'gac'}),
+    ('calculator_baseline_api', {}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Precompute cached pages and API responses for the current dataset version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                          help='Number of targets rendered in parallel')
+        parser.add_argument('--provinces', type=int, default=5,
+                          help='Also warm the search API for the N provinces with the most grants')
+
+    def handle(self, *args, **options):
+        if settings.CACHE_BACKEND == 'locmem':
+            self.stdout.write(self.style.WARNING(
+                'CACHE_BACKEND is locmem: warmed entries stay in this process and will not reach the web workers'
+            ))
+
+        targets = list(WARM_TARGETS)
+        top_provinces = (
+            Grant.objects.exclude(recipient_province='')
+            .values('recipient_province')
+            .annotate(count=Count('id'))
+            .order_by('-count')[:options['provinces']]
+        )
+        for row in top_provinces:
+            targets.append(('grants_search_api', {'province': row['recipient_province']}))
+
+        stamp = DatasetVersion.current()
+        self.stdout.write(f'Warming {len(targets)} targets for dataset version {stamp.version}...')
+
+        started = time.monotonic()
+        failures = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for label, status, elapsed in pool.map(self.warm, targets):
+                line = f'  {status}  {elapsed * 1000:8.1f} ms  {label}'
+                if status == 200:
+                    self.stdout.write(line)
+                else:
+                    failures += 1
+                    self.stdout.write(self.style.WARNING(line))
+
+        summary = f'Warmed {len(targets) - failures}/{len(targets)} targets in {time.monotonic() - started:.2f}s'
+        self.stdout.write(self.style.SUCCESS(summary) if not failures else self.style.WARNING(summary))
+
+    def warm(self, target):
+        """Call the view behind a target directly and return (label, status, seconds)"""
+        name, params = target
+        path = reverse(name)
+        request = RequestFactory().get(path, params)
+        request.user = AnonymousUser()
+        label = request.get_full_path()
+
+        started = time.monotonic()
+        try:
+            match = resolve(path)
+            response = match.func(request, *match.args, **match.kwargs)
+            status = response.status_code
+        except Exception as e:
+            status = f'ERR ({e.__class__.__name__}: {e})'
+        finally:
+            # Each pool thread opens its own database connection
+            connections.close_all()
+        return label, status, time.monotonic() - started
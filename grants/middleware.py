@@ -0,0 +1,89 @@
+"""
+Conditional GET support driven by the dataset version.
+
+Pages and APIs only change when grant data (or the deployed code) changes,
+so their ETag can be computed from the dataset version, the deployed code
+and the normalized request before the view runs. Matching If-None-Match
+requests get a 304 without touching any other query or template.
+
+No Last-Modified header is sent: the dataset timestamp does not change on a
+deploy, so If-Modified-Since would keep answering 304 with the old markup.
+Pages that hand out a CSRF token are never tagged, since a 304 would skip
+setting the CSRF cookie.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .caching import normalized_query_string
+from .versioning import get_dataset_version
+
+
+def etag_exempt(view):
+    """Mark a view whose response depends on more than the dataset (session, CSRF cookie, counters...)"""
+    view.etag_exempt = True
+    return view
+
+
+_code_fingerprint = None
+
+
+def get_code_fingerprint():
+    """Identify the deployed code so a release invalidates ETags issued by the previous one"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        release = getattr(settings, 'RELEASE_ID', '')
+        if not release:
+            # Fall back to the newest template/source modification time
+            newest = 0
+            for root in [settings.BASE_DIR / 'templates', settings.BASE_DIR / 'grants', settings.BASE_DIR / 'calculator']:
+                for dirpath, _, filenames in os.walk(root):
+                    for filename in filenames:
+                        if filename.endswith(('.html', '.py')):
+                            newest = max(newest, os.path.getmtime(os.path.join(dirpath, filename)))
+            release = str(int(newest))
+        _code_fingerprint = release
+    return _code_fingerprint
+
+
+def dataset_etag(request, stamp):
+    """Weak ETag from the dataset version and the normalized request"""
+    identity = '|'.join([
+        get_code_fingerprint(),
+        request.get_host(),
+        request.path,
+        normalized_query_string(request),
+    ])
+    digest = hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+    return f'W/"{stamp.version}-{digest}"'
+
+
+class ConditionalGetMiddleware:
+    """Answer conditional GETs with 304 before the view runs; tag full responses"""
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        response = self.get_response(request)
+        
+        etag = getattr(request, '_dataset_etag', None)
+        # A response that used the CSRF token must reach the browser to set its cookie
+        csrf_used = request.META.get('CSRF_COOKIE_NEEDS_UPDATE', False)
+        if etag and response.status_code == 200 and not response.has_header('ETag') and not csrf_used:
+            response['ETag'] = etag
+            # Let browsers and nginx keep the body but revalidate every time
+            patch_cache_control(response, no_cache=True)
+        return response
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or getattr(view_func, 'etag_exempt', False):
+            return None
+        if request.resolver_match and request.resolver_match.namespace == 'admin':
+            return None
+        
+        stamp = get_dataset_version(request)
+        etag = request._dataset_etag = dataset_etag(request, stamp)
+        return get_conditional_response(request, etag=etag)
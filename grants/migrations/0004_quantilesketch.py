@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grants', '0003_increase_field_lengths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuantileSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('dimension', models.CharField(max_length=50)),
+                ('group_value', models.TextField(blank=True)),
+                ('value_count', models.IntegerField(default=0)),
+                ('digest', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['source', 'dimension', '-value_count'],
+                'indexes': [models.Index(fields=['source', 'dimension'], name='grants_quan_source_0e0a2e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:10
+
+from django.db import migrations, models
+
+
+CONTROVERSIAL_KEYWORDS = [
+    "gender", "diversity", "equity", "inclusion", "climate", "carbon",
+    "indigenous", "reconciliation", "arts", "culture", "international",
+]
+
+
+def classify_existing_grants(apps, schema_editor):
+    Grant = apps.get_model("grants", "Grant")
+    batch = []
+    for grant in Grant.objects.only("id", "agreement_title_en", "description_en").order_by("pk"):
+        text = f"{grant.agreement_title_en} {grant.description_en}".lower()
+        terms = [keyword for keyword in CONTROVERSIAL_KEYWORDS if keyword in text]
+        if terms:
+            grant.is_controversial = True
+            grant.controversial_terms = ", ".join(terms)
+            batch.append(grant)
+    Grant.objects.bulk_update(batch, ["is_controversial", "controversial_terms"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0004_quantilesketch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="grant",
+            name="controversial_terms",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name="grant",
+            name="is_controversial",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="grant",
+            index=models.Index(
+                fields=["is_controversial"], name="grants_gran_is_cont_501300_idx"
+            ),
+        ),
+        migrations.RunPython(classify_existing_grants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0006_datasetversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HomepageSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset_version", models.PositiveIntegerField(default=0)),
+                ("domestic_count", models.IntegerField(default=0)),
+                (
+                    "domestic_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                ("gac_count", models.IntegerField(default=0)),
+                (
+                    "gac_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                ("recent_major", models.JSONField(default=list)),
+                ("notable_grants", models.JSONField(default=list)),
+                ("built_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
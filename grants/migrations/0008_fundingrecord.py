@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0007_homepagesnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FundingRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("domestic", "Domestic"),
+                            ("gac", "Global Affairs Canada"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_id", models.IntegerField()),
+                ("value", models.DecimalField(decimal_places=2, max_digits=15)),
+                ("start_year", models.IntegerField(blank=True, null=True)),
+                ("end_year", models.IntegerField(blank=True, null=True)),
+                ("province", models.CharField(blank=True, max_length=50)),
+                ("country", models.CharField(blank=True, max_length=200)),
+                ("program", models.CharField(blank=True, max_length=255)),
+                ("title", models.CharField(max_length=255)),
+                ("recipient", models.CharField(blank=True, max_length=255)),
+                ("is_notable", models.BooleanField(default=False)),
+                ("notable_reason", models.CharField(blank=True, max_length=255)),
+                ("is_major_funding", models.BooleanField(default=False)),
+                ("is_controversial", models.BooleanField(default=False)),
+            ],
+            options={
+                "ordering": ["-value"],
+                "indexes": [
+                    models.Index(fields=["-value"], name="funding_value_idx"),
+                    models.Index(
+                        fields=["source", "-value"], name="funding_source_value_idx"
+                    ),
+                    models.Index(
+                        fields=["is_notable", "-value"],
+                        name="funding_notable_value_idx",
+                    ),
+                    models.Index(
+                        fields=["start_year", "end_year"], name="funding_years_idx"
+                    ),
+                    models.Index(fields=["province"], name="funding_province_idx"),
+                    models.Index(fields=["country"], name="funding_country_idx"),
+                    models.Index(fields=["program"], name="funding_program_idx"),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="fundingrecord",
+            constraint=models.UniqueConstraint(
+                fields=("source", "source_id"), name="unique_funding_record_source"
+            ),
+        ),
+    ]
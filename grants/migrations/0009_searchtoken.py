@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0008_fundingrecord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=40)),
+                ("source", models.CharField(max_length=10)),
+                ("weight", models.PositiveIntegerField(default=1)),
+                (
+                    "record",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="grants.fundingrecord",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["token", "source"], name="search_token_source_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="searchtoken",
+            constraint=models.UniqueConstraint(
+                fields=("token", "record"), name="unique_search_token_record"
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0009_searchtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recipient",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("name", models.TextField()),
+                ("recipient_type", models.CharField(blank=True, max_length=10)),
+                ("province", models.CharField(blank=True, max_length=50)),
+                ("grant_count", models.IntegerField(default=0)),
+                (
+                    "total_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-total_value"],
+                "indexes": [
+                    models.Index(fields=["-total_value"], name="recipient_total_idx"),
+                    models.Index(
+                        fields=["province", "-total_value"],
+                        name="recipient_province_total_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="grant",
+            name="recipient",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="grants",
+                to="grants.recipient",
+            ),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0010_recipient"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Program",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("name", models.TextField()),
+                ("grant_count", models.IntegerField(default=0)),
+                (
+                    "total_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+            ],
+            options={
+                "ordering": ["-total_value"],
+                "indexes": [
+                    models.Index(fields=["-total_value"], name="program_total_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="NaicsCode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=6, unique=True)),
+                ("level", models.PositiveSmallIntegerField()),
+                ("title", models.CharField(blank=True, max_length=200)),
+                ("grant_count", models.IntegerField(default=0)),
+                (
+                    "total_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="children",
+                        to="grants.naicscode",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["code"],
+            },
+        ),
+        migrations.AddField(
+            model_name="grant",
+            name="naics",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="grants",
+                to="grants.naicscode",
+            ),
+        ),
+        migrations.AddField(
+            model_name="grant",
+            name="program",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="grants",
+                to="grants.program",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="naicscode",
+            index=models.Index(
+                fields=["level", "-total_value"], name="naics_level_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="naicscode",
+            index=models.Index(
+                fields=["parent", "-total_value"], name="naics_parent_total_idx"
+            ),
+        ),
+    ]
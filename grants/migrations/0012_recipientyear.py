@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0011_program_naicscode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipientYear",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.IntegerField()),
+                ("grant_count", models.IntegerField(default=0)),
+                (
+                    "total_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="years",
+                        to="grants.recipient",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["recipient", "year"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="recipientyear",
+            constraint=models.UniqueConstraint(
+                fields=("recipient", "year"), name="unique_recipient_year"
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0012_recipientyear"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedGrants",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("domestic", "Domestic"),
+                            ("gac", "Global Affairs Canada"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_id", models.IntegerField()),
+                ("payload", models.JSONField(default=dict)),
+                ("built_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="relatedgrants",
+            constraint=models.UniqueConstraint(
+                fields=("source", "source_id"), name="unique_related_grants_source"
+            ),
+        ),
+    ]
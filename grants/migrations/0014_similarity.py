@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0013_relatedgrants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarityBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SimilaritySignature",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("domestic", "Domestic"),
+                            ("gac", "Global Affairs Canada"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_id", models.IntegerField()),
+                ("signature", models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="similaritysignature",
+            constraint=models.UniqueConstraint(
+                fields=("source", "source_id"),
+                name="unique_similarity_signature_source",
+            ),
+        ),
+        migrations.AddField(
+            model_name="similaritybucket",
+            name="signature",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="buckets",
+                to="grants.similaritysignature",
+            ),
+        ),
+    ]
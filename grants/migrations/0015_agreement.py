@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0014_similarity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fundingrecord",
+            name="is_superseded",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="Agreement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key_hash", models.BigIntegerField(db_index=True)),
+                ("number", models.CharField(max_length=100)),
+                ("recipient_key", models.CharField(max_length=255)),
+                ("title", models.TextField(blank=True)),
+                (
+                    "value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "original_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                ("grant_count", models.IntegerField(default=0)),
+                ("first_fiscal_year", models.CharField(blank=True, max_length=10)),
+                ("latest_fiscal_year", models.CharField(blank=True, max_length=10)),
+                ("history", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "latest_grant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="grants.grant",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="agreements",
+                        to="grants.recipient",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-value"],
+            },
+        ),
+        migrations.AddField(
+            model_name="grant",
+            name="agreement",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="grants",
+                to="grants.agreement",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="agreement",
+            index=models.Index(fields=["-value"], name="agreement_value_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="agreement",
+            constraint=models.UniqueConstraint(
+                fields=("number", "recipient_key"), name="unique_agreement"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0015_agreement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipientLink",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("partner_key", models.CharField(max_length=255, unique=True)),
+                ("partner_name", models.TextField()),
+                (
+                    "method",
+                    models.CharField(
+                        choices=[
+                            ("exact", "Same normalized name"),
+                            ("similar", "Similar names"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("gac_count", models.IntegerField(default=0)),
+                (
+                    "gac_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["recipient", "-gac_value"],
+            },
+        ),
+        migrations.AddField(
+            model_name="fundingrecord",
+            name="recipient_key",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="fundingrecord",
+            index=models.Index(
+                fields=["source", "recipient_key"], name="funding_recipient_key_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipientlink",
+            name="recipient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="links",
+                to="grants.recipient",
+            ),
+        ),
+    ]
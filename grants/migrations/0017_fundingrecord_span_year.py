@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("grants", "0016_recipientlink"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fundingrecord",
+            name="span_year",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
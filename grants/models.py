@@ -1,7 +1,171 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.urls import reverse
+from django.utils import timezone
+from collections import namedtuple
+from decimal import Decimal
 import re
 
+
+# Keywords that mark a domestic grant as potentially controversial
+CONTROVERSIAL_KEYWORDS = [
+    'gender', 'diversity', 'equity', 'inclusion', 'climate', 'carbon',
+    'indigenous', 'reconciliation', 'arts', 'culture', 'international'
+]
+
+
+def classify_controversy(*texts):
+    """Return the controversial keywords found in the given texts"""
+    text_to_check = ' '.join(text or '' for text in texts).lower()
+    return [keyword for keyword in CONTROVERSIAL_KEYWORDS if keyword in text_to_check]
+
+
+class Recipient(models.Model):
+    """
+    One domestic grant recipient, with spelling variants of its legal name merged.
+    
+    Grants are matched on a normalized key (see grants.entities.normalize_name)
+    and the totals are refreshed whenever grants are imported or edited, so
+    top-recipient queries read this table instead of grouping by name.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    name = models.TextField()  # Most common spelling of the legal name
+    recipient_type = models.CharField(max_length=10, blank=True)
+    province = models.CharField(max_length=50, blank=True)
+    grant_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-total_value']
+        indexes = [
+            models.Index(fields=['-total_value'], name='recipient_total_idx'),
+            models.Index(fields=['province', '-total_value'], name='recipient_province_total_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.grant_count} grants, ${self.total_value:,.0f})"
+    
+    @property
+    def avg_value(self):
+        return self.total_value / self.grant_count if self.grant_count else 0
+    
+    def get_absolute_url(self):
+        return reverse('recipient_detail', kwargs={'pk': self.pk})
+
+
+class RecipientYear(models.Model):
+    """Grant totals of one recipient for one fiscal year (by the year the fiscal year starts)"""
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, related_name='years')
+    year = models.IntegerField()
+    grant_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['recipient', 'year']
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'year'], name='unique_recipient_year'),
+        ]
+    
+    def __str__(self):
+        return f"{self.recipient_id} {self.year}: ${self.total_value:,.0f} ({self.grant_count} grants)"
+
+
+class Program(models.Model):
+    """Funding program of domestic grants, with precomputed totals"""
+    key = models.CharField(max_length=255, unique=True)  # Case- and whitespace-insensitive name
+    name = models.TextField()
+    grant_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['-total_value']
+        indexes = [
+            models.Index(fields=['-total_value'], name='program_total_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.grant_count} grants)"
+
+
+class NaicsCode(models.Model):
+    """
+    One node of the NAICS hierarchy (2-digit sector down to 6-digit industry).
+    
+    Every prefix of a code used by a grant has a row, and its totals include
+    all grants below it, so any level is read without grouping the grants.
+    """
+    code = models.CharField(max_length=6, unique=True)
+    level = models.PositiveSmallIntegerField()  # Number of digits
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='children')
+    title = models.CharField(max_length=200, blank=True)  # Most common naics_sector_en below this node
+    grant_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['code']
+        indexes = [
+            models.Index(fields=['level', '-total_value'], name='naics_level_total_idx'),
+            models.Index(fields=['parent', '-total_value'], name='naics_parent_total_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.code} {self.title}"
+
+
+class Agreement(models.Model):
+    """
+    One funding agreement with its amendments merged.
+    
+    Amendments are published as separate rows, often in several fiscal-year
+    files, that repeat the agreement number and recipient and carry the
+    amended total value. Grants are grouped on a hash of that pair (see
+    grants.agreements) and the latest row's value is the agreement's value,
+    so consolidated totals are a plain sum over this table.
+    """
+    key_hash = models.BigIntegerField(db_index=True)  # Blocking key of (number, recipient_key)
+    number = models.CharField(max_length=100)  # Normalized agreement number ("ref:..." when missing)
+    recipient_key = models.CharField(max_length=255)
+    recipient = models.ForeignKey(Recipient, null=True, blank=True, on_delete=models.SET_NULL, related_name='agreements')
+    latest_grant = models.ForeignKey('Grant', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    title = models.TextField(blank=True)
+    value = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # Value of the latest amendment
+    original_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    grant_count = models.IntegerField(default=0)  # Rows merged, original included
+    first_fiscal_year = models.CharField(max_length=10, blank=True)
+    latest_fiscal_year = models.CharField(max_length=10, blank=True)
+    history = models.JSONField(default=list)  # [{grant_id, reference_number, fiscal_year, value}], oldest first
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-value']
+        constraints = [
+            models.UniqueConstraint(fields=['number', 'recipient_key'], name='unique_agreement'),
+        ]
+        indexes = [
+            models.Index(fields=['-value'], name='agreement_value_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.number} ({self.grant_count} rows, ${self.value:,.0f})"
+    
+    @property
+    def amendment_count(self):
+        return max(self.grant_count - 1, 0)
+    
+    @classmethod
+    def totals(cls):
+        """Count and value of consolidated agreements plus the rows they merge, in one aggregate"""
+        totals = cls.objects.aggregate(
+            count=models.Count('id'), value=models.Sum('value'), rows=models.Sum('grant_count')
+        )
+        return {
+            'count': totals['count'],
+            'value': totals['value'] or Decimal('0'),
+            'rows': totals['rows'] or 0,
+        }
+
+
 class Grant(models.Model):
     # Basic Information
     reference_number = models.CharField(max_length=100, unique=True)
@@ -11,6 +175,7 @@ class Grant(models.Model):
     recipient_operating_name = models.TextField(blank=True)
     recipient_type = models.CharField(max_length=10)
     recipient_postal_code = models.CharField(max_length=10)
+    recipient = models.ForeignKey(Recipient, null=True, blank=True, on_delete=models.SET_NULL, related_name='grants')
     
     # Agreement Details
     agreement_title_en = models.TextField()
@@ -26,15 +191,22 @@ class Grant(models.Model):
     # Program Information
     program_name_en = models.TextField()
     program_purpose_en = models.TextField(blank=True)
+    program = models.ForeignKey(Program, null=True, blank=True, on_delete=models.SET_NULL, related_name='grants')
     
     # Classification
     naics_identifier = models.CharField(max_length=20, blank=True)
     naics_sector_en = models.CharField(max_length=200, blank=True)
+    naics = models.ForeignKey(NaicsCode, null=True, blank=True, on_delete=models.SET_NULL, related_name='grants')
+    
+    # Consolidated agreement (amendments of one agreement share it)
+    agreement = models.ForeignKey(Agreement, null=True, blank=True, on_delete=models.SET_NULL, related_name='grants')
     
     # Flags for special categories
     is_notable = models.BooleanField(default=False)
     is_major_funding = models.BooleanField(default=False)
     notable_reason = models.TextField(blank=True)
+    is_controversial = models.BooleanField(default=False)
+    controversial_terms = models.CharField(max_length=200, blank=True)  # Comma-separated matched keywords
     
     # Metadata
     fiscal_year = models.CharField(max_length=10)
@@ -49,6 +221,7 @@ class Grant(models.Model):
             models.Index(fields=['fiscal_year']),
             models.Index(fields=['is_notable']),
             models.Index(fields=['is_major_funding']),
+            models.Index(fields=['is_controversial']),
         ]
     
     def __str__(self):
@@ -57,15 +230,41 @@ class Grant(models.Model):
     def get_absolute_url(self):
         return reverse('grant_detail', kwargs={'pk': self.pk})
     
-    @property
-    def is_controversial(self):
-        """Check if grant might be controversial based on keywords"""
-        controversial_keywords = [
-            'gender', 'diversity', 'equity', 'inclusion', 'climate', 'carbon',
-            'indigenous', 'reconciliation', 'arts', 'culture', 'international'
-        ]
-        text_to_check = f"{self.agreement_title_en} {self.description_en}".lower()
-        return any(keyword in text_to_check for keyword in controversial_keywords)
+    @classmethod
+    def counted(cls):
+        """Grants counted in totals: each agreement's latest amendment and grants not consolidated yet"""
+        return cls.objects.filter(models.Q(agreement__isnull=True) | models.Q(agreement__latest_grant=F('pk')))
+    
+    def classify_controversy(self):
+        """Set the persisted controversy flag and matched terms from the title and description"""
+        terms = classify_controversy(self.agreement_title_en, self.description_en)
+        self.is_controversial = bool(terms)
+        self.controversial_terms = ', '.join(terms)
+        return terms
+    
+    @classmethod
+    def reclassify_controversy(cls, queryset=None, batch_size=1000):
+        """Recompute the controversy columns in bulk, returning the number of changed rows"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        grants = queryset.only('id', 'agreement_title_en', 'description_en',
+                               'is_controversial', 'controversial_terms').order_by('pk')
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(grants.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            
+            changed = []
+            for grant in batch:
+                before = (grant.is_controversial, grant.controversial_terms)
+                grant.classify_controversy()
+                if (grant.is_controversial, grant.controversial_terms) != before:
+                    changed.append(grant)
+            if changed:
+                updated += cls.objects.bulk_update(changed, ['is_controversial', 'controversial_terms'])
+        return updated
     
     @property
     def formatted_value(self):
@@ -75,6 +274,7 @@ class Grant(models.Model):
         # Auto-flag major funding (over $1M)
         if self.agreement_value >= 1000000:
             self.is_major_funding = True
+        self.classify_controversy()
         super().save(*args, **kwargs)
 
 
@@ -182,6 +382,11 @@ class GlobalAffairsGrant(models.Model):
             return primary
         return self.country.strip()
 
+    @property
+    def primary_sector(self):
+        """First DAC sector without its percentage share"""
+        return self.dac_sector.split(';')[0].split(':')[0].strip()
+    
     @property
     def formatted_country_distribution(self):
         """Parse and format the country field into a list of dictionaries with clean display"""
@@ -544,6 +749,294 @@ class GlobalAffairsGrant(models.Model):
         return budget_entries if budget_entries else None
 
 
+class FundingRecord(models.Model):
+    """
+    One narrow row per domestic or GAC grant, for queries that span both sources.
+    
+    Combined totals, rankings and timelines read this table instead of querying
+    Grant and GlobalAffairsGrant separately and merging in Python. Rows are
+    rewritten with sync() by the importers, flagging commands and admin edits.
+    """
+    SOURCE_CHOICES = [
+        ('domestic', 'Domestic'),
+        ('gac', 'Global Affairs Canada'),
+    ]
+    
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    source_id = models.IntegerField()  # Primary key of the Grant or GlobalAffairsGrant
+    value = models.DecimalField(max_digits=15, decimal_places=2)
+    # Years the funding is spread over (estimated like the contribution ledger)
+    start_year = models.IntegerField(null=True, blank=True)
+    end_year = models.IntegerField(null=True, blank=True)
+    # Current year a GAC span without dates was estimated in (None when the dates give the span)
+    span_year = models.IntegerField(null=True, blank=True)
+    province = models.CharField(max_length=50, blank=True)  # Domestic only
+    country = models.CharField(max_length=200, blank=True)  # GAC primary country
+    program = models.CharField(max_length=255, blank=True)
+    title = models.CharField(max_length=255)
+    recipient = models.CharField(max_length=255, blank=True)  # Legal name or executing agency
+    recipient_key = models.CharField(max_length=255, blank=True)  # normalize_name() of the recipient
+    
+    # Flags
+    is_notable = models.BooleanField(default=False)
+    notable_reason = models.CharField(max_length=255, blank=True)
+    is_major_funding = models.BooleanField(default=False)
+    is_controversial = models.BooleanField(default=False)
+    # Earlier amendment of a consolidated agreement, left out of totals so each agreement counts once
+    is_superseded = models.BooleanField(default=False)
+    
+    class Meta:
+        ordering = ['-value']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_funding_record_source'),
+        ]
+        indexes = [
+            models.Index(fields=['-value'], name='funding_value_idx'),
+            models.Index(fields=['source', '-value'], name='funding_source_value_idx'),
+            models.Index(fields=['is_notable', '-value'], name='funding_notable_value_idx'),
+            models.Index(fields=['start_year', 'end_year'], name='funding_years_idx'),
+            models.Index(fields=['province'], name='funding_province_idx'),
+            models.Index(fields=['country'], name='funding_country_idx'),
+            models.Index(fields=['program'], name='funding_program_idx'),
+            models.Index(fields=['source', 'recipient_key'], name='funding_recipient_key_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source}:{self.source_id} {self.title[:50]} - ${self.value:,.2f}"
+    
+    @property
+    def grant_id(self):
+        """Identifier used across the site (GAC ids carry a gac_ prefix)"""
+        return f"gac_{self.source_id}" if self.source == 'gac' else self.source_id
+    
+    def get_absolute_url(self):
+        name = 'gac_grant_detail' if self.source == 'gac' else 'grant_detail'
+        return reverse(name, kwargs={'pk': self.source_id})
+    
+    @classmethod
+    def from_grant(cls, grant):
+        from calculator.models import domestic_grant_years
+        from .entities import normalize_name
+        
+        span = domestic_grant_years(grant) or (None, None)
+        return cls(
+            source='domestic',
+            source_id=grant.id,
+            value=grant.agreement_value,
+            start_year=span[0],
+            end_year=span[1],
+            province=grant.recipient_province[:50],
+            program=grant.program_name_en[:255],
+            title=grant.agreement_title_en[:255],
+            recipient=grant.recipient_legal_name[:255],
+            recipient_key=normalize_name(grant.recipient_legal_name),
+            is_notable=grant.is_notable,
+            notable_reason=(grant.notable_reason or 'Notable grant')[:255] if grant.is_notable else '',
+            is_major_funding=grant.is_major_funding,
+            is_controversial=grant.is_controversial,
+            is_superseded=grant.agreement_id is not None and grant.agreement.latest_grant_id != grant.id,
+        )
+    
+    @classmethod
+    def from_gac_grant(cls, grant, current_year):
+        from calculator.models import gac_grant_years
+        from .entities import normalize_name
+        
+        span = gac_grant_years(grant, current_year)
+        estimated = span is not None and not (grant.start_date and grant.end_date)
+        span = span or (None, None)
+        # GAC projects are notable for gender or environment markers or very large budgets
+        markers = (grant.policy_markers or '').lower()
+        reason = ''
+        if 'gender' in markers:
+            reason = "Gender equality focus"
+        elif 'environmental' in markers:
+            reason = "Environmental sustainability"
+        elif grant.maximum_contribution >= 5000000:
+            reason = "Major international funding"
+        return cls(
+            source='gac',
+            source_id=grant.id,
+            value=grant.maximum_contribution,
+            start_year=span[0],
+            end_year=span[1],
+            span_year=current_year if estimated else None,
+            country=grant.primary_country[:200],
+            program=grant.program_name[:255],
+            title=grant.title[:255],
+            recipient=grant.executing_agency_partner[:255],
+            recipient_key=normalize_name(grant.executing_agency_partner),
+            is_notable=bool(reason),
+            notable_reason=reason,
+            is_major_funding=grant.is_major_funding,
+        )
+    
+    @classmethod
+    @transaction.atomic
+    def sync(cls, source, ids=None, batch_size=1000):
+        """Rewrite the records of one source (or of the given ids) and their search tokens; returns the row count"""
+        current_year = timezone.now().year
+        if source == 'domestic':
+            grants = Grant.objects.select_related('agreement').only(
+                'id', 'agreement_value', 'fiscal_year', 'agreement_start_date', 'agreement_end_date',
+                'recipient_province', 'program_name_en', 'agreement_title_en', 'recipient_legal_name',
+                'is_notable', 'notable_reason', 'is_major_funding', 'is_controversial', 'agreement__latest_grant',
+            )
+            build = cls.from_grant
+        elif source == 'gac':
+            grants = GlobalAffairsGrant.objects.only(
+                'id', 'maximum_contribution', 'start_date', 'end_date', 'status', 'country',
+                'program_name', 'title', 'executing_agency_partner', 'policy_markers',
+            )
+            build = lambda grant: cls.from_gac_grant(grant, current_year)
+        else:
+            raise ValueError(f"Unknown source {source!r}")
+        
+        records = cls.objects.filter(source=source)
+        if ids is not None:
+            ids = list(ids)
+            grants = grants.filter(pk__in=ids)
+            records = records.filter(source_id__in=ids)
+        records.delete()
+        
+        created = 0
+        batch = []
+        for grant in grants.order_by().iterator(chunk_size=batch_size):
+            batch.append(build(grant))
+            if len(batch) >= batch_size:
+                created += len(cls.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(cls.objects.bulk_create(batch))
+        
+        from .search import index_records
+        index_records(source, ids)
+        return created
+    
+    @classmethod
+    def refresh_estimated_spans(cls, current_year=None):
+        """Resync GAC records whose span was estimated in an earlier year; returns how many"""
+        current_year = current_year or timezone.now().year
+        ids = list(cls.objects.filter(source='gac', span_year__lt=current_year).values_list('source_id', flat=True))
+        if ids:
+            cls.sync('gac', ids)
+        return len(ids)
+    
+    @classmethod
+    def totals(cls):
+        """{source: (count, value)} for both sources in one grouped query, amendments merged"""
+        totals = {source: (0, Decimal('0')) for source, _ in cls.SOURCE_CHOICES}
+        rows = cls.objects.filter(is_superseded=False).order_by().values('source').annotate(
+            count=models.Count('id'), value=models.Sum('value')
+        )
+        for row in rows:
+            totals[row['source']] = (row['count'], row['value'] or Decimal('0'))
+        return totals
+
+
+class RecipientLink(models.Model):
+    """
+    A GAC executing agency partner matched to a domestic Recipient.
+    
+    Built offline by grants.linking from normalized-name blocking and token
+    similarity. GAC funding of a recipient is the FundingRecords whose
+    recipient_key is one of its links' partner_key, an indexed lookup.
+    GAC admin edits refresh the links of their partners; new domestic
+    recipients are only matched when link_recipients is rerun.
+    """
+    METHOD_CHOICES = [
+        ('exact', 'Same normalized name'),
+        ('similar', 'Similar names'),
+    ]
+    
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, related_name='links')
+    partner_key = models.CharField(max_length=255, unique=True)  # normalize_name() of the partner
+    partner_name = models.TextField()  # Most common spelling
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES)
+    score = models.FloatField()  # Token similarity, 1.0 for exact matches
+    gac_count = models.IntegerField(default=0)
+    gac_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['recipient', '-gac_value']
+    
+    def __str__(self):
+        return f"{self.partner_name} -> {self.recipient_id} ({self.method}, {self.score:.2f})"
+
+
+class SearchToken(models.Model):
+    """Inverted index posting: one normalized token of one FundingRecord (see grants.search)"""
+    token = models.CharField(max_length=40)
+    record = models.ForeignKey(FundingRecord, on_delete=models.CASCADE, related_name='search_tokens')
+    source = models.CharField(max_length=10)  # Copied from the record for source-filtered lookups
+    weight = models.PositiveIntegerField(default=1)  # Field-weighted term frequency
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'record'], name='unique_search_token_record'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'source'], name='search_token_source_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.token} -> {self.record_id} ({self.weight})"
+
+
+class RelatedGrants(models.Model):
+    """
+    Precomputed "related grants" panel of one grant detail page.
+    
+    The payload maps a relation (same_recipient, same_program, same_agreement
+    for domestic grants; same_country, same_sector for GAC grants) to a short
+    list of {id, title, subtitle, value}, so the panel is a single lookup.
+    Built by grants.related.rebuild_related_grants after imports.
+    """
+    source = models.CharField(max_length=10, choices=FundingRecord.SOURCE_CHOICES)
+    source_id = models.IntegerField()
+    payload = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_related_grants_source'),
+        ]
+    
+    def __str__(self):
+        return f"Related grants of {self.source}:{self.source_id}"
+    
+    @classmethod
+    def for_grant(cls, source, source_id):
+        """Payload for one grant ({} until the lists have been built)"""
+        payload = cls.objects.filter(source=source, source_id=source_id).values_list('payload', flat=True).first()
+        return payload or {}
+
+
+class SimilaritySignature(models.Model):
+    """MinHash signature of one grant's title and description (see grants.similarity)"""
+    source = models.CharField(max_length=10, choices=FundingRecord.SOURCE_CHOICES)
+    source_id = models.IntegerField()
+    signature = models.JSONField(default=list)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_similarity_signature_source'),
+        ]
+    
+    def __str__(self):
+        return f"MinHash of {self.source}:{self.source_id}"
+
+
+class SimilarityBucket(models.Model):
+    """LSH band bucket containing a signature; grants sharing a bucket are similarity candidates"""
+    key = models.BigIntegerField(db_index=True)  # Hash of (band number, band values)
+    signature = models.ForeignKey(SimilaritySignature, on_delete=models.CASCADE, related_name='buckets')
+    
+    def __str__(self):
+        return f"{self.key} -> {self.signature_id}"
+
+
 class TaxBracket(models.Model):
     """Canadian federal tax brackets for calculator"""
     year = models.IntegerField()
@@ -567,4 +1060,163 @@ class CanadianTaxData(models.Model):
     income_tax_revenue = models.DecimalField(max_digits=15, decimal_places=2)
     
     def __str__(self):
-        return f"{self.year} - Total Revenue: ${self.total_federal_revenue:,.0f}"
\ No newline at end of file
+        return f"{self.year} - Total Revenue: ${self.total_federal_revenue:,.0f}"
+
+class QuantileSketch(models.Model):
+    """Serialized t-digest of grant values for one group of a dimension (quantile fallback)"""
+    source = models.CharField(max_length=20)  # 'domestic' or 'gac'
+    dimension = models.CharField(max_length=50)  # e.g. 'province', 'program', 'all'
+    group_value = models.TextField(blank=True)
+    value_count = models.IntegerField(default=0)
+    digest = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['source', 'dimension', '-value_count']
+        indexes = [
+            models.Index(fields=['source', 'dimension']),
+        ]
+    
+    def __str__(self):
+        return f"{self.source}/{self.dimension}: {self.group_value or '(all)'} ({self.value_count} values)"
+
+
+class DatasetStamp(namedtuple('DatasetStamp', ['version', 'updated_at'])):
+    """Lightweight (version, updated_at) pair exposed to views and templates"""
+    __slots__ = ()
+    
+    def __str__(self):
+        return str(self.version)
+
+
+class DatasetVersion(models.Model):
+    """Single-row counter bumped whenever grant data changes (used to key caches and ETags)"""
+    version = models.PositiveIntegerField(default=0)
+    changed_by = models.CharField(max_length=100, blank=True)  # Command or admin action that wrote the data
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    SINGLETON_PK = 1
+    
+    def __str__(self):
+        return f"Dataset v{self.version} ({self.changed_by or 'unknown'}, {self.updated_at:%Y-%m-%d %H:%M})"
+    
+    @classmethod
+    def bump(cls, changed_by=''):
+        """Increment the version; call inside the same transaction as the data writes"""
+        now = timezone.now()
+        with transaction.atomic():
+            updated = cls.objects.filter(pk=cls.SINGLETON_PK).update(
+                version=F('version') + 1, changed_by=changed_by[:100], updated_at=now
+            )
+            if not updated:
+                cls.objects.create(pk=cls.SINGLETON_PK, version=1, changed_by=changed_by[:100], updated_at=now)
+        return cls.current()
+    
+    @classmethod
+    def lock(cls):
+        """
+        Lock the version row until the enclosing transaction ends and return (version, updated_at).
+        
+        Rebuilds of derived tables (delete + bulk_create) take this lock so
+        two workers never rebuild the same table at once.
+        """
+        cls.objects.get_or_create(pk=cls.SINGLETON_PK)
+        row = cls.objects.select_for_update().filter(pk=cls.SINGLETON_PK).values_list('version', 'updated_at').get()
+        return DatasetStamp(*row)
+    
+    @classmethod
+    def current(cls):
+        """Return (version, updated_at) with a single primary-key lookup"""
+        row = cls.objects.filter(pk=cls.SINGLETON_PK).values_list('version', 'updated_at').first()
+        return DatasetStamp(*row) if row else DatasetStamp(0, None)
+
+
+
+class HomepageSnapshot(models.Model):
+    """Single-row copy of the homepage totals and featured grants for one dataset version"""
+    dataset_version = models.PositiveIntegerField(default=0)
+    domestic_count = models.IntegerField(default=0)
+    domestic_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    gac_count = models.IntegerField(default=0)
+    gac_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    recent_major = models.JSONField(default=list)  # Combined top 5 grants over $1M
+    notable_grants = models.JSONField(default=list)  # Combined top 5 notable grants
+    built_at = models.DateTimeField(auto_now=True)
+    
+    SINGLETON_PK = 1
+    FEATURED_COUNT = 5
+    
+    def __str__(self):
+        return f"Homepage snapshot for dataset v{self.dataset_version} ({self.built_at:%Y-%m-%d %H:%M})"
+    
+    @classmethod
+    def load(cls, version=None):
+        """The snapshot for the current dataset version, rebuilding it if stale"""
+        if version is None:
+            version = DatasetVersion.current().version
+        snapshot = cls.objects.filter(pk=cls.SINGLETON_PK).first()
+        if snapshot is None or snapshot.dataset_version != version:
+            from .caching import rebuild_lock
+            
+            # One worker rebuilds; the others keep serving the previous snapshot meanwhile
+            with rebuild_lock('homepage-snapshot') as acquired:
+                if acquired or snapshot is None:
+                    snapshot = cls.rebuild()
+        return snapshot
+    
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recompute the totals and featured grants from FundingRecord"""
+        # Serializes concurrent rebuilds (two creates of the singleton row) and version bumps
+        version = DatasetVersion.lock().version
+        
+        totals = FundingRecord.totals()
+        major = FundingRecord.objects.filter(is_superseded=False, value__gte=1000000).order_by('-value')[:cls.FEATURED_COUNT]
+        notable = FundingRecord.objects.filter(is_superseded=False, is_notable=True).order_by('-value')[:cls.FEATURED_COUNT]
+        
+        snapshot, _ = cls.objects.update_or_create(
+            pk=cls.SINGLETON_PK,
+            defaults={
+                'dataset_version': version,
+                'domestic_count': totals['domestic'][0],
+                'domestic_value': totals['domestic'][1],
+                'gac_count': totals['gac'][0],
+                'gac_value': totals['gac'][1],
+                'recent_major': [{
+                    'id': record.grant_id,
+                    'title': record.title,
+                    'recipient': record.country if record.source == 'gac' else record.recipient,
+                    'value': float(record.value),
+                    'type': record.source,
+                    'url': record.get_absolute_url(),
+                    'badge_class': 'bg-info text-white' if record.source == 'gac' else 'major-funding-badge',
+                } for record in major],
+                'notable_grants': [{
+                    'id': record.grant_id,
+                    'title': record.title,
+                    'reason': record.notable_reason,
+                    'value': float(record.value),
+                    'type': record.source,
+                    'url': record.get_absolute_url(),
+                    'badge_class': 'bg-success text-white' if record.source == 'gac' else 'notable-badge',
+                } for record in notable],
+            },
+        )
+        return snapshot
+    
+    def context(self):
+        """Template context for the homepage"""
+        total_count = self.domestic_count + self.gac_count
+        total_value = self.domestic_value + self.gac_value
+        return {
+            'total_count': total_count,
+            'total_value': total_value,
+            'domestic_grants': self.domestic_count,
+            'domestic_value': self.domestic_value,
+            'gac_grants': self.gac_count,
+            'gac_value': self.gac_value,
+            'avg_grant_value': total_value / total_count if total_count > 0 else 0,
+            'recent_major': self.recent_major,
+            'notable_grants': self.notable_grants,
+        }
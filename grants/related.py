@@ -0,0 +1,123 @@
+"""
+Neighbour lists for the related-grants panel on detail pages.
+
+Grants are grouped by each relation key in one pass over compact rows; every
+group keeps only its largest members, and each grant's list is that top list
+without the grant itself. The lists are stored per grant in RelatedGrants.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Grant, GlobalAffairsGrant, RelatedGrants
+
+
+RELATED_LIMIT = 5
+# Amendments of one agreement are all worth showing
+AGREEMENT_LIMIT = 10
+
+
+def _top_groups(items, key, limit):
+    """{group key: largest `limit + 1` items} (one extra so the grant itself can be dropped)"""
+    groups = defaultdict(list)
+    for item in items:
+        group = key(item)
+        if group:
+            groups[group].append(item)
+    return {
+        group: sorted(members, key=lambda item: (-item['value'], item['id']))[:limit + 1]
+        for group, members in groups.items()
+    }
+
+
+def _neighbours(item, groups, key, limit):
+    top = groups.get(key(item), [])
+    return [
+        {field: other[field] for field in ('id', 'title', 'subtitle', 'value')}
+        for other in top if other['id'] != item['id']
+    ][:limit]
+
+
+def agreement_group(agreement_id, recipient_id, agreement_number):
+    """
+    Relation key of an agreement's amendments.
+    
+    Agreement numbers are only unique per recipient ("001" is reused by many
+    departments), so grants are grouped on their consolidated Agreement, or
+    on (recipient, number) before grants.agreements has linked them.
+    """
+    if agreement_id is not None:
+        return ('agreement', agreement_id)
+    number = (agreement_number or '').strip()
+    if number and recipient_id is not None:
+        return ('number', recipient_id, number)
+    return None
+
+
+def _domestic_payloads():
+    items = [{
+        'id': grant_id,
+        'title': title[:100],
+        'subtitle': recipient[:60],
+        'value': float(value),
+        'recipient': recipient_id,
+        'program': program_id,
+        'agreement': agreement_group(agreement_id, recipient_id, agreement_number),
+    } for grant_id, title, recipient, value, recipient_id, program_id, agreement_id, agreement_number in (
+        Grant.objects.values_list(
+            'id', 'agreement_title_en', 'recipient_legal_name', 'agreement_value', 'recipient_id', 'program_id',
+            'agreement_id', 'agreement_number',
+        ).order_by().iterator()
+    )]
+    
+    relations = [
+        ('same_recipient', lambda item: item['recipient'], RELATED_LIMIT),
+        ('same_program', lambda item: item['program'], RELATED_LIMIT),
+        ('same_agreement', lambda item: item['agreement'], AGREEMENT_LIMIT),
+    ]
+    grouped = [(name, key, limit, _top_groups(items, key, limit)) for name, key, limit in relations]
+    for item in items:
+        yield item['id'], {name: _neighbours(item, groups, key, limit) for name, key, limit, groups in grouped}
+
+
+def _gac_payloads():
+    items = []
+    for grant in GlobalAffairsGrant.objects.only('id', 'title', 'country', 'dac_sector', 'maximum_contribution').order_by().iterator():
+        country = grant.primary_country
+        items.append({
+            'id': grant.id,
+            'title': grant.title[:100],
+            'subtitle': country[:60],
+            'value': float(grant.maximum_contribution),
+            'country': country,
+            'sector': grant.primary_sector,
+        })
+    
+    relations = [
+        ('same_country', lambda item: item['country'], RELATED_LIMIT),
+        ('same_sector', lambda item: item['sector'], RELATED_LIMIT),
+    ]
+    grouped = [(name, key, limit, _top_groups(items, key, limit)) for name, key, limit in relations]
+    for item in items:
+        yield item['id'], {name: _neighbours(item, groups, key, limit) for name, key, limit, groups in grouped}
+
+
+@transaction.atomic
+def rebuild_related_grants(source=None, batch_size=1000):
+    """Recompute the related-grants lists of one source (default both); returns the row count"""
+    sources = [source] if source else ['domestic', 'gac']
+    created = 0
+    for source in sources:
+        payloads = _domestic_payloads() if source == 'domestic' else _gac_payloads()
+        RelatedGrants.objects.filter(source=source).delete()
+        batch = []
+        for source_id, payload in payloads:
+            batch.append(RelatedGrants(source=source, source_id=source_id, payload=payload))
+            if len(batch) >= batch_size:
+                RelatedGrants.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            RelatedGrants.objects.bulk_create(batch)
+            created += len(batch)
+    return created
@@ -0,0 +1,170 @@
+"""
+Inverted token index over FundingRecord for /api/search/all/.
+
+Titles, recipients, programs, locations and descriptions of both datasets are
+split into normalized tokens (lowercase, accents stripped, stopwords dropped)
+and stored as SearchToken rows weighted by the field they came from. A query
+is answered from the (token, source) index: records containing every query
+token are ranked by their summed weight, and pages are fetched with a
+(score, record id) keyset cursor instead of OFFSET.
+"""
+import base64
+import re
+import unicodedata
+from collections import Counter
+
+from django.db.models import Count, Q, Sum
+
+from .models import Grant, GlobalAffairsGrant, FundingRecord, SearchToken
+
+
+# Weight of one occurrence of a token in each field
+FIELD_WEIGHTS = {
+    'title': 5,
+    'recipient': 4,
+    'program': 2,
+    'location': 2,
+    'description': 1,
+}
+
+MAX_TOKEN_LENGTH = 40
+MAX_QUERY_TOKENS = 8
+MAX_PAGE_SIZE = 100
+
+STOPWORDS = frozenset('''
+    a an and are as at be by de des du et for from in into is la le les of on or
+    the to with within this that these their its our
+'''.split())
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Normalized search tokens of a piece of text, in order"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return [
+        token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall(text)
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def record_token_weights(fields):
+    """{token: weight} for a {field name: text} mapping"""
+    weights = Counter()
+    for field, text in fields.items():
+        for token in tokenize(text):
+            weights[token] += FIELD_WEIGHTS[field]
+    return weights
+
+
+def _source_texts(source, ids=None):
+    """(source_id, {field: text}) for each grant of one source"""
+    if source == 'domestic':
+        grants = Grant.objects.values_list(
+            'id', 'agreement_title_en', 'recipient_legal_name', 'recipient_operating_name',
+            'program_name_en', 'recipient_city_en', 'recipient_province', 'description_en',
+        )
+        if ids is not None:
+            grants = grants.filter(pk__in=ids)
+        for pk, title, legal_name, operating_name, program, city, province, description in grants.order_by().iterator():
+            yield pk, {
+                'title': title,
+                'recipient': f"{legal_name} {operating_name}",
+                'program': program,
+                'location': f"{city} {province}",
+                'description': description,
+            }
+    else:
+        grants = GlobalAffairsGrant.objects.values_list(
+            'id', 'title', 'executing_agency_partner', 'program_name', 'country', 'region', 'description',
+        )
+        if ids is not None:
+            grants = grants.filter(pk__in=ids)
+        for pk, title, partner, program, country, region, description in grants.order_by().iterator():
+            yield pk, {
+                'title': title,
+                'recipient': partner,
+                'program': program,
+                # Drop the percentage shares from "Mali: 60.00%; Niger: 40.00%"
+                'location': re.sub(r'[\d.]+%', ' ', f"{country} {region}"),
+                'description': description,
+            }
+
+
+def index_records(source, ids=None, batch_size=5000):
+    """Rebuild the search tokens of one source's FundingRecords (or of the given ids)"""
+    records = FundingRecord.objects.filter(source=source)
+    if ids is not None:
+        ids = list(ids)
+        records = records.filter(source_id__in=ids)
+    record_ids = dict(records.values_list('source_id', 'id'))
+    SearchToken.objects.filter(record_id__in=records.values('id')).delete()
+    
+    created = 0
+    batch = []
+    for source_id, fields in _source_texts(source, ids):
+        record_id = record_ids.get(source_id)
+        if record_id is None:
+            continue
+        for token, weight in record_token_weights(fields).items():
+            batch.append(SearchToken(token=token, record_id=record_id, source=source, weight=weight))
+        if len(batch) >= batch_size:
+            SearchToken.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            batch = []
+    if batch:
+        SearchToken.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def encode_cursor(score, record_id):
+    return base64.urlsafe_b64encode(f"{score}:{record_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, record_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        return int(score), int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Malformed cursor')
+
+
+def search_records(query, source=None, cursor=None, limit=20):
+    """
+    One page of FundingRecords matching every token of `query`.
+    
+    Returns (rows, next_cursor) where rows are (record, score) ordered by
+    score descending, then record id; next_cursor is None on the last page.
+    """
+    if source not in (None, 'domestic', 'gac'):
+        raise ValueError(f"Unknown source {source!r} (expected domestic or gac)")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return [], None
+    
+    postings = SearchToken.objects.filter(token__in=tokens)
+    if source:
+        postings = postings.filter(source=source)
+    matches = postings.values('record_id').annotate(
+        score=Sum('weight'), matched=Count('id')
+    ).filter(matched=len(tokens))
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        matches = matches.filter(Q(score__lt=last_score) | Q(score=last_score, record_id__gt=last_id))
+    page = list(matches.order_by('-score', 'record_id').values_list('record_id', 'score')[:limit + 1])
+    
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0])
+    
+    records = FundingRecord.objects.in_bulk([record_id for record_id, _ in page])
+    return [(records[record_id], score) for record_id, score in page if record_id in records], next_cursor
@@ -0,0 +1,158 @@
+"""
+MinHash signatures and an LSH index for finding near-identical grants.
+
+Each grant's title and description (domestic and GAC alike) is reduced to a
+set of word bigrams. The signature keeps, for each of NUM_PERMUTATIONS hash
+functions, the smallest hash over that set; the fraction of equal positions
+between two signatures estimates the Jaccard similarity of the sets.
+
+Signatures are cut into BANDS bands of ROWS_PER_BAND values and every band
+is stored as a bucket key. Grants sharing any bucket are candidates (pairs
+with Jaccard similarity around 0.5 or more almost always share one), so a
+lookup compares a query against a few candidates instead of every grant.
+"""
+import hashlib
+import struct
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Grant, GlobalAffairsGrant, FundingRecord, SimilaritySignature, SimilarityBucket
+from .search import tokenize
+
+
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+
+# Grants compared per lookup; bigger buckets are usually boilerplate text
+MAX_CANDIDATES = 2000
+MAX_RESULTS = 50
+
+HASH_FORMAT = f'<{NUM_PERMUTATIONS}I'
+
+
+@lru_cache(maxsize=200000)
+def shingle_hashes(shingle):
+    """NUM_PERMUTATIONS independent 32-bit hashes of one shingle"""
+    return struct.unpack(HASH_FORMAT, hashlib.shake_128(shingle.encode()).digest(NUM_PERMUTATIONS * 4))
+
+
+def shingles(text):
+    """Word bigrams of the normalized text (single words for one-word texts)"""
+    tokens = tokenize(text)
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f"{first} {second}" for first, second in zip(tokens, tokens[1:])}
+
+
+def minhash(text):
+    """Signature of a text, or None when it has no words to compare"""
+    rows = [shingle_hashes(shingle) for shingle in shingles(text)]
+    if not rows:
+        return None
+    return [min(column) for column in zip(*rows)]
+
+
+def band_keys(signature):
+    """One signed 64-bit bucket key per band"""
+    keys = []
+    for band in range(BANDS):
+        values = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<I{ROWS_PER_BAND}I', band, *values), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def estimated_similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / NUM_PERMUTATIONS
+
+
+def _source_texts(source):
+    if source == 'domestic':
+        rows = Grant.objects.values_list('id', 'agreement_title_en', 'description_en')
+    else:
+        rows = GlobalAffairsGrant.objects.values_list('id', 'title', 'description')
+    for pk, title, description in rows.order_by().iterator():
+        yield pk, f"{title} {description}"
+
+
+@transaction.atomic
+def rebuild_similarity_index(source=None, batch_size=1000):
+    """Recompute the signatures and buckets of one source (default both); returns the number of indexed grants"""
+    sources = [source] if source else ['domestic', 'gac']
+    indexed = 0
+    for source in sources:
+        SimilarityBucket.objects.filter(signature__source=source).delete()
+        SimilaritySignature.objects.filter(source=source).delete()
+        batch = []
+        for source_id, text in _source_texts(source):
+            signature = minhash(text)
+            if signature is not None:
+                batch.append(SimilaritySignature(source=source, source_id=source_id, signature=signature))
+            if len(batch) >= batch_size:
+                indexed += _save_signatures(batch)
+                batch = []
+        if batch:
+            indexed += _save_signatures(batch)
+    shingle_hashes.cache_clear()
+    return indexed
+
+
+def _save_signatures(signatures):
+    SimilaritySignature.objects.bulk_create(signatures)
+    # Primary keys are not returned by every backend's bulk insert
+    saved = SimilaritySignature.objects.filter(
+        source=signatures[0].source, source_id__in=[signature.source_id for signature in signatures]
+    ).values_list('id', 'signature')
+    SimilarityBucket.objects.bulk_create([
+        SimilarityBucket(key=key, signature_id=signature_id)
+        for signature_id, signature in saved
+        for key in band_keys(signature)
+    ])
+    return len(signatures)
+
+
+def similar_grants(source, source_id, limit=10, min_similarity=0.0):
+    """
+    Most similar indexed grants to one grant, as (FundingRecord, similarity).
+    
+    Returns None when the grant has no signature (not indexed yet or no text).
+    """
+    target = SimilaritySignature.objects.filter(source=source, source_id=source_id).first()
+    if target is None:
+        return None
+    
+    # Grants sharing more bands are more similar, so a capped lookup keeps those first
+    candidate_ids = (
+        SimilarityBucket.objects.filter(key__in=band_keys(target.signature))
+        .exclude(signature_id=target.pk)
+        .values('signature_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared', 'signature_id')
+        .values_list('signature_id', flat=True)[:MAX_CANDIDATES]
+    )
+    candidates = SimilaritySignature.objects.filter(
+        pk__in=list(candidate_ids)
+    ).values_list('source', 'source_id', 'signature')
+    
+    scored = []
+    for candidate_source, candidate_id, signature in candidates:
+        similarity = estimated_similarity(target.signature, signature)
+        if similarity >= min_similarity:
+            scored.append((similarity, candidate_source, candidate_id))
+    scored.sort(key=lambda item: (-item[0], item[1], item[2]))
+    scored = scored[:limit]
+    
+    records = {
+        (record.source, record.source_id): record
+        for record in FundingRecord.objects.filter(
+            source_id__in=[candidate_id for _, _, candidate_id in scored]
+        )
+    }
+    return [
+        (records[(candidate_source, candidate_id)], similarity)
+        for similarity, candidate_source, candidate_id in scored
+        if (candidate_source, candidate_id) in records
+    ]
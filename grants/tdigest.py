@@ -0,0 +1,113 @@
+"""
+Minimal merging t-digest used to approximate quantiles when the database
+has no percentile functions (e.g. SQLite in development).
+
+Digests serialize to plain dicts so they can be stored in JSON columns and
+merged later without revisiting the underlying rows.
+"""
+import math
+
+
+class TDigest:
+    """Streaming quantile sketch with bounded size (~compression centroids)"""
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []  # (mean, weight) sorted by mean
+        self.buffer = []
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        value = float(value)
+        self.buffer.append((value, weight))
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.buffer) >= self.compression * 5:
+            self._merge()
+
+    def update(self, other):
+        """Fold another digest into this one"""
+        for mean, weight in other.centroids + other.buffer:
+            self.buffer.append((mean, weight))
+        self.count += other.count
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None else min(self.min, bound)
+                self.max = bound if self.max is None else max(self.max, bound)
+        self._merge()
+
+    def _scale(self, q):
+        q = min(max(q, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _merge(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+
+        merged = []
+        cumulative = 0
+        mean, weight = points[0]
+        k_lower = self._scale(0)
+        for point_mean, point_weight in points[1:]:
+            q = (cumulative + weight + point_weight) / self.count
+            if self._scale(q) - k_lower <= 1:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                cumulative += weight
+                k_lower = self._scale(cumulative / self.count)
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+
+    def quantile(self, q):
+        """Estimate the value at fraction q (0 <= q <= 1)"""
+        self._merge()
+        if not self.centroids:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        # Interpolate between centroid midpoints, anchored at min and max
+        target = q * self.count
+        cumulative = 0
+        previous_mid, previous_mean = 0, self.min
+        for mean, weight in self.centroids:
+            mid = cumulative + weight / 2
+            if target < mid:
+                fraction = (target - previous_mid) / (mid - previous_mid) if mid > previous_mid else 0
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_mid, previous_mean = mid, mean
+            cumulative += weight
+
+        fraction = (target - previous_mid) / (self.count - previous_mid) if self.count > previous_mid else 0
+        return previous_mean + (self.max - previous_mean) * fraction
+
+    def to_dict(self):
+        self._merge()
+        return {
+            'compression': self.compression,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'centroids': [[round(mean, 2), weight] for mean, weight in self.centroids],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(compression=data.get('compression', 100))
+        digest.count = data.get('count', 0)
+        digest.min = data.get('min')
+        digest.max = data.get('max')
+        digest.centroids = [tuple(centroid) for centroid in data.get('centroids', [])]
+        return digest
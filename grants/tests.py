@@ -1,3 +1,372 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import TestCase, RequestFactory
+
+from .agreements import rebuild_agreements
+from .analytics import histogram, value_quantiles, rebuild_quantile_sketches
+from .dimensions import rebuild_dimensions
+from .linking import rebuild_recipient_links
+from .middleware import ConditionalGetMiddleware
+from .related import rebuild_related_grants
+from .similarity import band_keys, similar_grants, rebuild_similarity_index, NUM_PERMUTATIONS
+from .versioning import refresh_domestic_derived
+from .views import build_statistics_context
+from .entities import rebuild_recipients
+from .models import (
+    Grant, GlobalAffairsGrant, Recipient, RecipientYear, Program, NaicsCode, DatasetVersion, FundingRecord,
+    HomepageSnapshot, Agreement, RelatedGrants, SimilaritySignature, SimilarityBucket, RecipientLink,
+)
+
+
+def make_grant(reference_number, **fields):
+    values = {
+        'recipient_province': 'ON',
+        'recipient_city_en': 'Toronto',
+        'recipient_legal_name': 'Acme Inc.',
+        'recipient_type': 'F',
+        'recipient_postal_code': 'M5V1A1',
+        'agreement_title_en': f'Grant {reference_number}',
+        'agreement_number': reference_number,
+        'agreement_value': Decimal('1000'),
+        'description_en': '',
+        'program_name_en': 'Innovation Program',
+        'naics_identifier': '541710',
+        'naics_sector_en': 'Research and development',
+        'fiscal_year': '2022-23',
+    }
+    values.update(fields)
+    return Grant.objects.create(reference_number=reference_number, **values)
+
+
+class GrantAdminDeleteTests(TestCase):
+    """Deleting grants in the admin refreshes the tables built from them"""
+    
+    def setUp(self):
+        self.admin = site._registry[Grant]
+        self.request = RequestFactory().post('/admin/')
+        self.grants = [
+            make_grant('R1', agreement_value=Decimal('1000')),
+            make_grant('R2', agreement_value=Decimal('2000')),
+            make_grant('R3', agreement_value=Decimal('4000'), fiscal_year='2023-24'),
+        ]
+        rebuild_recipients()
+        rebuild_dimensions()
+    
+    def test_delete_model_refreshes_recipient(self):
+        self.admin.delete_model(self.request, self.grants[0])
+        recipient = Recipient.objects.get(key='acme')
+        self.assertEqual(recipient.grant_count, 2)
+        self.assertEqual(recipient.total_value, Decimal('6000'))
+        self.assertEqual(
+            dict(RecipientYear.objects.filter(recipient=recipient).values_list('year', 'grant_count')),
+            {2022: 1, 2023: 1},
+        )
+    
+    def test_delete_queryset_refreshes_recipient(self):
+        self.admin.delete_queryset(self.request, Grant.objects.filter(reference_number__in=['R2', 'R3']))
+        recipient = Recipient.objects.get(key='acme')
+        self.assertEqual(recipient.grant_count, 1)
+        self.assertEqual(recipient.total_value, Decimal('1000'))
+    
+    def test_deleting_last_grant_removes_recipient(self):
+        self.admin.delete_queryset(self.request, Grant.objects.all())
+        self.assertFalse(Recipient.objects.exists())
+    
+    def test_delete_refreshes_program_and_naics_rollups(self):
+        make_grant('R4', naics_identifier='541990', agreement_value=Decimal('500'))
+        rebuild_dimensions()
+        self.admin.delete_model(self.request, self.grants[0])
+        
+        program = Program.objects.get()
+        self.assertEqual((program.grant_count, program.total_value), (3, Decimal('6500')))
+        totals = {node.code: (node.grant_count, node.total_value) for node in NaicsCode.objects.all()}
+        self.assertEqual(totals['54'], (3, Decimal('6500')))
+        self.assertEqual(totals['5417'], (2, Decimal('6000')))
+        self.assertEqual(totals['541710'], (2, Decimal('6000')))
+        
+        self.admin.delete_model(self.request, Grant.objects.get(reference_number='R4'))
+        self.assertFalse(NaicsCode.objects.filter(code__startswith='5419').exists())
+        self.assertEqual(NaicsCode.objects.get(code='541').grant_count, 2)
+
+
+class HomepageSnapshotTests(TestCase):
+    def setUp(self):
+        make_grant('R1', agreement_value=Decimal('1000'))
+        FundingRecord.sync('domestic')
+    
+    def test_version_bump_rebuilds_snapshot(self):
+        self.assertEqual(HomepageSnapshot.load().domestic_value, Decimal('1000'))
+        
+        make_grant('R2', agreement_value=Decimal('2000'))
+        FundingRecord.sync('domestic')
+        version = DatasetVersion.bump().version
+        snapshot = HomepageSnapshot.load()
+        self.assertEqual((snapshot.dataset_version, snapshot.domestic_count), (version, 2))
+        self.assertEqual(HomepageSnapshot.objects.count(), 1)
+    
+    def test_stale_snapshot_served_while_another_worker_rebuilds(self):
+        HomepageSnapshot.rebuild()
+        version = DatasetVersion.bump().version
+        
+        cache.add('rebuild:homepage-snapshot:lock', 1)
+        try:
+            self.assertEqual(HomepageSnapshot.load(version).dataset_version, version - 1)
+        finally:
+            cache.delete('rebuild:homepage-snapshot:lock')
+        self.assertEqual(HomepageSnapshot.load(version).dataset_version, version)
+
+
+class ConditionalGetTests(TestCase):
+    def test_matching_etag_gets_304_without_last_modified(self):
+        response = self.client.get('/api/stats/')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        
+        response = self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_if_modified_since_alone_is_not_answered(self):
+        response = self.client.get('/api/stats/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_calculator_page_is_not_tagged(self):
+        response = self.client.get('/calculator/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+    
+    def test_response_using_csrf_token_is_not_tagged(self):
+        def view(request):
+            get_token(request)
+            return HttpResponse('<form></form>')
+        
+        request = RequestFactory().get('/form/')
+        request._dataset_etag = 'W/"1-abc"'
+        response = ConditionalGetMiddleware(view)(request)
+        self.assertNotIn('ETag', response)
+
+
+class QuantileSketchTests(TestCase):
+    def setUp(self):
+        for i, value in enumerate([1000, 2000, 3000]):
+            make_grant(f'R{i}', agreement_value=Decimal(value))
+        rebuild_quantile_sketches('domestic')
+    
+    def test_admin_edit_rebuilds_sketches(self):
+        grant = Grant.objects.get(reference_number='R2')
+        grant.agreement_value = Decimal('9000')
+        site._registry[Grant].save_model(RequestFactory().post('/admin/'), grant, None, True)
+        
+        _, rows = value_quantiles('domestic', fractions=(0.99,))
+        self.assertGreater(rows[0]['quantiles']['p99'], 3000)
+    
+    def test_refresh_after_flagging(self):
+        Grant.objects.filter(reference_number='R2').update(agreement_value=Decimal('9000'))
+        version = DatasetVersion.current().version
+        refresh_domestic_derived('flag_test')
+        
+        self.assertEqual(FundingRecord.objects.filter(source='domestic').count(), 3)
+        _, rows = value_quantiles('domestic', fractions=(0.99,))
+        self.assertGreater(rows[0]['quantiles']['p99'], 3000)
+        self.assertEqual(DatasetVersion.objects.get().changed_by, 'flag_test')
+        self.assertGreater(DatasetVersion.current().version, version)
+    
+    @mock.patch('grants.management.commands.build_quantile_sketches.database_has_percentiles', return_value=False)
+    def test_build_command_bumps_version(self, _):
+        version = DatasetVersion.current().version
+        call_command('build_quantile_sketches', stdout=StringIO())
+        self.assertGreater(DatasetVersion.current().version, version)
+    
+    def test_quantiles_never_build_sketches(self):
+        rebuild_quantile_sketches('gac')
+        GlobalAffairsGrant.objects.create(
+            project_number='P1', date_modified='2024-01-01', title='Project', description='', status='closed',
+            country='Peru', maximum_contribution=Decimal('5000'), program_name='Americas', dac_sector='Health',
+            start_date='2020-01-01',
+        )
+        self.assertEqual(value_quantiles('gac', 'year'), ('sketch', []))
+    
+    def test_groups_are_text(self):
+        GlobalAffairsGrant.objects.create(
+            project_number='P1', date_modified='2024-01-01', title='Project', description='', status='closed',
+            country='Peru', maximum_contribution=Decimal('5000'), program_name='Americas', dac_sector='Health',
+            start_date='2020-01-01',
+        )
+        rebuild_quantile_sketches('gac')
+        _, rows = value_quantiles('gac', 'year')
+        self.assertEqual([row['group'] for row in rows], ['2020'])
+
+
+class ControversialFilterTests(TestCase):
+    def setUp(self):
+        make_grant('R1', description_en='Climate adaptation')  # Classified as controversial on save
+        make_grant('R2')
+    
+    def references(self, url):
+        return sorted(grant.reference_number for grant in self.client.get(url).context['page_obj'])
+    
+    def test_grant_list_parses_true_and_false(self):
+        self.assertEqual(self.references('/grants/?controversial=true'), ['R1'])
+        self.assertEqual(self.references('/grants/?controversial=false'), ['R2'])
+        self.assertEqual(self.references('/grants/?controversial=0'), ['R2'])
+    
+    def test_grant_list_ignores_unknown_values(self):
+        self.assertEqual(self.references('/grants/?controversial=maybe'), ['R1', 'R2'])
+    
+    def test_search_api_parses_false(self):
+        response = self.client.get('/api/search/?controversial=false')
+        self.assertEqual([grant['title'] for grant in response.json()['results']], ['Grant R2'])
+
+
+class AgreementTests(TestCase):
+    """An agreement published with amendments counts once"""
+    
+    def setUp(self):
+        make_grant('R1', agreement_number='AG1', agreement_value=Decimal('1000'), fiscal_year='2021-22')
+        make_grant('R2', agreement_number='AG1', agreement_value=Decimal('1500'), fiscal_year='2022-23')
+        make_grant('R3', agreement_number='AG1', agreement_value=Decimal('2000'), fiscal_year='2023-24')
+        make_grant('R4', agreement_number='AG2', agreement_value=Decimal('500'), fiscal_year='2022-23')
+        rebuild_recipients()
+        rebuild_dimensions()
+        rebuild_agreements()
+    
+    def test_deleting_an_earlier_amendment_refreshes_the_agreement(self):
+        site._registry[Grant].delete_model(RequestFactory().post('/admin/'), Grant.objects.get(reference_number='R2'))
+        agreement = Agreement.objects.get(number='AG1')
+        self.assertEqual((agreement.grant_count, agreement.value), (2, Decimal('2000')))
+        self.assertEqual([row['reference_number'] for row in agreement.history], ['R1', 'R3'])
+    
+    def test_statistics_breakdowns_count_agreements_once(self):
+        context = build_statistics_context()
+        self.assertEqual((context['basic_stats']['total_grants'], context['basic_stats']['agreement_count']), (4, 2))
+        self.assertEqual([grant.reference_number for grant in context['top_grants']], ['R3', 'R4'])
+        self.assertEqual(
+            [(row['recipient_type'], row['count'], row['total_value']) for row in json.loads(context['recipient_type_data'])],
+            [('F', 2, 2500.0)],
+        )
+    
+    def assert_breakdowns_match_headline(self):
+        context = build_statistics_context()
+        total = context['basic_stats']['total_value']
+        self.assertEqual(sum(row['total_value'] for row in context['top_recipients']), total)
+        self.assertEqual(sum(row['total_value'] for row in json.loads(context['program_data'])), total)
+        self.assertEqual(sum(row['total_value'] for row in json.loads(context['sector_data'])), total)
+        self.assertEqual(sum(row.total_value for row in RecipientYear.objects.all()), total)
+        return total
+    
+    def test_breakdowns_sum_to_headline_total(self):
+        self.assertEqual(self.assert_breakdowns_match_headline(), 2500)
+        self.assertEqual(Recipient.objects.get().grant_count, 2)
+    
+    def test_admin_amendment_keeps_breakdowns_consolidated(self):
+        grant = make_grant('R5', agreement_number='AG1', agreement_value=Decimal('3000'), fiscal_year='2024-25')
+        site._registry[Grant].save_model(RequestFactory().post('/admin/'), grant, None, False)
+        self.assertEqual(self.assert_breakdowns_match_headline(), 3500)
+        
+        site._registry[Grant].delete_model(RequestFactory().post('/admin/'), grant)
+        self.assertEqual(self.assert_breakdowns_match_headline(), 2500)
+    
+    def test_same_agreement_is_per_recipient(self):
+        make_grant('R5', agreement_number='AG1', recipient_legal_name='Other Corp', fiscal_year='2022-23')
+        rebuild_recipients()
+        rebuild_agreements()
+        rebuild_related_grants('domestic')
+        
+        related = RelatedGrants.for_grant('domestic', Grant.objects.get(reference_number='R3').pk)
+        self.assertEqual([item['title'] for item in related['same_agreement']], ['Grant R2', 'Grant R1'])
+        other = RelatedGrants.for_grant('domestic', Grant.objects.get(reference_number='R5').pk)
+        self.assertEqual(other['same_agreement'], [])
+    
+    def test_admin_edits_refresh_related_grants(self):
+        admin = site._registry[Grant]
+        grant = make_grant('R5', agreement_number='AG1', fiscal_year='2024-25')
+        admin.save_model(RequestFactory().post('/admin/'), grant, None, False)
+        self.assertIn('Grant R3', [item['title'] for item in RelatedGrants.for_grant('domestic', grant.pk)['same_agreement']])
+        
+        r3 = Grant.objects.get(reference_number='R3')
+        admin.delete_model(RequestFactory().post('/admin/'), grant)
+        self.assertFalse(RelatedGrants.objects.filter(source='domestic', source_id=grant.pk).exists())
+        self.assertNotIn(grant.pk, [item['id'] for item in RelatedGrants.for_grant('domestic', r3.pk)['same_agreement']])
+    
+    def test_build_command_bumps_version(self):
+        version = DatasetVersion.current().version
+        call_command('build_related_grants', stdout=StringIO())
+        self.assertGreater(DatasetVersion.current().version, version)
+
+
+class RecipientLinkTests(TestCase):
+    def make_gac_grant(self, project_number, partner, value):
+        return GlobalAffairsGrant.objects.create(
+            project_number=project_number, date_modified='2024-01-01', title='Project', description='',
+            status='closed', country='Peru', maximum_contribution=Decimal(value), program_name='Americas',
+            dac_sector='Health', executing_agency_partner=partner,
+        )
+    
+    def test_gac_admin_edits_refresh_links(self):
+        make_grant('R1')
+        make_grant('R2', recipient_legal_name='Beta Corp')
+        rebuild_recipients()
+        grant = self.make_gac_grant('P1', 'Acme Inc.', '5000')
+        self.make_gac_grant('P2', 'Acme Inc', '3000')
+        rebuild_recipient_links()
+        admin = site._registry[GlobalAffairsGrant]
+        
+        grant.maximum_contribution = Decimal('7000')
+        admin.save_model(RequestFactory().post('/admin/'), grant, None, True)
+        self.assertEqual(RecipientLink.objects.get(partner_key='acme').gac_value, Decimal('10000'))
+        
+        grant.executing_agency_partner = 'Beta Corp.'
+        admin.save_model(RequestFactory().post('/admin/'), grant, None, True)
+        links = {link.partner_key: (link.gac_count, link.gac_value) for link in RecipientLink.objects.all()}
+        self.assertEqual(links, {'acme': (1, Decimal('3000')), 'beta': (1, Decimal('7000'))})
+        
+        admin.delete_model(RequestFactory().post('/admin/'), grant)
+        self.assertFalse(RecipientLink.objects.filter(partner_key='beta').exists())
+
+
+class SimilarGrantsTests(TestCase):
+    def test_candidates_sharing_most_bands_come_first(self):
+        grants = [make_grant(f'R{i}') for i in range(3)]
+        FundingRecord.sync('domestic')
+        target_signature = [0] * NUM_PERMUTATIONS
+        keys = band_keys(target_signature)
+        # The first grant shares one band with the target, the second shares three
+        for grant, shared in zip(grants, (len(keys), 1, 3)):
+            signature = SimilaritySignature.objects.create(
+                source='domestic', source_id=grant.pk,
+                signature=target_signature if shared == len(keys) else [1] * NUM_PERMUTATIONS,
+            )
+            SimilarityBucket.objects.bulk_create([SimilarityBucket(key=key, signature=signature) for key in keys[:shared]])
+        
+        with mock.patch('grants.similarity.MAX_CANDIDATES', 1):
+            results = similar_grants('domestic', grants[0].pk)
+        self.assertEqual([record.source_id for record, _ in results], [grants[2].pk])
+    
+    def test_command_bumps_version_and_source_rebuild_keeps_the_other_source(self):
+        make_grant('R1', agreement_title_en='Clean water research')
+        version = DatasetVersion.current().version
+        call_command('build_similarity_index', stdout=StringIO())
+        self.assertGreater(DatasetVersion.current().version, version)
+        
+        SimilaritySignature.objects.create(source='gac', source_id=1, signature=[0] * NUM_PERMUTATIONS)
+        rebuild_similarity_index('domestic')
+        self.assertEqual(set(SimilaritySignature.objects.values_list('source', flat=True)), {'domestic', 'gac'})
+
+
+class HistogramTests(TestCase):
+    def test_percentages_are_of_all_rows(self):
+        for i, value in enumerate([1000, 2000, 3000, 50000]):
+            make_grant(f'R{i}', agreement_value=Decimal(value))
+        buckets, excluded = histogram(Grant.objects.all(), 'agreement_value', [1500, 10000])
+        self.assertEqual([(bucket['count'], bucket['percentage']) for bucket in buckets], [(2, 50.0), (1, 25.0)])
+        self.assertEqual(excluded, 1)
+        
+        response = self.client.get('/api/histogram/?edges=1500,10000')
+        self.assertEqual(response.json()['excluded_count'], 1)
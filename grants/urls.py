@@ -11,6 +11,7 @@ urlpatterns = [
     path('major-funding/', views.major_funding, name='major_funding'),
     path('notable/', views.notable_grants, name='notable_grants'),
     path('statistics/', views.statistics_page, name='statistics'),
+    path('recipients/<int:pk>/', views.recipient_detail, name='recipient_detail'),
     
     # Global Affairs Canada (GAC) Grants
     path('global-affairs/', views.gac_grant_list, name='gac_grant_list'),
@@ -24,9 +25,22 @@ urlpatterns = [
     path('api/stats/', views.grant_stats_api, name='grant_stats_api'),
     path('api/search/', views.grants_search_api, name='grants_search_api'),
     path('api/recipients/', views.recipients_api, name='recipients_api'),
+    path('api/recipients/<int:pk>/', views.recipient_api, name='recipient_api'),
+    path('api/agreements/', views.agreements_api, name='agreements_api'),
+    path('api/programs/', views.programs_api, name='programs_api'),
+    path('api/naics/', views.naics_api, name='naics_api'),
     path('api/comprehensive-stats/', views.comprehensive_stats_api, name='comprehensive_stats_api'),
     
     # GAC Grants API Endpoints
     path('api/gac/stats/', views.gac_stats_api, name='gac_stats_api'),
     path('api/gac/search/', views.gac_search_api, name='gac_search_api'),
+    
+    # Combined Search API (domestic and GAC)
+    path('api/search/all/', views.search_all_api, name='search_all_api'),
+    path('api/similar/<str:grant_id>/', views.similar_grants_api, name='similar_grants_api'),
+    
+    # Analytics API Endpoints (domestic and GAC)
+    path('api/histogram/', views.histogram_api, name='histogram_api'),
+    path('api/quantiles/', views.quantiles_api, name='quantiles_api'),
+    path('api/cache-stats/', views.cache_stats_api, name='cache_stats_api'),
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+Access to the dataset version stamp used to key caches, ETags and
+precomputed artifacts. The stamp changes only when grant data is written.
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .analytics import rebuild_quantile_sketches
+from .models import DatasetVersion, FundingRecord
+
+
+def get_dataset_version(request=None):
+    """Current DatasetStamp, looked up at most once per request"""
+    if request is None:
+        return DatasetVersion.current()
+    stamp = getattr(request, '_dataset_stamp', None)
+    if stamp is None:
+        stamp = request._dataset_stamp = DatasetVersion.current()
+    return stamp
+
+
+def refresh_domestic_derived(changed_by):
+    """Resync the domestic funding records and quantile sketches after grants were flagged, then bump the version"""
+    FundingRecord.sync('domestic')
+    rebuild_quantile_sketches('domestic')
+    DatasetVersion.bump(changed_by)
+
+
+def lazy_dataset_version(request):
+    """DatasetStamp that is only queried if something actually reads it"""
+    return SimpleLazyObject(lambda: get_dataset_version(request))
+
+
+class DatasetVersionMiddleware:
+    """Attach request.dataset_version (lazy DatasetStamp) to every request"""
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        request.dataset_version = lazy_dataset_version(request)
+        return self.get_response(request)
@@ -4,123 +4,37 @@ from django.db.models import Sum, Count, Avg, Max, Min, Q
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import models
+from django.conf import settings
 import json
 from decimal import Decimal
-from .models import Grant, GlobalAffairsGrant
+from .models import (
+    Grant, GlobalAffairsGrant, HomepageSnapshot, Recipient, Program, NaicsCode, RelatedGrants, Agreement, FundingRecord,
+)
+from .caching import cache_api_response, get_cache_stats, get_or_compute, CACHED_VIEWS
+from .versioning import get_dataset_version
+from .middleware import etag_exempt
+from .search import search_records, tokenize, MAX_QUERY_TOKENS
+from .similarity import similar_grants, MAX_RESULTS as MAX_SIMILAR_RESULTS
+from calculator.result_cache import calculation_cache
+from .analytics import (
+    histogram, get_value_source, log_edges, value_quantiles, parse_quantiles
+)
+
+
+def parse_flag(value):
+    """True/False for a yes/no query parameter, None when it is missing or not recognized"""
+    value = (value or '').strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    return None
 
 
 def home(request):
-    """Homepage with overview stats"""
-    # Domestic grants stats
-    domestic_total_value = Grant.objects.aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0
-    domestic_count = Grant.objects.count()
-    
-    # GAC grants stats  
-    gac_total_value = GlobalAffairsGrant.objects.aggregate(Sum('maximum_contribution'))['maximum_contribution__sum'] or 0
-    gac_count = GlobalAffairsGrant.objects.count()
-    
-    # Combined stats
-    total_value = domestic_total_value + gac_total_value
-    total_count = domestic_count + gac_count
-    
-    # Recent Major Funding - combine domestic and GAC
-    recent_major = []
-    
-    # Get major domestic grants (over $1M)
-    domestic_major = Grant.objects.filter(
-        agreement_value__gte=1000000
-    ).order_by('-agreement_value')[:3]
-    
-    for grant in domestic_major:
-        recent_major.append({
-            'id': grant.id,
-            'title': grant.agreement_title_en,
-            'recipient': grant.recipient_legal_name,
-            'value': grant.agreement_value,
-            'type': 'domestic',
-            'url': grant.get_absolute_url(),
-            'badge_class': 'major-funding-badge'
-        })
-    
-    # Get major GAC grants (over $1M)
-    gac_major = GlobalAffairsGrant.objects.filter(
-        maximum_contribution__gte=1000000
-    ).order_by('-maximum_contribution')[:3]
-    
-    for grant in gac_major:
-        recent_major.append({
-            'id': f"gac_{grant.id}",
-            'title': grant.title,
-            'recipient': grant.primary_country,
-            'value': grant.maximum_contribution,
-            'type': 'gac',
-            'url': grant.get_absolute_url(),
-            'badge_class': 'bg-info text-white'
-        })
-    
-    # Sort all major grants by value and take top 5
-    recent_major.sort(key=lambda x: x['value'], reverse=True)
-    recent_major = recent_major[:5]
-    
-    # Notable Grants - combine notable domestic and special GAC grants
-    notable_grants = []
-    
-    # Get notable domestic grants
-    domestic_notable = Grant.objects.filter(is_notable=True).order_by('-agreement_value')[:3]
-    
-    for grant in domestic_notable:
-        notable_grants.append({
-            'id': grant.id,
-            'title': grant.agreement_title_en,
-            'reason': grant.notable_reason or 'Notable grant',
-            'value': grant.agreement_value,
-            'type': 'domestic',
-            'url': grant.get_absolute_url(),
-            'badge_class': 'notable-badge'
-        })
-    
-    # Get GAC grants with special policy markers
-    gac_notable = GlobalAffairsGrant.objects.filter(
-        Q(policy_markers__icontains='gender') |
-        Q(policy_markers__icontains='environmental') |
-        Q(maximum_contribution__gte=5000000)  # Very large international grants
-    ).order_by('-maximum_contribution')[:3]
-    
-    for grant in gac_notable:
-        reason = "International development"
-        if grant.policy_markers and 'gender' in grant.policy_markers.lower():
-            reason = "Gender equality focus"
-        elif grant.policy_markers and 'environmental' in grant.policy_markers.lower():
-            reason = "Environmental sustainability"
-        elif grant.maximum_contribution >= 5000000:
-            reason = "Major international funding"
-            
-        notable_grants.append({
-            'id': f"gac_{grant.id}",
-            'title': grant.title,
-            'reason': reason,
-            'value': grant.maximum_contribution,
-            'type': 'gac',
-            'url': grant.get_absolute_url(),
-            'badge_class': 'bg-success text-white'
-        })
-    
-    # Sort notable grants by value and take top 5
-    notable_grants.sort(key=lambda x: x['value'], reverse=True)
-    notable_grants = notable_grants[:5]
-    
-    context = {
-        'total_count': total_count,
-        'total_value': total_value,
-        'domestic_grants': domestic_count,
-        'domestic_value': domestic_total_value,
-        'gac_grants': gac_count, 
-        'gac_value': gac_total_value,
-        'avg_grant_value': total_value / total_count if total_count > 0 else 0,
-        'recent_major': recent_major,
-        'notable_grants': notable_grants,
-    }
-    return render(request, 'grants/home.html', context)
+    """Homepage with overview stats, read from the single-row snapshot"""
+    snapshot = HomepageSnapshot.load(get_dataset_version(request).version)
+    return render(request, 'grants/home.html', snapshot.context())
 
 
 def grant_list(request):
@@ -145,6 +59,11 @@ def grant_list(request):
     if year:
         grants = grants.filter(fiscal_year=year)
         
+    # Same values as /api/search/; anything else is ignored
+    controversial = parse_flag(request.GET.get('controversial'))
+    if controversial is not None:
+        grants = grants.filter(is_controversial=controversial)
+        
     min_value = request.GET.get('min_value')
     if min_value:
         try:
@@ -180,6 +99,7 @@ def grant_list(request):
         'current_filters': {
             'province': province,
             'year': year,
+            'controversial': controversial,
             'min_value': min_value,
             'max_value': max_value,
             'sort': sort_by,
@@ -190,8 +110,64 @@ def grant_list(request):
 
 def grant_detail(request, pk):
     """Detailed view of a single domestic grant"""
-    grant = get_object_or_404(Grant, pk=pk)
-    return render(request, 'grants/grant_detail.html', {'grant': grant})
+    grant = get_object_or_404(Grant.objects.select_related('agreement'), pk=pk)
+    related = RelatedGrants.for_grant('domestic', pk)
+    return render(request, 'grants/grant_detail.html', {'grant': grant, 'related': related})
+
+
+def recipient_profile(recipient):
+    """Yearly totals, programs and flagged grants of one recipient"""
+    grants = recipient.grants.all()
+    
+    yearly = [{
+        'year': row.year,
+        'grant_count': row.grant_count,
+        'total_value': float(row.total_value),
+    } for row in recipient.years.order_by('year')]
+    
+    programs = [{
+        'program_id': row['program_id'],
+        'name': row['program__name'] or 'Unknown program',
+        'grant_count': row['grant_count'],
+        'total_value': float(row['total_value'] or 0),
+    } for row in grants.order_by().values('program_id', 'program__name').annotate(
+        grant_count=Count('id'), total_value=Sum('agreement_value')
+    ).order_by('-total_value')]
+    
+    flagged = list(grants.filter(Q(is_notable=True) | Q(is_controversial=True)).order_by('-agreement_value')[:50])
+    
+    # GAC projects of the linked executing agency partners (indexed on source and recipient_key)
+    links = list(recipient.links.all())
+    international = list(FundingRecord.objects.filter(
+        source='gac', recipient_key__in=recipient.links.values('partner_key')
+    ).order_by('-value')[:50]) if links else []
+    international_value = sum((link.gac_value for link in links), Decimal('0'))
+    
+    return {
+        'yearly': yearly,
+        'programs': programs,
+        'flagged': flagged,
+        'links': links,
+        'international': international,
+        'international_count': sum(link.gac_count for link in links),
+        'international_value': international_value,
+        'combined_value': recipient.total_value + international_value,
+    }
+
+
+def recipient_detail(request, pk):
+    """All funding received by one recipient"""
+    recipient = get_object_or_404(Recipient, pk=pk)
+    
+    paginator = Paginator(recipient.grants.order_by('-agreement_value', 'pk'), 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    context = {
+        'recipient': recipient,
+        'page_obj': page_obj,
+        **recipient_profile(recipient),
+    }
+    return render(request, 'grants/recipient_detail.html', context)
 
 
 def major_funding(request):
@@ -361,11 +337,18 @@ def gac_grant_list(request):
 def gac_grant_detail(request, pk):
     """Detailed view of a single GAC grant"""
     grant = get_object_or_404(GlobalAffairsGrant, pk=pk)
-    return render(request, 'grants/gac_grant_detail.html', {'grant': grant})
+    related = RelatedGrants.for_grant('gac', pk)
+    return render(request, 'grants/gac_grant_detail.html', {'grant': grant, 'related': related})
 
 
 def gac_statistics(request):
     """Statistics page for GAC grants"""
+    context = get_or_compute('gac_statistics', build_gac_statistics_context, request)
+    return render(request, 'grants/gac_statistics.html', context)
+
+
+def build_gac_statistics_context():
+    """Template context for the GAC statistics page"""
     grants = GlobalAffairsGrant.objects.all()
     
     # Basic stats
@@ -429,7 +412,7 @@ def gac_statistics(request):
         'env_grants': env_grants,
         'governance_grants': governance_grants,
     }
-    return render(request, 'grants/gac_statistics.html', context)
+    return context
 
 
 # =============================================================================
@@ -438,20 +421,30 @@ def gac_statistics(request):
 
 def statistics_page(request):
     """Comprehensive statistics dashboard for domestic grants"""
+    context = get_or_compute('statistics_page', build_statistics_context, request)
+    return render(request, 'grants/statistics.html', context)
+
+
+def build_statistics_context():
+    """Template context for the domestic statistics dashboard"""
     grants = Grant.objects.all()
+    # Breakdowns count each agreement once, through its latest amendment (the row carrying its value)
+    latest = Grant.counted()
     
-    # Basic statistics
+    # Basic statistics over consolidated agreements (amendments counted once, no grouping)
+    agreements = Agreement.totals()
     total_grants = grants.count()
-    total_value = grants.aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0
-    avg_value = grants.aggregate(Avg('agreement_value'))['agreement_value__avg'] or 0
-    median_value = grants.order_by('agreement_value')[total_grants//2].agreement_value if total_grants > 0 else 0
+    total_value = agreements['value']
+    avg_value = agreements['value'] / agreements['count'] if agreements['count'] else 0
+    overall_quantiles = value_quantiles('domestic')[1]
+    median_value = overall_quantiles[0]['quantiles']['median'] if total_grants > 0 and overall_quantiles else 0
     
     # Top grants
-    top_grants = grants.order_by('-agreement_value')[:10]
+    top_grants = list(latest.order_by('-agreement_value')[:10])
     
     # Yearly data for charts
     yearly_data_raw = list(
-        grants.values('fiscal_year')
+        latest.values('fiscal_year')
         .annotate(
             count=Count('id'),
             total_value=Sum('agreement_value'),
@@ -476,12 +469,12 @@ def statistics_page(request):
     
     # Provincial data
     provincial_data_raw = list(
-        grants.values('recipient_province')
+        latest.values('recipient_province')
         .annotate(
             count=Count('id'),
             total_value=Sum('agreement_value'),
             avg_value=Avg('agreement_value'),
-            unique_recipients=Count('recipient_legal_name', distinct=True)
+            unique_recipients=Count('recipient', distinct=True)
         )
         .order_by('-total_value')
     )
@@ -500,93 +493,43 @@ def statistics_page(request):
             'value_per_recipient': total_val / unique_recip
         })
     
-    # Top recipients
-    top_recipients_raw = list(
-        grants.values('recipient_legal_name')
-        .annotate(
-            count=Count('id'),
-            total_value=Sum('agreement_value')
-        )
-        .order_by('-total_value')[:20]
-    )
-    
+    # Top recipients (spelling variants merged, totals precomputed)
     top_recipients = []
-    for recipient in top_recipients_raw:
+    for recipient in Recipient.objects.order_by('-total_value')[:20]:
         top_recipients.append({
-            'recipient_legal_name': recipient['recipient_legal_name'],
-            'count': recipient['count'],
-            'total_value': float(recipient['total_value'] or 0)
+            'id': recipient.id,
+            'recipient_legal_name': recipient.name,
+            'recipient_province': recipient.province,
+            'count': recipient.grant_count,
+            'grant_count': recipient.grant_count,
+            'total_value': float(recipient.total_value)
         })
     
-    # Sector analysis
-    sector_data_raw = list(
-        grants.exclude(naics_sector_en='')
-        .values('naics_sector_en')
-        .annotate(
-            count=Count('id'),
-            total_value=Sum('agreement_value')
-        )
-        .order_by('-total_value')[:15]
-    )
-    
+    # Sector analysis (2-digit NAICS rollups)
     sector_data = []
-    for sector in sector_data_raw:
+    for sector in NaicsCode.objects.filter(level=2).order_by('-total_value')[:15]:
         sector_data.append({
-            'naics_sector_en': sector['naics_sector_en'],
-            'count': sector['count'],
-            'total_value': float(sector['total_value'] or 0)
+            'code': sector.code,
+            'naics_sector_en': sector.title or sector.code,
+            'count': sector.grant_count,
+            'total_value': float(sector.total_value)
         })
     
     # Program analysis
-    program_data_raw = list(
-        grants.values('program_name_en')
-        .annotate(
-            count=Count('id'),
-            total_value=Sum('agreement_value')
-        )
-        .order_by('-total_value')[:15]
-    )
-    
     program_data = []
-    for program in program_data_raw:
+    for program in Program.objects.order_by('-total_value')[:15]:
         program_data.append({
-            'program_name_en': program['program_name_en'],
-            'count': program['count'],
-            'total_value': float(program['total_value'] or 0)
+            'program_name_en': program.name,
+            'count': program.grant_count,
+            'total_value': float(program.total_value)
         })
     
-    # Value distribution
-    value_ranges = [
-        ('Under $10K', 0, 10000),
-        ('$10K - $50K', 10000, 50000),
-        ('$50K - $100K', 50000, 100000),
-        ('$100K - $500K', 100000, 500000),
-        ('$500K - $1M', 500000, 1000000),
-        ('$1M - $10M', 1000000, 10000000),
-        ('Over $10M', 10000000, float('inf'))
-    ]
-    
-    value_distribution = []
-    for range_name, min_val, max_val in value_ranges:
-        if max_val == float('inf'):
-            range_grants = grants.filter(agreement_value__gte=min_val)
-        else:
-            range_grants = grants.filter(agreement_value__gte=min_val, agreement_value__lt=max_val)
-        
-        count = range_grants.count()
-        total_val = range_grants.aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0
-        percentage = (count / total_grants * 100) if total_grants > 0 else 0
-        
-        value_distribution.append({
-            'range': range_name,
-            'count': count,
-            'total_value': float(total_val),
-            'percentage': round(percentage, 1)
-        })
+    # Value distribution (one grouped query for all buckets)
+    value_distribution, _ = histogram(latest, 'agreement_value')
     
     # Recipient type analysis
     recipient_type_data_raw = list(
-        grants.values('recipient_type')
+        latest.values('recipient_type')
         .annotate(
             count=Count('id'),
             total_value=Sum('agreement_value')
@@ -602,23 +545,33 @@ def statistics_page(request):
             'total_value': float(rtype['total_value'] or 0)
         })
     
-    # Notable category breakdown
+    # Notable category breakdown (indexed flags, one aggregate)
+    flag_totals = latest.aggregate(
+        controversial_count=Count('id', filter=Q(is_controversial=True)),
+        controversial_value=Sum('agreement_value', filter=Q(is_controversial=True)),
+        major_funding_count=Count('id', filter=Q(is_major_funding=True)),
+        major_funding_value=Sum('agreement_value', filter=Q(is_major_funding=True)),
+        notable_count=Count('id', filter=Q(is_notable=True)),
+        notable_value=Sum('agreement_value', filter=Q(is_notable=True)),
+    )
     notable_breakdown = {
-        'controversial': {
-            'count': grants.filter(is_controversial=True).count(),
-            'total_value': float(grants.filter(is_controversial=True).aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0)
-        },
-        'major_funding': {
-            'count': grants.filter(is_major_funding=True).count(),
-            'total_value': float(grants.filter(is_major_funding=True).aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0)
-        },
-        'notable': {
-            'count': grants.filter(is_notable=True).count(),
-            'total_value': float(grants.filter(is_notable=True).aggregate(Sum('agreement_value'))['agreement_value__sum'] or 0)
+        category: {
+            'count': flag_totals[f'{category}_count'],
+            'total_value': float(flag_totals[f'{category}_value'] or 0)
         }
+        for category in ('controversial', 'major_funding', 'notable')
     }
     
     context = {
+        'basic_stats': {
+            'total_grants': total_grants,
+            'agreement_count': agreements['count'],
+            'total_value': float(total_value),
+            'avg_value': float(avg_value),
+            'major_funding_count': flag_totals['major_funding_count'],
+            'notable_count': flag_totals['notable_count'],
+            'max_value': float(top_grants[0].agreement_value) if top_grants else 0,
+        },
         'total_grants': total_grants,
         'total_value': total_value,
         'avg_value': avg_value,
@@ -633,7 +586,7 @@ def statistics_page(request):
         'recipient_type_data': json.dumps(recipient_type_data),
         'notable_breakdown': json.dumps(notable_breakdown),
     }
-    return render(request, 'grants/statistics.html', context)
+    return context
 
 
 def api_documentation(request):
@@ -645,6 +598,7 @@ def api_documentation(request):
 # API ENDPOINTS 
 # =============================================================================
 
+@cache_api_response
 def grant_stats_api(request):
     """Basic grant statistics API"""
     grants = Grant.objects.all()
@@ -656,11 +610,13 @@ def grant_stats_api(request):
         'provinces': grants.values_list('recipient_province', flat=True).distinct().count(),
         'major_funding_count': grants.filter(is_major_funding=True).count(),
         'notable_count': grants.filter(is_notable=True).count(),
+        'controversial_count': grants.filter(is_controversial=True).count(),
     }
     
     return JsonResponse(stats)
 
 
+@cache_api_response
 def grants_search_api(request):
     """Advanced grants search API"""
     grants = Grant.objects.all()
@@ -672,6 +628,7 @@ def grants_search_api(request):
     min_value = request.GET.get('min_value', '')
     max_value = request.GET.get('max_value', '')
     recipient_type = request.GET.get('recipient_type', '')
+    controversial = parse_flag(request.GET.get('controversial'))
     sort_by = request.GET.get('sort', '-agreement_value')
     limit = min(int(request.GET.get('limit', 100)), 1000)  # Max 1000 results
     
@@ -704,6 +661,9 @@ def grants_search_api(request):
     if recipient_type:
         grants = grants.filter(recipient_type=recipient_type)
     
+    if controversial is not None:
+        grants = grants.filter(is_controversial=controversial)
+    
     # Sort and limit
     grants = grants.order_by(sort_by)[:limit]
     
@@ -719,6 +679,8 @@ def grants_search_api(request):
             'fiscal_year': grant.fiscal_year,
             'is_major_funding': grant.is_major_funding,
             'is_notable': grant.is_notable,
+            'is_controversial': grant.is_controversial,
+            'controversial_terms': grant.controversial_terms,
             'program': grant.program_name_en,
         })
     
@@ -728,24 +690,23 @@ def grants_search_api(request):
     })
 
 
+@cache_api_response
 def recipients_api(request):
     """Top recipients analysis API"""
     limit = min(int(request.GET.get('limit', 50)), 200)
     
-    recipients = Grant.objects.values('recipient_legal_name', 'recipient_type').annotate(
-        grant_count=Count('id'),
-        total_value=Sum('agreement_value'),
-        avg_value=Avg('agreement_value')
-    ).order_by('-total_value')[:limit]
+    recipients = Recipient.objects.order_by('-total_value')[:limit]
     
     results = []
     for recipient in recipients:
         results.append({
-            'name': recipient['recipient_legal_name'],
-            'type': recipient['recipient_type'],
-            'grant_count': recipient['grant_count'],
-            'total_value': float(recipient['total_value']),
-            'avg_value': float(recipient['avg_value']),
+            'id': recipient.id,
+            'name': recipient.name,
+            'type': recipient.recipient_type,
+            'province': recipient.province,
+            'grant_count': recipient.grant_count,
+            'total_value': float(recipient.total_value),
+            'avg_value': float(recipient.avg_value),
         })
     
     return JsonResponse({
@@ -754,8 +715,174 @@ def recipients_api(request):
     })
 
 
+@cache_api_response
+def recipient_api(request, pk):
+    """Profile of one recipient with its yearly totals, programs and grants"""
+    recipient = Recipient.objects.filter(pk=pk).first()
+    if recipient is None:
+        return JsonResponse({'error': 'Recipient not found'}, status=404)
+    limit = min(int(request.GET.get('limit', 100)), 1000)
+    
+    profile = recipient_profile(recipient)
+    
+    def serialize(grant):
+        return {
+            'id': grant.id,
+            'title': grant.agreement_title_en,
+            'value': float(grant.agreement_value),
+            'fiscal_year': grant.fiscal_year,
+            'program': grant.program_name_en,
+            'is_notable': grant.is_notable,
+            'is_controversial': grant.is_controversial,
+            'url': grant.get_absolute_url(),
+        }
+    
+    return JsonResponse({
+        'id': recipient.id,
+        'name': recipient.name,
+        'type': recipient.recipient_type,
+        'province': recipient.province,
+        'grant_count': recipient.grant_count,
+        'total_value': float(recipient.total_value),
+        'avg_value': float(recipient.avg_value),
+        'yearly': profile['yearly'],
+        'programs': profile['programs'],
+        'flagged': [serialize(grant) for grant in profile['flagged']],
+        'grants': [serialize(grant) for grant in recipient.grants.order_by('-agreement_value', 'pk')[:limit]],
+        'international': {
+            'partners': [{
+                'name': link.partner_name,
+                'method': link.method,
+                'score': link.score,
+                'grant_count': link.gac_count,
+                'total_value': float(link.gac_value),
+            } for link in profile['links']],
+            'grant_count': profile['international_count'],
+            'total_value': float(profile['international_value']),
+            'grants': [{
+                'id': record.grant_id,
+                'title': record.title,
+                'value': float(record.value),
+                'country': record.country,
+                'start_year': record.start_year,
+                'url': record.get_absolute_url(),
+            } for record in profile['international']],
+        },
+        'combined_value': float(profile['combined_value']),
+    })
+
+
+@cache_api_response
+def agreements_api(request):
+    """Top consolidated agreements (amendments merged), optionally for one recipient"""
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 500)
+        recipient_id = int(request.GET['recipient']) if request.GET.get('recipient') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    
+    agreements = Agreement.objects.order_by('-value')
+    if recipient_id is not None:
+        agreements = agreements.filter(recipient_id=recipient_id)
+    
+    results = []
+    for agreement in agreements[:limit]:
+        results.append({
+            'id': agreement.id,
+            'agreement_number': agreement.number,
+            'title': agreement.title,
+            'recipient_id': agreement.recipient_id,
+            'value': float(agreement.value),
+            'original_value': float(agreement.original_value),
+            'amendment_count': agreement.amendment_count,
+            'first_fiscal_year': agreement.first_fiscal_year,
+            'latest_fiscal_year': agreement.latest_fiscal_year,
+            'latest_grant_id': agreement.latest_grant_id,
+            'history': agreement.history,
+        })
+    
+    totals = Agreement.totals()
+    return JsonResponse({
+        'total_agreements': totals['count'],
+        'total_value': float(totals['value']),
+        'merged_grants': totals['rows'],
+        'count': len(results),
+        'agreements': results,
+    })
+
+
+@cache_api_response
+def programs_api(request):
+    """Top programs by total funding"""
+    limit = min(int(request.GET.get('limit', 50)), 500)
+    
+    programs = []
+    for program in Program.objects.order_by('-total_value')[:limit]:
+        programs.append({
+            'id': program.id,
+            'name': program.name,
+            'grant_count': program.grant_count,
+            'total_value': float(program.total_value),
+        })
+    
+    return JsonResponse({
+        'count': len(programs),
+        'programs': programs
+    })
+
+
+@cache_api_response
+def naics_api(request):
+    """NAICS breakdown at one level, or the children of one code (?parent=54)"""
+    parent_code = request.GET.get('parent', '')
+    
+    if parent_code:
+        parent = NaicsCode.objects.filter(code=parent_code).first()
+        if parent is None:
+            return JsonResponse({'error': f'Unknown NAICS code {parent_code!r}'}, status=404)
+        codes = NaicsCode.objects.filter(parent=parent)
+        level = parent.level + 1
+    else:
+        try:
+            level = int(request.GET.get('level', 2))
+        except ValueError:
+            return JsonResponse({'error': 'level must be a number from 2 to 6'}, status=400)
+        if not 2 <= level <= 6:
+            return JsonResponse({'error': 'level must be a number from 2 to 6'}, status=400)
+        parent = None
+        codes = NaicsCode.objects.filter(level=level)
+    
+    results = []
+    for node in codes.order_by('-total_value'):
+        results.append({
+            'code': node.code,
+            'title': node.title,
+            'level': node.level,
+            'grant_count': node.grant_count,
+            'total_value': float(node.total_value),
+        })
+    
+    return JsonResponse({
+        'parent': {
+            'code': parent.code,
+            'title': parent.title,
+            'grant_count': parent.grant_count,
+            'total_value': float(parent.total_value),
+        } if parent else None,
+        'level': level,
+        'count': len(results),
+        'codes': results,
+    })
+
+
+@cache_api_response
 def comprehensive_stats_api(request):
     """Comprehensive statistics API"""
+    return JsonResponse(get_or_compute('comprehensive_stats', build_comprehensive_stats, request))
+
+
+def build_comprehensive_stats():
+    """Payload for the comprehensive statistics API"""
     grants = Grant.objects.all()
     
     # Basic stats
@@ -766,6 +893,9 @@ def comprehensive_stats_api(request):
         'max_value': float(grants.aggregate(Max('agreement_value'))['agreement_value__max'] or 0),
         'min_value': float(grants.aggregate(Min('agreement_value'))['agreement_value__min'] or 0),
     }
+    agreements = Agreement.totals()
+    basic_stats['agreement_count'] = agreements['count']
+    basic_stats['consolidated_value'] = float(agreements['value'])
     
     # Provincial breakdown
     provincial_stats = list(grants.values('recipient_province').annotate(
@@ -787,21 +917,24 @@ def comprehensive_stats_api(request):
     for year in yearly_stats:
         year['total_value'] = float(year['total_value'])
     
-    return JsonResponse({
+    return {
         'basic_stats': basic_stats,
         'provincial_breakdown': provincial_stats[:10],
         'yearly_trends': yearly_stats,
-        'top_sectors': list(grants.exclude(naics_sector_en='').values('naics_sector_en').annotate(
-            count=Count('id'),
-            total_value=Sum('agreement_value')
-        ).order_by('-total_value')[:10])
-    })
+        'top_sectors': [{
+            'naics_code': sector.code,
+            'naics_sector_en': sector.title,
+            'count': sector.grant_count,
+            'total_value': sector.total_value,
+        } for sector in NaicsCode.objects.filter(level=2).order_by('-total_value')[:10]]
+    }
 
 
 # =============================================================================
 # GAC API ENDPOINTS
 # =============================================================================
 
+@cache_api_response
 def gac_stats_api(request):
     """GAC grants statistics API"""
     grants = GlobalAffairsGrant.objects.all()
@@ -819,6 +952,7 @@ def gac_stats_api(request):
     return JsonResponse(stats)
 
 
+@cache_api_response
 def gac_search_api(request):
     """GAC grants search API"""
     grants = GlobalAffairsGrant.objects.all()
@@ -878,4 +1012,156 @@ def gac_search_api(request):
     return JsonResponse({
         'count': len(results),
         'results': results
-    })
\ No newline at end of file
+    })
+
+
+# =============================================================================
+# COMBINED SEARCH API
+# =============================================================================
+
+@cache_api_response
+def search_all_api(request):
+    """Relevance-ranked search over domestic and GAC grants from the token index"""
+    query = request.GET.get('q', '')
+    source = request.GET.get('source') or None
+    
+    try:
+        limit = int(request.GET.get('limit', 20))
+        rows, next_cursor = search_records(query, source, request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid search parameters: {e}'}, status=400)
+    
+    results = []
+    for record, score in rows:
+        results.append({
+            'id': record.grant_id,
+            'source': record.source,
+            'title': record.title,
+            'recipient': record.recipient,
+            'value': float(record.value),
+            'province': record.province,
+            'country': record.country,
+            'program': record.program,
+            'start_year': record.start_year,
+            'end_year': record.end_year,
+            'url': record.get_absolute_url(),
+            'score': score,
+        })
+    
+    return JsonResponse({
+        'query': query,
+        'tokens': tokenize(query)[:MAX_QUERY_TOKENS],
+        'count': len(results),
+        'results': results,
+        'next_cursor': next_cursor,
+    })
+
+
+@cache_api_response
+def similar_grants_api(request, grant_id):
+    """Near-identical grants (either dataset) by MinHash similarity of title and description"""
+    source, source_id = ('gac', grant_id[4:]) if grant_id.startswith('gac_') else ('domestic', grant_id)
+    try:
+        source_id = int(source_id)
+        limit = int(request.GET.get('limit', 10))
+        min_similarity = float(request.GET.get('min_similarity', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid grant id or parameters'}, status=400)
+    if not 1 <= limit <= MAX_SIMILAR_RESULTS:
+        return JsonResponse({'error': f'limit must be between 1 and {MAX_SIMILAR_RESULTS}'}, status=400)
+    
+    matches = similar_grants(source, source_id, limit, min_similarity)
+    if matches is None:
+        return JsonResponse({'error': 'Grant not found in the similarity index'}, status=404)
+    
+    results = []
+    for record, similarity in matches:
+        results.append({
+            'id': record.grant_id,
+            'source': record.source,
+            'title': record.title,
+            'recipient': record.recipient,
+            'value': float(record.value),
+            'program': record.program,
+            'start_year': record.start_year,
+            'url': record.get_absolute_url(),
+            'similarity': round(similarity, 4),
+        })
+    
+    return JsonResponse({
+        'id': grant_id,
+        'source': source,
+        'count': len(results),
+        'results': results,
+    })
+
+
+# =============================================================================
+# ANALYTICS API ENDPOINTS
+# =============================================================================
+
+@cache_api_response
+def histogram_api(request):
+    """Value distribution API with configurable bucket edges"""
+    source = request.GET.get('source', 'domestic')
+    scale = request.GET.get('scale', 'custom')
+    
+    try:
+        grants, field = get_value_source(source)
+        
+        if scale == 'log':
+            edges = log_edges(
+                float(request.GET.get('min', 1000)),
+                float(request.GET.get('max', 100000000)),
+                int(request.GET.get('buckets', 10))
+            )
+        elif request.GET.get('edges'):
+            edges = [float(edge) for edge in request.GET['edges'].split(',') if edge.strip()]
+        else:
+            edges = None
+        
+        distribution, excluded_count = histogram(grants, field, edges)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid histogram parameters: {e}'}, status=400)
+    
+    return JsonResponse({
+        'source': source,
+        'field': field,
+        'buckets': distribution,
+        # Rows below the first edge; percentages are of all rows including these
+        'excluded_count': excluded_count,
+    })
+
+
+@cache_api_response
+def quantiles_api(request):
+    """Median and percentile API, optionally per group"""
+    source = request.GET.get('source', 'domestic')
+    group_by = request.GET.get('group_by', '')
+    
+    try:
+        fractions = parse_quantiles(request.GET.get('q'))
+        limit = min(int(request.GET.get('limit', 50)), 500)
+        method, rows = value_quantiles(source, group_by, fractions)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid quantile parameters: {e}'}, status=400)
+    
+    return JsonResponse({
+        'source': source,
+        'group_by': group_by or 'all',
+        'method': method,
+        'count': len(rows[:limit]),
+        'groups': rows[:limit],
+    })
+
+
+@etag_exempt
+def cache_stats_api(request):
+    """Hit/miss counters for the cached API endpoints"""
+    return JsonResponse({
+        'backend': settings.CACHE_BACKEND,
+        'dataset_version': get_dataset_version(request).version,
+        'endpoints': get_cache_stats(CACHED_VIEWS),
+        # Per-process LRU of /api/calculate/ responses (this worker only)
+        'calculator': calculation_cache.stats(),
+    })
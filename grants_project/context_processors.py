@@ -5,6 +5,8 @@ These make variables available to all templates.
 from django.conf import settings
 from decouple import config
 
+from grants.versioning import lazy_dataset_version
+
 
 def analytics_context(request):
     """Add Google Analytics ID to template context"""
@@ -19,3 +21,11 @@ def site_settings(request):
         'DEBUG': settings.DEBUG,
         'SITE_NAME': 'Canadian Grants Tracker',
     }
+
+
+def dataset_version(request):
+    """Add the current dataset version stamp (queried only if a template uses it)"""
+    stamp = getattr(request, 'dataset_version', None)
+    if stamp is None:
+        stamp = lazy_dataset_version(request)
+    return {'DATASET_VERSION': stamp}
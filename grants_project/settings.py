@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +52,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "grants.versioning.DatasetVersionMiddleware",
+    "grants.middleware.ConditionalGetMiddleware",
 ]
 
 ROOT_URLCONF = "grants_project.urls"
@@ -67,6 +71,7 @@ TEMPLATES = [
                 "django.contrib.messages.context_processors.messages",
                 "grants_project.context_processors.analytics_context",
                 "grants_project.context_processors.site_settings",
+                "grants_project.context_processors.dataset_version",
             ],
         },
     },
@@ -86,6 +91,57 @@ DATABASES = {
 }
 
 
+# Caching
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CACHE_BACKEND selects locmem (per process), file (shared between gunicorn
+# workers on one host) or redis (requires the optional `redis` package).
+
+CACHE_BACKEND = config("CACHE_BACKEND", default="locmem")
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "canada-grants",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config("CACHE_LOCATION", default="/var/tmp/canada_grants_cache"),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("REDIS_URL", default="redis://127.0.0.1:6379/1"),
+    },
+}
+
+CACHES = {
+    "default": {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        "OPTIONS": {"MAX_ENTRIES": 5000} if CACHE_BACKEND != "redis" else {},
+    }
+}
+
+# Cached API responses are keyed on the dataset version, so they can live long
+API_CACHE_TIMEOUT = config("API_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+
+# Identifies the deployed code in ETags (e.g. the git commit); when blank the
+# newest template/source modification time is used instead
+RELEASE_ID = config("RELEASE_ID", default="")
+
+# Sessions are only used by the admin; the calculator keeps each visitor's
+# latest calculation in a signed cookie so public requests never write them
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Saved tax calculations are only used for analytics. "buffered" queues them
+# in memory and bulk-inserts them from a background thread, "sync" saves each
+# one during the request and "off" keeps them in the visitor's cookie only.
+CALCULATOR_PERSISTENCE = config("CALCULATOR_PERSISTENCE", default="buffered")
+CALCULATOR_FLUSH_SIZE = config("CALCULATOR_FLUSH_SIZE", default=100, cast=int)
+CALCULATOR_FLUSH_INTERVAL = config("CALCULATOR_FLUSH_INTERVAL", default=30, cast=int)
+
+# Responses for round-number calculator inputs kept per process (LRU)
+CALCULATOR_CACHE_SIZE = config("CALCULATOR_CACHE_SIZE", default=1024, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 